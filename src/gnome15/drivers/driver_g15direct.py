@@ -19,7 +19,6 @@ Alternative implementation of a G19 Driver that uses pylibg19 to communicate dir
 with the keyboard 
 """
 
-import array
 import logging
 import os
 import sys
@@ -28,12 +27,11 @@ from threading import RLock
 import cairo
 from gi.repository import GConf as gconf
 from gi.repository import Gtk as gtk
-from PIL import ImageMath
-from PIL import Image
 
 import gnome15.g15locale as g15locale
 import gnome15.g15driver as g15driver
 import gnome15.g15globals as g15globals
+import gnome15.util.g15encode as g15encode
 import gnome15.util.g15scheduler as g15scheduler
 import gnome15.util.g15uigconf as g15uigconf
 import gnome15.util.g15gconf as g15gconf
@@ -66,6 +64,10 @@ description = _(
 has_preferences = True
 
 DEBUG_LIBG15 = "DEBUG_LIBG15" in os.environ
+
+# Size of the packed monochrome buffer passed to libg15
+MONO_BUFFER_LENGTH = 861
+
 KEY_MAP = {
     g15driver.G_KEY_G1: 1 << 0,
     g15driver.G_KEY_G2: 1 << 1,
@@ -291,6 +293,14 @@ class Driver(g15driver.AbstractDriver):
         finally:
             self.lock.release()
 
+    def on_update_controls(self, controls):
+        self.lock.acquire()
+        try:
+            for control in controls:
+                self._do_update_control(control)
+        finally:
+            self.lock.release()
+
     def get_name(self):
         return _("G15 Direct")
 
@@ -317,69 +327,46 @@ class Driver(g15driver.AbstractDriver):
     def is_connected(self):
         return self.connected
 
-    def paint(self, img):
-        if not self.is_connected():
-            return
-
+    def encode(self, img):
         # Just return if the device has no LCD
         if self.device.bpp == 0:
             return None
 
+        size = self.get_size()
+
+        # Paint to 565 image provided into an ARGB image surface for PIL's benefit. PIL doesn't support 565?
+        argb_surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, size[0], size[1])
+        argb_context = cairo.Context(argb_surface)
+        argb_context.set_source_surface(img)
+        argb_context.paint()
+
+        # Threshold, invert and pack into the 1 bit per pixel layout libg15 expects
+        invert_control = self.get_control("invert_lcd")
+        buf = g15encode.encode_mono_surface(argb_surface, g15encode.encode_mono_libg15,
+                                            invert=invert_control.value != 0, length=MONO_BUFFER_LENGTH)
+        if len(buf) != MONO_BUFFER_LENGTH:
+            logger.warning("Invalid buffer size")
+            return None
+        return buf
+
+    def transmit(self, buf):
+        failed = False
         self.lock.acquire()
         try:
-            size = self.get_size()
-
-            # Paint to 565 image provided into an ARGB image surface for PIL's benefit. PIL doesn't support 565?
-            argb_surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, size[0], size[1])
-            argb_context = cairo.Context(argb_surface)
-            argb_context.set_source_surface(img)
-            argb_context.paint()
-
-            # Now convert the ARGB to a PIL image so it can be converted to a 1 bit monochrome image, with all
-            # colours dithered. It would be nice if Cairo could do this :( Any suggestions? 
-            pil_img = Image.frombuffer("RGBA", size, argb_surface.get_data(), "raw", "RGBA", 0, 1)
-            pil_img = ImageMath.eval("convert(pil_img,'1')", pil_img=pil_img)
-            pil_img = ImageMath.eval("convert(pil_img,'P')", pil_img=pil_img)
-            pil_img = pil_img.point(lambda i: i >= 250, '1')
-
-            invert_control = self.get_control("invert_lcd")
-            if invert_control.value == 0:
-                pil_img = pil_img.point(lambda i: 1 ^ i)
-
-            # Convert image buffer to string
-            buf = ""
-            for x in list(pil_img.getdata()):
-                buf += chr(x)
-
-            if len(buf) != self.device.lcd_size[0] * self.device.lcd_size[1]:
-                logger.warning("Invalid buffer size")
-            else:
-                # TODO Replace with C routine
-                arrbuf = array.array('B', self.empty_buf)
-                width, height = self.get_size()
-                max_byte_offset = 0
-                for x in range(0, width):
-                    for y in range(0, height):
-                        pixel_offset = y * width + x
-                        byte_offset = pixel_offset / 8
-                        max_byte_offset = max(max_byte_offset, byte_offset)
-                        bit_offset = 7 - (pixel_offset % 8)
-                        val = ord(buf[x + (y * 160)])
-                        pv = arrbuf[byte_offset]
-                        if val > 0:
-                            arrbuf[byte_offset] = pv | 1 << bit_offset
-                        else:
-                            arrbuf[byte_offset] = pv & ~(1 << bit_offset)
-                buf = arrbuf.tostring()
+            if self.is_connected() and self.frame_diff.changed(buf):
                 try:
                     logger.debug("Writing buffer of %d bytes", len(buf))
                     pylibg15.write_pixmap(buf)
                 except IOError as e:
                     logger.error("Failed to send buffer.", exc_info=e)
-                    self.disconnect()
+                    failed = True
         finally:
             self.lock.release()
 
+        # Disconnecting flushes and stops the control writer, whose thread may be waiting for the lock
+        if failed and self.is_connected():
+            self.disconnect()
+
     """
     Private
     """
@@ -393,11 +380,6 @@ class Driver(g15driver.AbstractDriver):
         self.callback = None
         self.notify_handles = []
 
-        # Create an empty string buffer for use with monochrome LCD
-        self.empty_buf = ""
-        for _ in range(0, 861):
-            self.empty_buf += chr(0)
-
         # TODO Enable UINPUT if multimedia key support is required?
         self.timeout = 10000
         e = self.conf_client.get("/apps/gnome15/%s/timeout" % self.device.uid)
@@ -19,7 +19,6 @@ Alternative implementation of a G19 Driver that uses pylibg19 to communicate dir
 with the keyboard 
 """
 
-import array
 import logging
 import os
 import sys
@@ -36,13 +35,9 @@ import gnome15.g15globals as g15globals
 # import gnome15.util.g15convert as g15convert
 import gnome15.util.g15uigconf as g15uigconf
 import gnome15.util.g15cairo as g15cairo
+import gnome15.util.g15encode as g15encode
 import gnome15.g15exceptions as g15exceptions
 
-if sys.version_info < (3, 0):
-    from cStringIO import StringIO
-else:
-    from io import StringIO
-
 _ = g15locale.get_translation("gnome15-drivers").ugettext
 
 logger = logging.getLogger(__name__)
@@ -51,7 +46,7 @@ logger = logging.getLogger(__name__)
 if g15globals.dev:
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "pylibg19"))
 
-from g19.g19 import G19
+from g19.g19 import G19, FRAME_HEADER_SIZE
 
 # Driver information (used by driver selection UI)
 name = _("G19 Direct")
@@ -203,6 +198,14 @@ class Driver(g15driver.AbstractDriver):
         finally:
             self.lock.release()
 
+    def on_update_controls(self, controls):
+        self.lock.acquire()
+        try:
+            for control in controls:
+                self._do_update_control(control)
+        finally:
+            self.lock.release()
+
     def get_name(self):
         return name
 
@@ -219,10 +222,7 @@ class Driver(g15driver.AbstractDriver):
     def is_connected(self):
         return self.connected
 
-    def paint(self, img):
-        if not self.is_connected():
-            return
-
+    def encode(self, img):
         width = img.get_width()
         height = img.get_height()
 
@@ -244,27 +244,25 @@ class Driver(g15driver.AbstractDriver):
         back_context.set_operator(cairo.OPERATOR_SOURCE)
         back_context.paint()
 
-        if back_surface.get_format() == cairo.FORMAT_ARGB32:
-            file_str = StringIO()
-            data = back_surface.get_data()
-            for i in range(0, len(data), 4):
-                r = ord(data[i + 2])
-                g = ord(data[i + 1])
-                b = ord(data[i + 0])
-                file_str.write(self._rgb_to_uint16(r, g, b))
-            buf = array.array('B', file_str.getvalue())
-        else:
-            buf = array.array('B', str(back_surface.get_data()))
+        expected_size = MAX_X * MAX_Y * (self.get_bpp() // 8)
+        actual_size = back_surface.get_width() * back_surface.get_height() * 2
+        if actual_size != expected_size:
+            logger.warning("Invalid buffer size, expected %d, got %d", expected_size, actual_size)
+            return None
 
-        expected_size = MAX_X * MAX_Y * (self.get_bpp() / 8)
-        if len(buf) != expected_size:
-            logger.warning("Invalid buffer size, expected %d, got %d", expected_size, len(buf))
-        else:
-            try:
-                self.lg19.send_frame(buf)
-            except usb.USBError as e:
-                logger.debug("Failed to send buffer.", exc_info=e)
-                self._on_receive_error(e)
+        # Convert (or copy if Cairo already did it) straight into a free frame buffer, after the header
+        frame_buffer = self.frame_output.get_free_buffer(self.frame_buffers)
+        g15encode.encode_rgb565_surface(back_surface, frame_buffer, FRAME_HEADER_SIZE)
+        return frame_buffer
+
+    def transmit(self, frame_buffer):
+        if not self.is_connected() or not self.frame_diff.changed(frame_buffer):
+            return
+        try:
+            self.lg19.send_frame(frame_buffer)
+        except usb.USBError as e:
+            logger.debug("Failed to send buffer.", exc_info=e)
+            self._on_receive_error(e)
 
     def process_input(self, event):
         if self.callback is None:
@@ -315,6 +313,8 @@ class Driver(g15driver.AbstractDriver):
 
         try:
             self.lg19 = G19(reset, False, timeout, reset_wait)
+            # One frame being sent, one waiting to be sent, and one being encoded
+            self.frame_buffers = [self.lg19.new_frame_buffer() for __i in range(3)]
             self.connected = True
         except usb.USBError as e:
             logger.error("Failed to connect.", exc_info=e)
@@ -373,18 +373,3 @@ class Driver(g15driver.AbstractDriver):
         except usb.USBError as e:
             logger.debug('Error updating control.', exc_info=e)
             self._on_receive_error(e)
-
-    @staticmethod
-    def _rgb_to_uint16(r, g, b):
-        r_bits = r * 32 / 255
-        g_bits = g * 64 / 255
-        b_bits = b * 32 / 255
-
-        r_bits = r_bits if r_bits <= 31 else 31
-        g_bits = g_bits if g_bits <= 63 else 63
-        b_bits = b_bits if b_bits <= 31 else 31
-
-        value_h = (r_bits << 3) | (g_bits >> 3)
-        value_l = (g_bits << 5) | b_bits
-
-        return chr(value_l & 0xff) + chr(value_h & 0xff)
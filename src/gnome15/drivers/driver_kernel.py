@@ -21,7 +21,6 @@ import os
 import re
 import select
 import struct
-import sys
 from threading import Thread
 
 from pyinputevent.uinput import UInputDevice
@@ -31,6 +30,7 @@ import pyinputevent.scancodes as S
 
 import gnome15.g15locale as g15locale
 import gnome15.g15driver as g15driver
+import gnome15.util.g15encode as g15encode
 import gnome15.util.g15scheduler as g15scheduler
 import gnome15.util.g15uigconf as g15uigconf
 import gnome15.g15globals as g15globals
@@ -42,15 +42,8 @@ import dbus
 from gi.repository import GConf as gconf
 from gi.repository import GObject as gobject
 from gi.repository import Gtk as gtk
-from PIL import Image
-from PIL import ImageMath
 import usb
 
-if sys.version_info < (3, 0):
-    from cStringIO import StringIO
-else:
-    from io import StringIO
-
 _ = g15locale.get_translation("gnome15-drivers").ugettext
 
 logger = logging.getLogger(__name__)
@@ -1023,6 +1016,9 @@ class Driver(g15driver.AbstractDriver):
         self.notify_handles = []
         self.fb = None
         self.var_info = None
+        self.frame_buffers = []
+        self._led_values = {}
+        self._set_lights_supported = True
         self.on_close = on_close
         self.key_thread = None
         self.device = device
@@ -1121,15 +1117,11 @@ class Driver(g15driver.AbstractDriver):
     def get_controls(self):
         return self.device_info.controls if self.device_info is not None else None
 
-    def paint(self, img):
+    def encode(self, img):
         if not self.fb:
-            return
+            return None
         width = img.get_width()
         height = img.get_height()
-        character_width = width / 8
-        fixed = self.fb.get_fixed_info()
-        padding = fixed.line_length - character_width
-        file_str = StringIO()
 
         if self.get_model_name() == g15driver.MODEL_G19:
             try:
@@ -1140,71 +1132,36 @@ class Driver(g15driver.AbstractDriver):
                 back_surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
             back_context = cairo.Context(back_surface)
             back_context.set_source_surface(img, 0, 0)
-            back_context.set_operator(cairo.OPERATOR_SOURCE);
+            back_context.set_operator(cairo.OPERATOR_SOURCE)
             back_context.paint()
 
-            if back_surface.get_format() == cairo.FORMAT_ARGB32:
-                """
-                If the creation of the type 4 image failed (i.e. earlier version of Cairo)
-                then we have to convert it ourselves. This is slow. 
-                
-                TODO Replace with C routine 
-                """
-                file_str = StringIO()
-                data = back_surface.get_data()
-                for i in range(0, len(data), 4):
-                    r = ord(data[i + 2])
-                    g = ord(data[i + 1])
-                    b = ord(data[i + 0])
-                    file_str.write(self.rgb_to_uint16(r, g, b))
-                buf = file_str.getvalue()
-            else:
-                buf = str(back_surface.get_data())
+            # Convert (or copy if Cairo already did it) into a free frame buffer. One may be being
+            # sent, and another waiting to be sent
+            if len(self.frame_buffers) == 0 or len(self.frame_buffers[0]) != width * height * 2:
+                self.frame_buffers = [bytearray(width * height * 2) for __i in range(3)]
+            buf = self.frame_output.get_free_buffer(self.frame_buffers)
+            g15encode.encode_rgb565_surface(back_surface, buf)
+            return buf, width * 2
         else:
             width, height = self.get_size()
-            arrbuf = array.array('B', self.empty_buf)
 
             argb_surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
             argb_context = cairo.Context(argb_surface)
             argb_context.set_source_surface(img)
             argb_context.paint()
 
-            """
-            Now convert the ARGB to a PIL image so it can be converted to a 1 bit monochrome image, with all
-            colours dithered. It would be nice if Cairo could do this :( Any suggestions?
-            """
-            pil_img = Image.frombuffer("RGBA", (width, height), argb_surface.get_data(), "raw", "RGBA", 0, 1)
-            pil_img = ImageMath.eval("convert(pil_img,'1')", pil_img=pil_img)
-            pil_img = ImageMath.eval("convert(pil_img,'P')", pil_img=pil_img)
-            pil_img = pil_img.point(lambda i: i >= 250, '1')
-
-            # Invert the screen if required
-            if g15_invert_control.value == 0:
-                pil_img = pil_img.point(lambda i: 1 ^ i)
+            # Threshold, invert and pack into the framebuffer's 1 bit per pixel row layout
+            line_length = self.fb.get_fixed_info().line_length
+            buf = g15encode.encode_mono_surface(argb_surface, g15encode.encode_mono_framebuffer,
+                                                line_length, invert=g15_invert_control.value != 0)
+            return buf, line_length
 
-            # Data is 160x43, 1 byte per pixel. Will have value of 0 or 1.
-            width, height = self.get_size()
-            data = list(pil_img.getdata())
-            fixed = self.fb.get_fixed_info()
-            v = 0
-            b = 1
-
-            # TODO Replace with C routine
-            for row in range(0, height):
-                for col in range(0, width):
-                    if data[(row * width) + col]:
-                        v += b
-                    b = b << 1
-                    if b == 256:
-                        # Full byte
-                        b = 1
-                        i = row * fixed.line_length + col / 8
-                        arrbuf[i] = v
-                        v = 0
-            buf = arrbuf.tostring()
-
-        if self.fb and self.fb.buffer:
-            self.fb.buffer[0:len(buf)] = buf
+    def transmit(self, frame):
+        # The framebuffer is memory mapped, so only the rows that have changed need be written
+        buf, line_length = frame
+        fb = self.fb
+        if fb and fb.buffer:
+            self.frame_diff.write_changed(buf, line_length, fb.buffer)
 
     def process_svg(self, document):
         if self.get_bpp() == 1:
@@ -1215,31 +1172,14 @@ class Driver(g15driver.AbstractDriver):
                                 style.replace("font-family:Sans", "font-family:%s" % g15globals.fixed_size_font_name))
 
     def on_update_control(self, control):
-        if control == g19_keyboard_backlight_control or control == g110_keyboard_backlight_control:
-            self._write_to_led("red:bl", control.value[0])
-            if control.hint & g15driver.HINT_RED_BLUE_LED == 0:
-                self._write_to_led("green:bl", control.value[1])
-                self._write_to_led("blue:bl", control.value[2])
-            else:
-                # The G110 only has red and blue LEDs
-                self._write_to_led("blue:bl", control.value[2])
-        elif control == g15_backlight_control:
-            if self.get_model_name() == g15driver.MODEL_G15_V2:
-                # G15v2 has different coloured backlight
-                self._write_to_led("orange:keys", control.value)
-            else:
-                self._write_to_led("blue:keys", control.value)
-        elif control == g15_lcd_backlight_control or control == g19_brightness_control:
-            self._write_to_led("white:screen", control.value)
-        elif control == g15_lcd_contrast_control:
-            self._write_to_led("contrast:screen", control.value)
-        elif control == g15_mkeys_control or control == g19_mkeys_control:
-            self._set_mkey_lights(control.value)
-        else:
-            if control.hint & g15driver.HINT_VIRTUAL == 0:
-                logger.warning("Setting the control " + control.id + " is not yet supported on this model. " + \
-                               "Please report this as a bug, providing the contents of your /sys/class/led" + \
-                               "directory and the keyboard model you use.")
+        self.on_update_controls([control])
+
+    def on_update_controls(self, controls):
+        # Gather the LED values for the whole batch, so they can be sent to the system service at once
+        values = {}
+        for control in controls:
+            self._get_led_values(control, values)
+        self._write_to_leds(values)
 
     def grab_keyboard(self, callback):
         if self.key_thread is not None:
@@ -1269,6 +1209,8 @@ class Driver(g15driver.AbstractDriver):
 
     def _on_connect(self):
         self.notify_handles = []
+        self._led_values = {}
+        self._set_lights_supported = True
         # Check hardware again
         self._init_driver()
 
@@ -1293,11 +1235,6 @@ class Driver(g15driver.AbstractDriver):
                 self.fb.dump()
             self.var_info = self.fb.get_var_info()
 
-            # Create an empty string buffer for use with monochrome LCD
-            self.empty_buf = ""
-            for i in range(0, self.fb.get_fixed_info().smem_len):
-                self.empty_buf += chr(0)
-
         # Connect to DBUS        
         system_bus = dbus.SystemBus()
         try:
@@ -1330,13 +1267,40 @@ It should be launched automatically if Gnome15 is installed correctly.")
         if self.is_connected():
             self.disconnect()
 
-    def _set_mkey_lights(self, lights):
+    def _get_led_values(self, control, values):
+        if control == g19_keyboard_backlight_control or control == g110_keyboard_backlight_control:
+            values["red:bl"] = control.value[0]
+            if control.hint & g15driver.HINT_RED_BLUE_LED == 0:
+                values["green:bl"] = control.value[1]
+                values["blue:bl"] = control.value[2]
+            else:
+                # The G110 only has red and blue LEDs
+                values["blue:bl"] = control.value[2]
+        elif control == g15_backlight_control:
+            if self.get_model_name() == g15driver.MODEL_G15_V2:
+                # G15v2 has different coloured backlight
+                values["orange:keys"] = control.value
+            else:
+                values["blue:keys"] = control.value
+        elif control == g15_lcd_backlight_control or control == g19_brightness_control:
+            values["white:screen"] = control.value
+        elif control == g15_lcd_contrast_control:
+            values["contrast:screen"] = control.value
+        elif control == g15_mkeys_control or control == g19_mkeys_control:
+            self._get_mkey_led_values(control.value, values)
+        else:
+            if control.hint & g15driver.HINT_VIRTUAL == 0:
+                logger.warning("Setting the control " + control.id + " is not yet supported on this model. " + \
+                               "Please report this as a bug, providing the contents of your /sys/class/led" + \
+                               "directory and the keyboard model you use.")
+
+    def _get_mkey_led_values(self, lights, values):
         if self.device_info.leds:
             leds = self.device_info.leds
-            self._write_to_led(leds[0], lights & g15driver.MKEY_LIGHT_1 != 0)
-            self._write_to_led(leds[1], lights & g15driver.MKEY_LIGHT_2 != 0)
-            self._write_to_led(leds[2], lights & g15driver.MKEY_LIGHT_3 != 0)
-            self._write_to_led(leds[3], lights & g15driver.MKEY_LIGHT_MR != 0)
+            values[leds[0]] = 1 if lights & g15driver.MKEY_LIGHT_1 != 0 else 0
+            values[leds[1]] = 1 if lights & g15driver.MKEY_LIGHT_2 != 0 else 0
+            values[leds[2]] = 1 if lights & g15driver.MKEY_LIGHT_3 != 0 else 0
+            values[leds[3]] = 1 if lights & g15driver.MKEY_LIGHT_MR != 0 else 0
         else:
             logger.warning(" Setting MKey lights on " + self.device.model_id + " not yet supported. " +
                            "Please report this as a bug, providing the contents of your /sys/class/led" +
@@ -1351,15 +1315,32 @@ It should be launched automatically if Gnome15 is installed correctly.")
             self.key_thread.deactivate()
             self.key_thread = None
 
-    def _do_write_to_led(self, name, value):
+    def _do_write_to_leds(self, values):
         if not self.system_service:
             logger.warning("Attempt to write to LED when not connected")
-        else:
-            logger.debug("Writing %s to LED %s", value, name)
+            return
+        logger.debug("Writing %s to LEDs", values)
+        if self._set_lights_supported:
+            try:
+                self.system_service.SetLights(self.device.uid, dbus.Dictionary(values, signature="sn"))
+                return
+            except dbus.DBusException as e:
+                if e.get_dbus_name() != "org.freedesktop.DBus.Error.UnknownMethod":
+                    raise
+                logger.debug("System service does not support SetLights, falling back to SetLight", exc_info=e)
+                self._set_lights_supported = False
+        for name, value in values.items():
             self.system_service.SetLight(self.device.uid, name, value)
 
-    def _write_to_led(self, name, value):
-        gobject.idle_add(self._do_write_to_led, name, value)
+    def _write_to_leds(self, values):
+        # Only LEDs that have changed since they were last written are sent
+        changed = {}
+        for name, value in values.items():
+            if self._led_values.get(name) != value:
+                self._led_values[name] = value
+                changed[name] = value
+        if len(changed) > 0:
+            gobject.idle_add(self._do_write_to_leds, changed)
 
     def _set_keymap(self, keymap):
         for devpath in self.keyboard_devices:
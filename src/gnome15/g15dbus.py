@@ -369,6 +369,19 @@ class G15DBUSScreenService(AbstractG15DBUSService):
         return (driver.get_name(), driver.get_model_name(), driver.get_size()[0], driver.get_size()[1],
                 driver.get_bpp()) if driver != None else None
 
+    @dbus.service.method(SCREEN_IF_NAME, in_signature='', out_signature='a{st}')
+    def GetFrameStatistics(self):
+        driver = self._screen.driver
+        return driver.get_frame_statistics() if driver != None else {}
+
+    @dbus.service.method(SCREEN_IF_NAME, in_signature='', out_signature='a{st}')
+    def GetRedrawStatistics(self):
+        return self._screen.get_redraw_statistics()
+
+    @dbus.service.method(SCREEN_IF_NAME, in_signature='', out_signature='a(sds)')
+    def GetPluginActivationTimes(self):
+        return self._screen.plugins.get_activation_times()
+
     @dbus.service.method(SCREEN_IF_NAME, in_signature='', out_signature='s')
     def GetDeviceUID(self):
         return self._screen.device.uid
@@ -752,11 +765,11 @@ class G15DBUSPageService(AbstractG15DBUSService):
 
     @dbus.service.method(PAGE_IF_NAME, in_signature='ss')
     def SetThemeProperty(self, name, value):
-        self._page.theme_properties[name] = value
+        self._page.set(name, value)
 
     @dbus.service.method(PAGE_IF_NAME, in_signature='a{ss}')
     def SetThemeProperties(self, properties):
-        self._page.theme_properties = properties
+        self._page.set_theme_properties(properties)
 
     @dbus.service.method(PAGE_IF_NAME, in_signature='ndd')
     def SetPriority(self, priority, revert_after, delete_after):
@@ -976,6 +989,20 @@ class G15DBUSService(AbstractG15DBUSService):
     def IsStopping(self):
         return self._service.shutting_down
 
+    @dbus.service.method(IF_NAME, in_signature='', out_signature='a{sd}')
+    def GetStartupStatistics(self):
+        return self._service.get_startup_statistics()
+
+    @dbus.service.method(IF_NAME, in_signature='', out_signature='a(sds)')
+    def GetPluginActivationTimes(self):
+        plugins = self._service.global_plugins
+        return plugins.get_activation_times() if plugins is not None else []
+
+    @dbus.service.method(IF_NAME, in_signature='', out_signature='a{sv}')
+    def GetWindowMonitorStatistics(self):
+        monitor = self._service.window_monitor
+        return monitor.get_statistics() if monitor is not None else {}
+
     @dbus.service.method(IF_NAME, out_signature='as')
     def GetDevices(self):
         l = []
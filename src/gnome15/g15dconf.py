@@ -16,11 +16,20 @@
 
 
 """
-This class provides a way of retrieving and monitoring dconf without using
-the GI bindings, which may no longer be mixed with static bindings (that
-Gnome15 uses).
+Retrieves and monitors GSettings (dconf) values.
 
-This class is stop gap until a better solution can be found
+get_settings() returns a GSettings, which uses Gio.Settings in process, caches
+values once read and invokes callbacks as soon as a key changes. If Gio (or
+the schema) is not available, a DBusGSettings is returned instead. This runs
+the gsettings command to read values, and watches for dconf changes by
+eavesdropping on the session bus.
+
+Both provide the same small interface :-
+
+    connect("changed::key", callback)    - callback is invoked with no arguments
+    disconnect(handle)
+    get_string(key)
+    close()
 """
 
 import logging
@@ -35,6 +44,22 @@ PASSIVE_MATCH_STRING = "type='method_call',interface='ca.desrt.dconf.Writer',mem
 EAVESDROP_MATCH_STRING = "eavesdrop='true',%s" % PASSIVE_MATCH_STRING
 
 
+def get_settings(schema_id, backend=None):
+    """
+    Get the settings for a schema, using Gio if possible, and falling back to
+    gsettings and D-Bus if not.
+
+    Keyword arguments:
+    schema_id        -- schema ID, e.g. org.gnome.desktop.background
+    backend          -- Gio.SettingsBackend to use instead of the default (e.g. a memory backend)
+    """
+    try:
+        return GSettings(schema_id, backend)
+    except Exception as e:
+        logger.debug("Could not get settings for %s with Gio, falling back to gsettings", schema_id, exc_info=e)
+        return DBusGSettings(schema_id)
+
+
 class GSettingsCallback:
     def __init__(self, handle, key, callback):
         self.handle = handle
@@ -43,9 +68,84 @@ class GSettingsCallback:
 
 
 class GSettings:
+    """
+    Settings for a schema, read using Gio.Settings. Values are cached after they
+    are first read, and replaced when Gio reports they have changed.
+    """
+
+    def __init__(self, schema_id, backend=None):
+        from gi.repository import Gio
+        self.schema_id = schema_id
+        self._handle = 1
+        self._monitors = {}
+        self._cache = {}
+
+        # Gio.Settings aborts the process if the schema doesn't exist, so look for it first
+        source = Gio.SettingsSchemaSource.get_default()
+        schema = source.lookup(schema_id, True) if source is not None else None
+        if schema is None:
+            raise Exception("No schema %s" % schema_id)
+        self._settings = Gio.Settings.new_full(schema, backend, None)
+        self._changed_handle = self._settings.connect("changed", self._changed)
+
+    def connect(self, key, callback):
+        key = _get_changed_key(key)
+        handle = self._handle
+        self._handle += 1
+        self._monitors[handle] = GSettingsCallback(handle, key, callback)
+        # Gio only emits changes for keys that have been read while being watched
+        self.get_value(key)
+        return handle
+
+    def disconnect(self, handle):
+        if handle in self._monitors:
+            del self._monitors[handle]
+
+    def get_value(self, key):
+        """
+        Get the value of a key as a python value.
+
+        Keyword arguments:
+        key        -- key name
+        """
+        key = _to_key_name(key)
+        if key not in self._cache:
+            self._cache[key] = self._settings.get_value(key).unpack()
+        return self._cache[key]
+
+    def get_string(self, key):
+        return self.get_value(key)
+
+    def close(self):
+        if self._changed_handle is not None:
+            self._settings.disconnect(self._changed_handle)
+            self._changed_handle = None
+        self._monitors = {}
+        self._cache = {}
+
+    """
+    Private
+    """
+
+    def _changed(self, settings, key):
+        self._cache.pop(key, None)
+        for mon in list(self._monitors.values()):
+            if mon.key == key:
+                mon.callback()
+
+
+class DBusGSettings:
+    """
+    Settings for a schema, read using the gsettings command and monitored by
+    watching for calls to the dconf writer on the session bus. Only used if
+    Gio.Settings is not available. Only values of keys that are connected to
+    are cached, as changes to other keys are not followed.
+    """
+
     def __init__(self, schema_id):
         self.schema_id = schema_id
         self._handle = 1
+        self._cache = {}
         # DBUS session instance must be private or monitoring will not work properly
         self._session_bus = dbus.SessionBus(private=True)
         self._writer = dbus.Interface(self._session_bus.get_object("ca.desrt.dconf", "/ca/desrt/dconf/Writer/user"),
@@ -62,10 +162,7 @@ class GSettings:
         self._session_bus.add_message_filter(self._msg_cb)
 
     def connect(self, key, callback):
-        lst = key.split(":")
-        if lst[0] != "changed":
-            raise Exception("Only currently supported changed events")
-        key = lst[2]
+        key = _get_changed_key(key)
         handle = self._handle
         self._handle += 1
         self._monitors[handle] = GSettingsCallback(handle, key, callback)
@@ -73,16 +170,32 @@ class GSettings:
 
     def disconnect(self, handle):
         if handle in self._monitors:
+            key = self._monitors[handle].key
             del self._monitors[handle]
+            if not self._is_monitored(key):
+                self._cache.pop(key, None)
 
     def get_string(self, key):
+        key = _to_key_name(key)
+        if key in self._cache:
+            return self._cache[key]
         _, result = self._get_status_output("gsettings get %s %s" % (self.schema_id, key))
         if len(result) > 0:
             result = result.replace("\n", "")
             if result.startswith("'"):
-                return result[1:-1]
+                result = result[1:-1]
+            # Only monitored keys find out about changes, so only they may be cached
+            if self._is_monitored(key):
+                self._cache[key] = result
             return result
 
+    def close(self):
+        self._monitors = {}
+        self._cache = {}
+        if self._match_string is not None:
+            self._session_bus.remove_match_string(self._match_string)
+            self._match_string = None
+
     @staticmethod
     def _get_status_output(cmd):
         pipe = os.popen('{ ' + cmd + '; } 2>/dev/null', 'r')
@@ -96,6 +209,12 @@ class GSettings:
             text = text[:-1]
         return sts, text
 
+    def _is_monitored(self, key):
+        for mon in list(self._monitors.values()):
+            if mon.key == key:
+                return True
+        return False
+
     def _changed(self, key):
         s = ""
         for b in key:
@@ -106,13 +225,17 @@ class GSettings:
         li = s.rfind("/")
         if li > 0:
             s_id = s[:li][1:].replace("/", ".")
-            k = s[li + 1:].replace("-", "_")
+            k = s[li + 1:]
             if s_id == self.schema_id:
-                for m in self._monitors:
-                    mon = self._monitors[m]
+                for mon in list(self._monitors.values()):
                     if mon.key == k:
                         # Bit rubbish, but we need to give dconf time to update
-                        gobject.timeout_add(1000, mon.callback)
+                        gobject.timeout_add(1000, self._notify, k, mon.callback)
+
+    def _notify(self, key, callback):
+        self._cache.pop(key, None)
+        callback()
+        return False
 
     def _msg_cb(self, bus, msg):
         # Only interested in method calls
@@ -121,4 +244,22 @@ class GSettings:
                 self._changed(*msg.get_args_list())
 
     def __del__(self):
-        self._session_bus.remove_match_string(self._match_string)
+        if self._match_string is not None:
+            self._session_bus.remove_match_string(self._match_string)
+
+
+"""
+Private
+"""
+
+
+def _to_key_name(key):
+    # Keys have historically been given with underscores, GSettings uses hyphens
+    return key.replace("_", "-")
+
+
+def _get_changed_key(signal):
+    lst = signal.split(":")
+    if lst[0] != "changed" or len(lst) != 3:
+        raise Exception("Only currently supported changed events")
+    return _to_key_name(lst[2])
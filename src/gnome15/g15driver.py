@@ -16,10 +16,13 @@
 
 import colorsys
 import logging
+import threading
 from threading import Event
 # from threading import Lock
 import time
 
+import util.g15encode as g15encode
+import util.g15pythonlang as g15pythonlang
 import util.g15scheduler as g15scheduler
 
 logger = logging.getLogger(__name__)
@@ -185,6 +188,28 @@ CAIRO_IMAGE_FORMAT = 4
 
 FX_QUEUE = "ControlEffects"
 
+"""
+How long (in seconds) a disconnecting driver waits for the last frame to be
+sent to the device
+"""
+FRAME_OUTPUT_FLUSH_TIMEOUT = 2.0
+
+"""
+Maximum rate (per second) at which fading or blinking controls are updated
+"""
+ANIMATION_FPS = 30
+
+"""
+Maximum number of times a second that control changes are written to a device
+"""
+CONTROL_WRITE_RATE = 50
+
+"""
+How long (in seconds) stopping a control writer waits for a batch that is
+already being written
+"""
+CONTROL_WRITER_STOP_TIMEOUT = 2.0
+
 seq_no = 0
 
 
@@ -198,6 +223,26 @@ def get_key_names(keys):
     return key_names
 
 
+def ease_linear(progress):
+    """
+    Easing curve that changes at a constant rate
+    
+    Keyword arguments:
+    progress   --    progress from 0.0 to 1.0
+    """
+    return progress
+
+
+def ease_in_out(progress):
+    """
+    Easing curve that starts and finishes slowly (smoothstep)
+    
+    Keyword arguments:
+    progress   --    progress from 0.0 to 1.0
+    """
+    return progress * progress * (3.0 - 2.0 * progress)
+
+
 def zeroize(val):
     """
     Zeroise a control value (will be used for the fully off value). The type
@@ -318,7 +363,6 @@ class AbstractControlAcquisition(object):
         self.val = None
         self.on_released = None
         self.reset_timer = None
-        self.fade_timer = None
         self.on = False
         self._released = False
         self._waiting = False
@@ -331,31 +375,42 @@ class AbstractControlAcquisition(object):
         self._condition.wait()
         self._waiting = False
 
-    def fade(self, percentage=100.0, duration=1.0, release=False, step=1):
+    def fade(self, percentage=100.0, duration=1.0, release=False, step=1, easing=ease_in_out):
+        """
+        Fade the value down to a percentage of its current value. The fade is
+        run by the driver's ControlAnimator.
+        
+        Keyword arguments:
+        percentage    --    how much to fade by (100.0 is fully off)
+        duration      --    duration of the fade in seconds
+        release       --    release the control when the fade completes
+        step          --    no longer used, the value changes at the animation rate
+        easing        --    easing curve
+        """
         target_val = self.get_target_value(self.val, percentage)
         if self.val != target_val:
-            self.fade_cancelled = False
-            self._reduce((duration / float(self.val - target_val)) * step, target_val, release, step)
+            self.driver.animator.start(FadeAnimation(self, target_val, duration, release, easing))
         elif release:
             self.driver.release_control(self)
 
     def get_target_value(self, val, percentage):
-        return val - int((float(val) / 100.0) * percentage)
+        return val - int(round((float(val) / 100.0) * percentage))
 
-    def blink(self, off_val=0, delay=0.5, duration=None, blink_started=None):
-        if blink_started is None:
-            blink_started = time.time()
+    def blink(self, off_val=0, delay=0.5, duration=None):
+        """
+        Switch between the current value and an 'off' value. The blink is run
+        by the driver's ControlAnimator. Returns the BlinkAnimation.
+        
+        Keyword arguments:
+        off_val       --    value when off, or a function that returns it
+        delay         --    time in seconds between each switch
+        duration      --    how long to blink for, or None to blink until the value is set
+        """
         self.cancel_fade()
         self.cancel_reset()
-        if self.on:
-            self.adjust(self.val)
-        else:
-            self.adjust(off_val if isinstance(off_val, int) or isinstance(off_val, tuple) else off_val())
-        self.on = not self.on
-        if duration is None or time.time() < blink_started + duration:
-            self.reset_timer = g15scheduler.queue(FX_QUEUE, "Blink", delay, self.blink, off_val, delay, duration,
-                                                  blink_started)
-        return self.reset_timer
+        animation = BlinkAnimation(self, off_val, delay, duration)
+        self.driver.animator.start(animation)
+        return animation
 
     def is_active(self):
         raise Exception("Not implemented")
@@ -390,13 +445,13 @@ class AbstractControlAcquisition(object):
         if self.reset_timer:
             self.reset_timer.cancel()
             self.reset_timer = None
+        self.driver.animator.cancel(self, BlinkAnimation)
 
     def get_value(self):
         return self.val
 
     def cancel_fade(self):
-        if self.fade_timer is not None:
-            self.fade_cancelled = True
+        self.driver.animator.cancel(self, FadeAnimation)
 
     def _cleanup(self):
         self.cancel_reset()
@@ -406,17 +461,6 @@ class AbstractControlAcquisition(object):
     Private
     """
 
-    def _reduce(self, interval, target_val, release, step):
-        if not self.fade_cancelled:
-            if self.val > target_val:
-                self.set_value(self.val - step)
-            if self.val == target_val:
-                if release:
-                    self.driver.release_control(self)
-            else:
-                self.fade_timer = g15scheduler.queue(FX_QUEUE, "Fade", interval, self._reduce, interval, target_val,
-                                                     release, step)
-
     def _notify_released(self):
         if self._released:
             raise Exception("Already released")
@@ -437,10 +481,9 @@ class ControlAcquisition(AbstractControlAcquisition):
             ctrls = self.driver.acquired_controls[self.control.id]
             return len(ctrls) > 0 and self in ctrls and ctrls.index(self) == len(ctrls) - 1
 
-    def blink(self, off_val=None, delay=0.5, duration=None, blink_started=None):
-        AbstractControlAcquisition.blink(self, (
-            (0, 0, 0) if isinstance(self.control.value, tuple) else 0) if off_val is None else off_val, delay, duration,
-                                         blink_started)
+    def blink(self, off_val=None, delay=0.5, duration=None):
+        return AbstractControlAcquisition.blink(self, (
+            (0, 0, 0) if isinstance(self.control.value, tuple) else 0) if off_val is None else off_val, delay, duration)
 
     def release(self):
         self.driver.release_control(self)
@@ -450,20 +493,6 @@ class ControlAcquisition(AbstractControlAcquisition):
             self.control.value = val
             self.driver.update_control(self.control)
 
-    def fade(self, percentage=100.0, duration=1.0, release=False, step=1):
-        if isinstance(self.val, int):
-            AbstractControlAcquisition.fade(self, percentage, duration, release)
-        else:
-            self.fade_cancelled = False
-            target_val = self.get_target_value(self.val, percentage)
-            h, s, v = self.rgb_to_hsv(self.val)
-            t_h, t_s, t_v = self.rgb_to_hsv(target_val)
-            diff = float(v - t_v)
-            if diff > 0:
-                self._reduce((duration / diff) * step, target_val, release, step)
-            elif release:
-                self.driver.release_control(self)
-
     def get_target_value(self, val, percentage):
         if isinstance(self.val, int):
             return AbstractControlAcquisition.get_target_value(self, val, percentage)
@@ -483,27 +512,500 @@ class ControlAcquisition(AbstractControlAcquisition):
         r, g, b = colorsys.hsv_to_rgb(float(h) / 255.0, float(s) / 255.0, float(v) / 255.0)
         return int(r * 255.0), int(g * 255.0), int(b * 255.0)
 
+
+class ControlAnimation(object):
+    """
+    Changes the value of a control acquisition over time. Animations are run
+    by a driver's ControlAnimator, which asks each for its value on every tick.
+    """
+
+    def __init__(self, acquisition, duration=None):
+        """
+        Constructor
+        
+        Keyword arguments:
+        acquisition   --    control acquisition
+        duration      --    duration in seconds, or None to run until cancelled
+        """
+        self.acquisition = acquisition
+        self.duration = duration
+        self.started = g15pythonlang.monotonic()
+
+    def is_complete(self, now):
+        return self.duration is not None and now >= self.started + self.duration
+
+    def get_value(self, now):
+        """
+        Get the value the control should have at a time
+        
+        Keyword arguments:
+        now           --    time, from g15pythonlang.monotonic()
+        """
+        raise NotImplementedError("Not implemented")
+
+    def get_final_value(self):
+        """
+        Get the value the control should be left at when the animation completes
+        """
+        raise NotImplementedError("Not implemented")
+
+    def apply(self, value):
+        """
+        Called by the animator with each new value (before the control itself
+        is updated)
+        """
+        pass
+
+    def completed(self):
+        """
+        Called by the animator when the animation completes (but not if it is
+        cancelled)
+        """
+        pass
+
+
+class FadeAnimation(ControlAnimation):
+    """
+    Fades the value of an acquisition from its current value to a target. RGB
+    values are faded channel by channel, which keeps the hue and saturation
+    (just as reducing the HSV value would).
+    """
+
+    def __init__(self, acquisition, target_val, duration, release=False, easing=ease_in_out):
+        ControlAnimation.__init__(self, acquisition, max(0.0, duration))
+        self.from_val = acquisition.val
+        self.target_val = target_val
+        self.release = release
+        self.easing = easing
+
+    def get_value(self, now):
+        progress = self.easing(min(1.0, (now - self.started) / self.duration)) if self.duration > 0 else 1.0
+        if isinstance(self.from_val, tuple):
+            return tuple(int(round(f + (t - f) * progress)) for f, t in zip(self.from_val, self.target_val))
+        return int(round(self.from_val + (self.target_val - self.from_val) * progress))
+
+    def get_final_value(self):
+        return self.target_val
+
+    def apply(self, value):
+        self.acquisition.val = value
+
+    def completed(self):
+        if self.release and not self.acquisition._released:
+            self.acquisition.driver.release_control(self.acquisition)
+
+
+class BlinkAnimation(ControlAnimation):
+    """
+    Switches an acquisition between its value and an 'off' value. When the
+    duration (if any) is up, the control is left at its value.
+    """
+
+    def __init__(self, acquisition, off_val, delay, duration=None):
+        ControlAnimation.__init__(self, acquisition, duration)
+        self.off_val = off_val
+        self.delay = delay
+        self.starts_on = acquisition.on
+
+    def get_value(self, now):
+        phase = int((now - self.started) / self.delay) if self.delay > 0 else 0
+        on = (phase % 2 == 0) == self.starts_on
+        # As before, 'on' is the state the next switch will show
+        self.acquisition.on = not on
+        if on:
+            return self.acquisition.val
+        return self.off_val if isinstance(self.off_val, (int, tuple)) else self.off_val()
+
+    def get_final_value(self):
+        self.acquisition.on = True
+        return self.acquisition.val
+
+
+class ControlAnimator(object):
+    """
+    Runs the fades and blinks of all of a driver's control acquisitions from a
+    single clock. On each tick (at most ANIMATION_FPS times a second, and only
+    while something is animating) every animation is asked for its current
+    value, and each control is then written at most once. Controls are only
+    written if their value has actually changed, and only for the active
+    acquisition of each control.
+    """
+
+    def __init__(self, driver, fps=ANIMATION_FPS):
+        """
+        Constructor
+        
+        Keyword arguments:
+        driver        --    driver whose controls are animated
+        fps           --    maximum number of ticks per second
+        """
+        self.driver = driver
+        self.fps = fps
+        self.ticks = 0
+        self.writes = 0
+        self.skipped = 0
+        self._lock = threading.RLock()
+        self._animations = {}
+        self._scheduled = False
+
+    def start(self, animation):
+        """
+        Start an animation, replacing any other animation of the same
+        acquisition.
+        
+        Keyword arguments:
+        animation     --    animation
+        """
+        with self._lock:
+            self._animations[animation.acquisition] = animation
+            if not self._scheduled:
+                self._scheduled = True
+                g15scheduler.execute(FX_QUEUE, "Animate", self._tick)
+
+    def cancel(self, acquisition, animation_class=ControlAnimation):
+        """
+        Stop the animation of an acquisition, leaving the control at its
+        current value.
+        
+        Keyword arguments:
+        acquisition       --    control acquisition
+        animation_class   --    only cancel animations of this type
+        """
+        with self._lock:
+            animation = self._animations.get(acquisition)
+            if isinstance(animation, animation_class):
+                del self._animations[acquisition]
+
+    def cancel_all(self):
+        with self._lock:
+            self._animations = {}
+
+    def is_animating(self, acquisition):
+        return acquisition in self._animations
+
+    def get_statistics(self):
+        return {
+            "ticks": self.ticks,
+            "writes": self.writes,
+            "skipped": self.skipped
+        }
+
     """
     Private
     """
 
-    def _reduce(self, interval, target_val, release, step):
-        if not self.fade_cancelled:
-            if isinstance(self.val, int):
-                AbstractControlAcquisition._reduce(self, interval, target_val, release, step)
-            else:
-                if self.val > target_val:
-                    h, s, v = self.rgb_to_hsv(self.val)
-                    v = max(0, v - step)
-                    new_rgb = self.hsv_to_rgb((h, s, v))
-                    if new_rgb == self.val:
-                        new_rgb = target_val
-                    self.set_value(new_rgb)
-                if self.val <= target_val:
-                    if release and not self._released:
-                        self.driver.release_control(self)
+    def _tick(self):
+        now = g15pythonlang.monotonic()
+        values = {}
+        completed = []
+        with self._lock:
+            self.ticks += 1
+            for acquisition, animation in list(self._animations.items()):
+                if animation.is_complete(now):
+                    del self._animations[acquisition]
+                    completed.append(animation)
+                    value = animation.get_final_value()
                 else:
-                    g15scheduler.queue(FX_QUEUE, "Fade", interval, self._reduce, interval, target_val, release, step)
+                    value = animation.get_value(now)
+                animation.apply(value)
+                if acquisition.is_active():
+                    values[acquisition.control.id] = (acquisition.control, value)
+            if len(self._animations) > 0:
+                g15scheduler.queue(FX_QUEUE, "Animate",
+                                   max(0.0, now + 1.0 / self.fps - g15pythonlang.monotonic()), self._tick)
+            else:
+                self._scheduled = False
+
+        for control, value in values.values():
+            if control.value != value:
+                control.value = value
+                self.driver.update_control(control)
+                self.writes += 1
+            else:
+                self.skipped += 1
+        for animation in completed:
+            animation.completed()
+
+
+class FrameOutput(object):
+    """
+    Sends encoded frames to a device using a thread of its own, so that
+    painting never waits for the device. Only one frame waits to be sent at a
+    time. A frame posted while another is still waiting replaces it, so a slow
+    device is always sent the most recent frame and stale ones are dropped
+    rather than queued.
+    """
+
+    def __init__(self, name, transmit):
+        """
+        Constructor
+        
+        Keyword arguments:
+        name            -- name of the output thread
+        transmit        -- function that sends a frame to the device
+        """
+        self.name = name
+        self._transmit = transmit
+        self._condition = threading.Condition()
+        self._pending = None
+        self._sending = None
+        self._thread = None
+        self._stopping = False
+        self.posted = 0
+        self.replaced = 0
+        self.transmitted = 0
+        self.last_transmit_time = 0.0
+        self.max_transmit_time = 0.0
+
+    def post(self, frame):
+        """
+        Post a frame to be sent, replacing any frame that is still waiting.
+        
+        Keyword arguments:
+        frame           -- encoded frame
+        """
+        with self._condition:
+            self.posted += 1
+            if self._pending is not None:
+                self.replaced += 1
+            self._pending = frame
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name=self.name)
+                self._thread.setDaemon(True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def get_free_buffer(self, buffers):
+        """
+        Get the first of a list of buffers that is neither waiting to be sent
+        nor being sent, so it may be encoded into. Three buffers are always
+        enough. Frames may be the buffers themselves, or tuples that start
+        with the buffer.
+        
+        Keyword arguments:
+        buffers         -- list of buffers
+        """
+        with self._condition:
+            for buf in buffers:
+                if not _holds(self._pending, buf) and not _holds(self._sending, buf):
+                    return buf
+
+    def wait(self, timeout=None):
+        """
+        Wait until there are no frames waiting or being sent. Returns False
+        if the timeout expired first.
+        
+        Keyword arguments:
+        timeout         -- maximum time to wait in seconds, or None to wait forever
+        """
+        if threading.current_thread() is self._thread:
+            return True
+        end = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while self._pending is not None or self._sending is not None:
+                remaining = None if end is None else end - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def stop(self):
+        """
+        Stop the output thread, dropping any frame that has not been sent. It
+        will be started again when the next frame is posted.
+        """
+        with self._condition:
+            thread = self._thread
+            self._stopping = True
+            self._pending = None
+            self._condition.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def get_statistics(self):
+        return {
+            "frames_posted": self.posted,
+            "frames_replaced": self.replaced,
+            "frames_transmitted": self.transmitted,
+            "transmit_last_us": int(self.last_transmit_time * 1000000),
+            "transmit_max_us": int(self.max_transmit_time * 1000000)
+        }
+
+    """
+    Private
+    """
+
+    def _run(self):
+        logger.debug("Started frame output %s", self.name)
+        try:
+            while True:
+                with self._condition:
+                    while self._pending is None and not self._stopping:
+                        self._condition.wait()
+                    if self._stopping:
+                        break
+                    frame = self._sending = self._pending
+                    self._pending = None
+                started = time.time()
+                try:
+                    self._transmit(frame)
+                except Exception as e:
+                    logger.error("Failed to send frame.", exc_info=e)
+                finally:
+                    taken = time.time() - started
+                    with self._condition:
+                        self._sending = None
+                        self.transmitted += 1
+                        self.last_transmit_time = taken
+                        self.max_transmit_time = max(self.max_transmit_time, taken)
+                        self._condition.notify_all()
+        finally:
+            with self._condition:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+                self._condition.notify_all()
+            logger.debug("Stopped frame output %s", self.name)
+
+
+class ControlWriter(object):
+    """
+    Writes control changes to a device using a thread of its own. Changes to a
+    control that has not been written yet are merged (the value is read when
+    it is written, so the latest always wins), and all waiting changes are
+    written together, at most CONTROL_WRITE_RATE times a second.
+    """
+
+    def __init__(self, name, write, rate=CONTROL_WRITE_RATE):
+        """
+        Constructor
+        
+        Keyword arguments:
+        name            -- name of the writer thread
+        write           -- function that writes a list of controls to the device
+        rate            -- maximum number of batches written per second
+        """
+        self.name = name
+        self.rate = rate
+        self._write = write
+        self._condition = threading.Condition()
+        self._write_lock = threading.RLock()
+        self._pending = []
+        self._thread = None
+        self._last_write = 0.0
+        self.posted = 0
+        self.merged = 0
+        self.batches = 0
+        self.written = 0
+
+    def post(self, control):
+        """
+        Post a control to be written.
+        
+        Keyword arguments:
+        control         -- control
+        """
+        with self._condition:
+            self.posted += 1
+            if control in self._pending:
+                self.merged += 1
+                return
+            self._pending.append(control)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name)
+                self._thread.setDaemon(True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self):
+        """
+        Write any waiting changes now, on the calling thread. Returns once
+        they, and any batch already being written, are on the device.
+        """
+        with self._write_lock:
+            with self._condition:
+                controls = self._pending
+                self._pending = []
+            if len(controls) > 0:
+                self._write_batch(controls)
+
+    def stop(self):
+        """
+        Stop the writer thread, dropping any changes not yet written. It will
+        be started again when the next change is posted.
+
+        The thread is detached straight away, so a stopped writer never holds
+        up a new one. A batch that is already being written is waited for, but
+        only for CONTROL_WRITER_STOP_TIMEOUT seconds, as the device's write
+        function may need a lock the caller holds. Callers should still not
+        hold such a lock while stopping.
+        """
+        with self._condition:
+            thread = self._thread
+            self._thread = None
+            self._pending = []
+            self._condition.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(CONTROL_WRITER_STOP_TIMEOUT)
+            if thread.is_alive():
+                logger.warning("Timed out waiting for control writer %s to stop", self.name)
+
+    def get_statistics(self):
+        return {
+            "controls_posted": self.posted,
+            "controls_merged": self.merged,
+            "controls_written": self.written,
+            "control_batches": self.batches
+        }
+
+    """
+    Private
+    """
+
+    def _write_batch(self, controls):
+        self._last_write = time.time()
+        self.batches += 1
+        self.written += len(controls)
+        try:
+            self._write(controls)
+        except Exception as e:
+            logger.error("Failed to write controls.", exc_info=e)
+
+    def _run(self):
+        logger.debug("Started control writer %s", self.name)
+        me = threading.current_thread()
+        try:
+            while True:
+                with self._condition:
+                    while len(self._pending) == 0 and self._thread is me:
+                        self._condition.wait()
+                    if self._thread is not me:
+                        break
+
+                    # Let changes gather until the next batch is due
+                    delay = self._last_write + 1.0 / self.rate - time.time()
+                    while delay > 0 and self._thread is me:
+                        self._condition.wait(delay)
+                        delay = self._last_write + 1.0 / self.rate - time.time()
+                    if self._thread is not me:
+                        break
+                with self._write_lock:
+                    with self._condition:
+                        if self._thread is not me:
+                            break
+                        controls = self._pending
+                        self._pending = []
+                    if len(controls) > 0:
+                        self._write_batch(controls)
+        finally:
+            with self._condition:
+                if self._thread is me:
+                    self._thread = None
+            logger.debug("Stopped control writer %s", self.name)
+
+
+def _holds(frame, buf):
+    return frame is buf or (isinstance(frame, tuple) and len(frame) > 0 and frame[0] is buf)
 
 
 class AbstractDriver(object):
@@ -518,6 +1020,10 @@ class AbstractDriver(object):
         self.connecting = False
         self.all_off_on_disconnect = True
         self.allow_multiple = True
+        self.animator = ControlAnimator(self)
+        self.frame_diff = g15encode.FrameDiff()
+        self.frame_output = FrameOutput("FrameOutput-%s-%d" % (id, self.seq), self.transmit)
+        self.control_writer = ControlWriter("ControlWriter-%s-%d" % (id, self.seq), self.on_update_controls)
         self._reset_state()
 
     def has_memory_bank(self):
@@ -527,6 +1033,7 @@ class AbstractDriver(object):
         return False
 
     def release_all_acquisitions(self):
+        self.animator.cancel_all()
         self.acquired_controls = {}
         values = dict(self.initial_acquired_control_values)
         for k in values:
@@ -602,6 +1109,12 @@ class AbstractDriver(object):
                     elif isinstance(c.value, tuple):
                         c.value = (0, 0, 0)
                     self.update_control(c)
+            self.control_writer.flush()
+            self.control_writer.stop()
+            # Let the last frame reach the device before it goes away
+            if not self.frame_output.wait(FRAME_OUTPUT_FLUSH_TIMEOUT):
+                logger.warning("Timed out waiting for the last frame to be sent")
+            self.frame_output.stop()
             self._on_disconnect()
         finally:
             self.disconnecting = False
@@ -621,6 +1134,7 @@ class AbstractDriver(object):
             raise Exception("Already connected")
         logger.info("Connecting driver %s", self.get_name())
         self.connecting = True
+        self.frame_diff.reset()
         try:
             self._on_connect()
         finally:
@@ -688,10 +1202,55 @@ class AbstractDriver(object):
 
     def paint(self, image):
         """
-        Repaint the screen. 
+        Repaint the screen. The image is encoded on the calling thread, then
+        sent to the device by the frame output thread, so this does not wait
+        for the device.
+        
+        Drivers either implement encode() and transmit(), or override this
+        to paint synchronously.
+        
+        Keyword arguments:
+        image        -- cairo surface
+        """
+        if not self.is_connected():
+            return
+        frame = self.encode(image)
+        if frame is not None:
+            self.frame_output.post(frame)
+
+    def encode(self, image):
+        """
+        Convert an image to the format the device expects. Returns the frame,
+        or None if there is nothing to send. This runs on the thread that is
+        painting, and must not block on the device. The frame must not be
+        altered once returned, see FrameOutput.get_free_buffer().
+        
+        Keyword arguments:
+        image        -- cairo surface
+        """
+        raise NotImplementedError("Not implemented")
+
+    def transmit(self, frame):
+        """
+        Send an encoded frame to the device. This runs on the frame output
+        thread and may block. Implementations should pass the frame through
+        self.frame_diff so unchanged frames are not written to the device.
+        
+        Keyword arguments:
+        frame        -- frame returned by encode()
         """
         raise NotImplementedError("Not implemented")
 
+    def get_frame_statistics(self):
+        """
+        Get a dictionary of counters for frames sent to, and skipped because
+        they were identical to what is already on, the LCD, and for frames
+        posted to and replaced in the frame output
+        """
+        stats = self.frame_diff.get_statistics()
+        stats.update(self.frame_output.get_statistics())
+        return stats
+
     def update_control(self, control):
         """
         Synchronize a control with the keyboard. For example, if the control was for the
@@ -701,13 +1260,17 @@ class AbstractDriver(object):
         Subclasses should not override this function, instead they should implement
         on_update_control()
         
+        The device is written to by the control writer thread, shortly after
+        this returns. Further changes to the same control before then are
+        merged, so only the latest value is written.
+        
         Keyword arguments:
         control        -- control to update
         """
         if self.check_control(control):
             for l in self.control_update_listeners:
                 l.control_updated(control)
-            self.on_update_control(control)
+            self.control_writer.post(control)
 
     @staticmethod
     def check_control(control):
@@ -721,6 +1284,18 @@ class AbstractDriver(object):
     def on_update_control(self, control):
         raise NotImplementedError("Not implemented")
 
+    def on_update_controls(self, controls):
+        """
+        Write a batch of controls to the device. Called on the control writer
+        thread. By default, on_update_control() is called for each control,
+        subclasses may override to write them more efficiently.
+        
+        Keyword arguments:
+        controls       -- list of controls
+        """
+        for control in controls:
+            self.on_update_control(control)
+
     def grab_keyboard(self, callback):
         """
         Start receiving events when the additional keys (G keys, L keys and M keys)
@@ -797,6 +1372,7 @@ class AbstractDriver(object):
         self.control_update_listeners = []
         self.acquired_controls = {}
         self.initial_acquired_control_values = {}
+        self.frame_diff.reset()
 
 
 def rgb_to_hex(rgb):
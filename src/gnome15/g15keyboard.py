@@ -64,6 +64,90 @@ class KeyState:
         return "%s = %s [consumed = %s]" % (self.key, g15profile.to_key_state_name(self.state_id), str(self.consumed))
 
 
+class MacroDispatchTable:
+    """
+    The macros (and action bindings) that may be activated for a particular
+    profile chain and memory bank, compiled so that a key event only needs to
+    look at the macros that contain that key. Each key is given a bit, and each
+    macro the mask of the bits of its keys, so whether all of a macro's keys
+    are in a particular state is a single compare.
+
+    Tables are immutable, a new one is built whenever the profile or memory bank
+    changes.
+    """
+
+    def __init__(self, uinput_macros=(), normal_macros=(), held_macros=(), action_keys=None):
+        self.bits = {}
+        self.action_keys = action_keys
+        self.uinput_macros = self._compile(uinput_macros)
+        self.normal_macros = self._compile(normal_macros)
+        self.held_macros = self._compile(held_macros)
+        self.actions = self._compile(action_keys.values() if action_keys else ())
+        self.uinput_index = self._index(self.uinput_macros)
+        self.normal_index = self._index(self.normal_macros)
+        self.held_index = self._index(self.held_macros)
+        self.action_index = self._index(self.actions)
+
+    def get_candidates(self, entries, index, key=None):
+        """
+        Get the (mask, macro) entries that may be activated by a change in
+        the state of the given key, in the order the macros were added.
+
+        Keyword arguments:
+        entries        -- all entries, returned if key is None
+        index          -- index of entries by key
+        key            -- key that changed, or None for all entries
+        """
+        if key is None:
+            return entries
+        return index.get(key, ())
+
+    def get_state_masks(self, key_states):
+        """
+        Get the masks of the keys that are in each state and have not been
+        consumed. A tuple of a dictionary of masks keyed by state ID, and a mask
+        of the released keys whose release has not been defeated is returned.
+
+        Keyword arguments:
+        key_states        -- dictionary of KeyState objects, keyed by key
+        """
+        masks = {g15driver.KEY_STATE_UP: 0, g15driver.KEY_STATE_DOWN: 0, g15driver.KEY_STATE_HELD: 0}
+        released = 0
+        for key, key_state in key_states.items():
+            bit = self.bits.get(key)
+            if bit is not None and key_state.state_id in masks and not key_state.is_consumed():
+                masks[key_state.state_id] |= bit
+                if key_state.state_id == g15driver.KEY_STATE_UP and not key_state.defeat_release:
+                    released |= bit
+        return masks, released
+
+    """
+    Private
+    """
+
+    def _compile(self, macros):
+        entries = []
+        for m in macros:
+            mask = 0
+            for k in m.keys:
+                bit = self.bits.get(k)
+                if bit is None:
+                    bit = 1 << len(self.bits)
+                    self.bits[k] = bit
+                mask |= bit
+            if mask:
+                entries.append((mask, m))
+        return entries
+
+    @staticmethod
+    def _index(entries):
+        index = {}
+        for entry in entries:
+            for k in set(entry[1].keys):
+                index.setdefault(k, []).append(entry)
+        return index
+
+
 class G15KeyHandler:
     """
     Main class for handling key events. There should be one instance of this
@@ -90,9 +174,7 @@ class G15KeyHandler:
         self.__conf_client = self.__screen.conf_client
         self.__repeat_macros = []
         self.__macro_repeat_timer = None
-        self.__uinput_macros = []
-        self.__normal_macros = []
-        self.__normal_held_macros = []
+        self.__dispatch = MacroDispatchTable()
         self.__notify_handles = []
         self.__key_states = {}
 
@@ -107,7 +189,7 @@ class G15KeyHandler:
         screen_key = "/apps/gnome15/%s" % self.__screen.device.uid
         logger.info("Starting %s's key handler.", self.__screen.device.uid)
         g15profile.profile_listeners.append(self._profile_changed)
-        self.__screen.screen_change_listeners.append(self)
+        self.__screen.add_screen_change_listener(self)
         self.__notify_handles.append(
             self.__conf_client.notify_add("%s/active_profile" % screen_key, self._active_profile_changed))
         logger.info("Starting of %s's key handler is complete.", self.__screen.device.uid)
@@ -119,8 +201,7 @@ class G15KeyHandler:
         """
         logger.info("Stopping key handler for %s", self.__screen.device.uid)
         g15scheduler.stop_queue(self.queue_name)
-        if self in self.__screen.screen_change_listeners:
-            self.__screen.screen_change_listeners.remove(self)
+        self.__screen.remove_screen_change_listener(self)
         if self._profile_changed in g15profile.profile_listeners:
             g15profile.profile_listeners.remove(self._profile_changed)
         for h in self.__notify_handles:
@@ -152,17 +233,26 @@ class G15KeyHandler:
         return 1
 
     def _profile_changed(self, profile_id, device_uid):
-        self._reload_active_macros()
+        if device_uid == self.__screen.device.uid:
+            self._reload_active_macros()
 
     """
     Private
     """
 
     def _reload_active_macros(self):
-        self.__normal_held_macros = []
-        self.__normal_macros = []
-        self.__uinput_macros = []
-        self._build_macros()
+        uinput_macros = []
+        normal_macros = []
+        held_macros = []
+        self._build_macros(uinput_macros, normal_macros, held_macros)
+        self.__dispatch = MacroDispatchTable(uinput_macros, normal_macros, held_macros, self._get_action_keys())
+
+    def _get_action_keys(self):
+        driver = self.__screen.driver
+        return driver.get_action_keys() if driver is not None else None
+
+    def _get_macro_key_states(self, macro):
+        return [self.__key_states[k] for k in macro.keys]
 
     def _do_key_received(self, keys, state_id):
         """
@@ -199,17 +289,17 @@ class G15KeyHandler:
                     a press of the Macro key equals a "press" of the virtual key,
                     a release of the Macro key equals a "release" of the virtual key etc.  
                     """
-                    self._handle_uinput_macros()
+                    self._handle_uinput_macros(key)
 
                     """
                     Now the ordinary macros, processed on key_up
                     """
-                    self._handle_normal_macros()
+                    self._handle_normal_macros(key)
 
                     """
                     Now the actions
                     """
-                    self._handle_actions()
+                    self._handle_actions(key)
 
             """
             Now do the legacy 'post' handling.
@@ -232,97 +322,83 @@ class G15KeyHandler:
             """
             self.__screen.redraw()
 
-    def _handle_actions(self):
+    def _handle_actions(self, key=None):
         """
         This handles the default action bindings. The actions may have
         already re-mapped as a macro, in which case they will be ignored 
         here.
+
+        Keyword arguments:
+        key        -- key that changed state, or None to check all actions
         """
-        action_keys = self.__screen.driver.get_action_keys()
+        action_keys = self._get_action_keys()
         if action_keys:
-            for action in action_keys:
-                binding = action_keys[action]
-                f = 0
-                for k in binding.keys:
-                    if k in self.__key_states and \
-                            binding.state == self.__key_states[k].state_id and \
-                            not self.__key_states[k].is_consumed():
-                        f += 1
-                if f == len(binding.keys):
+            if self.__dispatch.action_keys is not action_keys:
+                # Driver changed since the macros were built
+                self._reload_active_macros()
+            table = self.__dispatch
+            masks, released = table.get_state_masks(self.__key_states)
+            for mask, binding in table.get_candidates(table.actions, table.action_index, key):
+                if masks.get(binding.state, 0) & mask == mask:
                     self._action_performed(binding)
                     for k in binding.keys:
                         self.__key_states[k].consume_until_release = True
+                    masks, released = table.get_state_masks(self.__key_states)
 
-    def _handle_normal_macros(self):
+    def _handle_normal_macros(self, key=None):
         """
         First check for any KEY_STATE_HELD macros. We do these first so KEY_STATE_UP
         macros don't consume the key states
-        """
-        for m in self.__normal_held_macros:
-            held = []
-            for k in m.keys:
-                if k in self.__key_states:
-                    key_state = self.__key_states[k]
-                    if not key_state.is_consumed() and key_state.state_id == g15driver.KEY_STATE_HELD:
-                        held.append(key_state)
 
-            if len(held) == len(m.keys):
-                self._handle_macro(m, g15driver.KEY_STATE_HELD, held)
+        Keyword arguments:
+        key        -- key that changed state, or None to check all macros
+        """
+        table = self.__dispatch
+        masks, released = table.get_state_masks(self.__key_states)
+        for mask, m in table.get_candidates(table.held_macros, table.held_index, key):
+            if masks[g15driver.KEY_STATE_HELD] & mask == mask:
+                self._handle_macro(m, g15driver.KEY_STATE_HELD, self._get_macro_key_states(m))
+                masks, released = table.get_state_masks(self.__key_states)
 
         """
         Search for all the non-uinput macros that would be activated by the
         current key state. In this case, KEY_STATE_UP macros are looked for
         """
-        for m in self.__normal_macros:
-            up = []
-            held = []
-            down = []
-            for k in m.keys:
-                if k in self.__key_states:
-                    key_state = self.__key_states[k]
-                    if not key_state.is_consumed() and key_state.state_id == g15driver.KEY_STATE_DOWN:
-                        down.append(key_state)
-                    if not key_state.is_consumed() and key_state.state_id == g15driver.KEY_STATE_UP \
-                            and not key_state.defeat_release:
-                        up.append(key_state)
-                    if not key_state.is_consumed() and key_state.state_id == g15driver.KEY_STATE_HELD:
-                        held.append(key_state)
-
-            if len(up) == len(m.keys):
-                self._handle_macro(m, g15driver.KEY_STATE_UP, up)
-            if len(down) == len(m.keys):
-                self._handle_macro(m, g15driver.KEY_STATE_DOWN, down)
-            if len(held) == len(m.keys):
-                self._handle_macro(m, g15driver.KEY_STATE_HELD, held)
-
-    def _handle_uinput_macros(self):
+        for mask, m in table.get_candidates(table.normal_macros, table.normal_index, key):
+            if released & mask == mask:
+                state = g15driver.KEY_STATE_UP
+            elif masks[g15driver.KEY_STATE_DOWN] & mask == mask:
+                state = g15driver.KEY_STATE_DOWN
+            elif masks[g15driver.KEY_STATE_HELD] & mask == mask:
+                state = g15driver.KEY_STATE_HELD
+            else:
+                continue
+            self._handle_macro(m, state, self._get_macro_key_states(m))
+            masks, released = table.get_state_masks(self.__key_states)
+
+    def _handle_uinput_macros(self, key=None):
         """
         Search for all the uinput macros that would be activated by the
         current key state, and emit events of the same type.
+
+        Keyword arguments:
+        key        -- key that changed state, or None to check all macros
         """
         uinput_repeat = False
-        for m in self.__uinput_macros:
-            down = []
-            up = []
-            held = []
-            for k in m.keys:
-                if k in self.__key_states:
-                    key_state = self.__key_states[k]
-                    if not key_state.is_consumed():
-                        if key_state.state_id == g15driver.KEY_STATE_UP and not key_state.defeat_release:
-                            up.append(key_state)
-                        if key_state.state_id == g15driver.KEY_STATE_DOWN:
-                            down.append(key_state)
-                        if key_state.state_id == g15driver.KEY_STATE_HELD:
-                            held.append(key_state)
-
-            if len(down) == len(m.keys):
-                self._handle_uinput_macro(m, g15driver.KEY_STATE_DOWN, down)
-            if len(up) == len(m.keys):
-                self._handle_uinput_macro(m, g15driver.KEY_STATE_UP, up)
-            if len(held) == len(m.keys):
-                self._handle_uinput_macro(m, g15driver.KEY_STATE_HELD, held)
+        table = self.__dispatch
+        masks, released = table.get_state_masks(self.__key_states)
+        for mask, m in table.get_candidates(table.uinput_macros, table.uinput_index, key):
+            if masks[g15driver.KEY_STATE_DOWN] & mask == mask:
+                state = g15driver.KEY_STATE_DOWN
+            elif released & mask == mask:
+                state = g15driver.KEY_STATE_UP
+            elif masks[g15driver.KEY_STATE_HELD] & mask == mask:
+                state = g15driver.KEY_STATE_HELD
                 uinput_repeat = True
+            else:
+                continue
+            self._handle_uinput_macro(m, state, self._get_macro_key_states(m))
+            masks, released = table.get_state_masks(self.__key_states)
 
         """
         Simulate a uinput repeat by just handling an empty key list.
@@ -398,7 +474,7 @@ class G15KeyHandler:
         if macro_list is None:
             macro_list = []
         if macro_keys is None:
-            macro_keys = []
+            macro_keys = set()
 
         if state is None:
             state = g15driver.KEY_STATE_UP
@@ -409,50 +485,63 @@ class G15KeyHandler:
                 if (not mapped_to_key and not m.is_uinput()) or \
                         (mapped_to_key and m.is_uinput()):
                     macro_list.append(m)
-                    macro_keys.append(m.key_list_key)
+                    macro_keys.add(m.key_list_key)
         if profile.base_profile is not None:
             profile = g15profile.get_profile(self.__screen.device, profile.base_profile)
             if profile is not None:
                 self._get_all_macros(profile, macro_list, macro_keys, mapped_to_key, state)
         return macro_list
 
-    def _build_macros(self, profile=None, macro_keys=None, held_macro_keys=None, down_macro_keys=None):
+    def _build_macros(self, uinput_macros, normal_macros, held_macros, profile=None, macro_keys=None,
+                      held_macro_keys=None, down_macro_keys=None):
+        """
+        Collect the macros for the current memory bank from the active profile
+        and its base profiles. Macros in a profile override those with the same
+        keys in its base profiles.
+
+        Keyword arguments:
+        uinput_macros     -- list to append uinput macros to
+        normal_macros     -- list to append other KEY_STATE_UP and KEY_STATE_DOWN macros to
+        held_macros       -- list to append KEY_STATE_HELD macros to
+        profile           -- root profile or None for active profile
+        """
         if profile is None:
             profile = g15profile.get_active_profile(self.__screen.device)
         if macro_keys is None:
-            macro_keys = []
+            macro_keys = set()
         if held_macro_keys is None:
-            held_macro_keys = []
+            held_macro_keys = set()
         if down_macro_keys is None:
-            down_macro_keys = []
+            down_macro_keys = set()
 
         bank = self.__screen.get_memory_bank()
         for m in profile.macros[g15driver.KEY_STATE_UP][bank - 1]:
             if m.key_list_key not in macro_keys:
                 if m.is_uinput():
-                    self.__uinput_macros.append(m)
+                    uinput_macros.append(m)
                 else:
-                    self.__normal_macros.append(m)
-                macro_keys.append(m.key_list_key)
+                    normal_macros.append(m)
+                macro_keys.add(m.key_list_key)
 
         for m in profile.macros[g15driver.KEY_STATE_DOWN][bank - 1]:
             if m.key_list_key not in down_macro_keys:
                 if m.is_uinput():
-                    self.__uinput_macros.append(m)
+                    uinput_macros.append(m)
                 else:
-                    self.__normal_macros.append(m)
-                down_macro_keys.append(m.key_list_key)
+                    normal_macros.append(m)
+                down_macro_keys.add(m.key_list_key)
 
         for m in profile.macros[g15driver.KEY_STATE_HELD][bank - 1]:
             if m.key_list_key not in held_macro_keys:
                 if not m.is_uinput():
-                    self.__normal_held_macros.append(m)
-                held_macro_keys.append(m.key_list_key)
+                    held_macros.append(m)
+                held_macro_keys.add(m.key_list_key)
 
         if profile.base_profile is not None:
             profile = g15profile.get_profile(self.__screen.device, profile.base_profile)
             if profile is not None:
-                self._build_macros(profile, macro_keys, held_macro_keys, down_macro_keys)
+                self._build_macros(uinput_macros, normal_macros, held_macros, profile, macro_keys,
+                                   held_macro_keys, down_macro_keys)
 
     @staticmethod
     def _check_key_state(new_state_id, key_state):
@@ -22,6 +22,7 @@ from gi.repository import GObject as gobject
 import util.g15scheduler as g15scheduler
 import util.g15cairo as g15cairo
 import util.g15icontools as g15icontools
+import util.g15gconf as g15gconf
 import g15theme
 import g15screen
 
@@ -43,6 +44,7 @@ class G15Plugin:
         self.screen = screen
         self.gconf_client = gconf_client
         self.gconf_key = gconf_key
+        self.conf_cache = g15gconf.get_cache(gconf_client)
         self.active = False
         self.__notify_handlers = []
 
@@ -62,26 +64,35 @@ class G15Plugin:
         new_theme.plugin = self
         return new_theme
 
-    def watch(self, key, callback):
+    def watch(self, key, callback, cached=False):
         """
         Watch for gconf changes for this plugin on a particular sub-key, calling
         the callback when the value changes. All watches will be removed when
         the plugin deactivates, so these should be added during the activate
         phase.
         
+        If cached is True, values under the key are also kept in conf_cache,
+        which is updated before the callback is invoked. Code that reads the
+        values often (e.g. while painting) should then read them from
+        conf_cache rather than gconf_client.
+        
         Keyword arguments:
         key            - sub-key (or None to monitor everything)
-        callback       - function to call on change
+        callback       - function to call on change (may be None if cached)
+        cached         - keep values in conf_cache
         """
         if isinstance(key, list):
             for k in key:
-                self.watch(k, callback)
+                self.watch(k, callback, cached)
             return
         if key is not None and key.startswith("/"):
             k = key
         else:
             k = "%s/%s" % (self.gconf_key, key) if key is not None else self.gconf_key
-        self.__notify_handlers.append(self.gconf_client.notify_add(k, callback))
+        if cached:
+            self.__notify_handlers.append(self.conf_cache.notify_add(k, callback))
+        else:
+            self.__notify_handlers.append(self.gconf_client.notify_add(k, callback))
 
     def activate(self):
         self.active = True
@@ -90,6 +101,9 @@ class G15Plugin:
     def deactivate(self):
         for h in self.__notify_handlers:
             self.gconf_client.notify_remove(h)
+        self.__notify_handlers = []
+        # Drop any timers still scheduled for methods of this plugin
+        g15scheduler.cancel_by_owner(self)
         self.active = False
 
     def destroy(self):
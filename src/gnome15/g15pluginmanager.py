@@ -41,9 +41,11 @@ Plugins are looked for in a number of locations.
                         
 The lifecycle of all plugins consists of 5 stages. 
 
-1. Loading - When the python module is loaded. This happens to all plugins,
-regardless of whether they are enabled or not. Any plugins that fail this
-stage will not be visible.
+1. Loading - When the plugin's metadata is read. This happens to all plugins,
+regardless of whether they are enabled or not. The metadata comes from a
+manifest cached by g15pluginmanifest, so the python module itself is only
+imported when it is first needed (usually when an enabled plugin is started).
+Any plugins that fail to import will fail to start.
 
 2. Initialise - This is when the plugin instance is created. All enabled
 plugins will go through this stage *once*. If a plugin is de-activated, and
@@ -62,21 +64,37 @@ or if Gnome15 itself is closing down.
 
 """
 
+from collections import OrderedDict
 import logging
 import os.path
 import sys
 import threading
+import time
 
 from gi.repository import GConf as gconf
+from gi.repository import GObject as gobject
+
+if sys.version_info < (3, 0):
+    import Queue
+else:
+    import queue as Queue
 
 import g15globals
 import g15driver
 import g15actions
+import g15pluginmanifest
+import util.g15scheduler as g15scheduler
+import util.g15pythonlang as g15pythonlang
 
 logger = logging.getLogger(__name__)
 
 imported_plugins = []
 
+"""
+How long (in seconds) it took to find all plugins and read their metadata
+"""
+discovery_time = 0.0
+
 """
 This list may be added to dynamically to add new plugin locations
 """
@@ -92,6 +110,22 @@ DEACTIVATING = 5
 DEACTIVATED = 6
 DESTROYING = 7
 
+"""
+Plugins that declare they may be activated in parallel are activated on this
+queue, by this many workers
+"""
+ACTIVATION_QUEUE = "PluginActivationQueue"
+ACTIVATION_WORKERS = 4
+
+"""
+How long (in seconds) to wait for a plugin to activate before moving on to
+the others. The plugin is left to finish activating in the background.
+"""
+ACTIVATION_TIMEOUT = 10.0
+
+# Guards the single instance check across all plugin managers
+_single_instance_lock = threading.Lock()
+
 
 def list_plugin_dirs(path):
     """
@@ -203,6 +237,32 @@ def is_passive_plugin(plugin_module):
     return getattr(plugin_module, 'passive', False)
 
 
+def get_activate_after(plugin_module):
+    """
+    Get the IDs of the plugins that must finish activating before this one
+    is activated (if they are being activated at the same time).
+    
+    Keyword arguments:
+    plugin_module -- plugin module instance
+    """
+    return getattr(plugin_module, 'activate_after', [])
+
+
+def is_activate_in_parallel(plugin_module):
+    """
+    Get if the provided plugin_module instance may be activated on the
+    activation queue, alongside other plugins. By default plugins are activated
+    one at a time on the gobject thread, as most create GTK widgets or connect
+    to gobject signals in activate(). Only plugins whose activate() is thread
+    safe (i.e. only use the screen and service API, and not GTK) should set
+    this.
+    
+    Keyword arguments:
+    plugin_module -- plugin module instance
+    """
+    return getattr(plugin_module, 'activate_in_parallel', False)
+
+
 def get_actions(plugin_module, device):
     """
     Get a dictionary of all the "Actions" this plugin uses. The key is
@@ -225,16 +285,18 @@ def get_actions(plugin_module, device):
 
 
 """
-Loads the python modules for all plugins for all known locations. This is done
-in two phases.
+Finds all plugins in all known locations. This is done in two phases.
 
 Firstly, the paths of all plugins are added to the python search path.
 
 Secondly, all of these directories are scanned for python files with the same
-name as the directory they are in. Each one of these is the main plugin module.
+name as the directory they are in. Each one of these is the main plugin module,
+which is represented by a PluginModule built from the cached manifest. The
+module is not imported until something other than its metadata is needed.
 
 TODO - These should really be using __init__.py
 """
+__discovery_started = time.time()
 all_plugin_directories = get_extra_plugin_dirs() + \
                          list_plugin_dirs(os.path.expanduser("~/.gnome15/plugins")) + \
                          list_plugin_dirs(os.path.join(g15globals.user_config_dir, "plugins")) + \
@@ -247,21 +309,31 @@ for _plugin_dir in all_plugin_directories:
         sys.path.insert(0, _plugin_dir)
 
 # Phase 2
+__manifest = g15pluginmanifest.PluginManifest()
 for __plugin_dir in all_plugin_directories:
     _plugin_name = os.path.basename(__plugin_dir)
-    __plugin_files = [fname[:-3] for fname in os.listdir(__plugin_dir) if fname == _plugin_name + ".py"]
+    __plugin_file = os.path.join(__plugin_dir, _plugin_name + ".py")
+    if not os.path.isfile(__plugin_file):
+        continue
     if __plugin_dir not in sys.path:
         sys.path.insert(0, __plugin_dir)
     try:
-        for __plugin_module in ([__import__(fname) for fname in __plugin_files]):
-            imported_plugins.append(__plugin_module)
-            # TODO - we need to be registering actions for a particular device
-            __actions = get_actions(__plugin_module, None)
-            for __a in __actions:
-                if __a not in g15actions.actions:
-                    g15actions.actions.append(__a)
+        __plugin_module = g15pluginmanifest.PluginModule(_plugin_name, __plugin_file,
+                                                         __manifest.get(__plugin_file))
+        # Make sure the plugin has an ID, importing it if the manifest does not know it
+        __plugin_module.id
+        imported_plugins.append(__plugin_module)
+        # TODO - we need to be registering actions for a particular device
+        __actions = get_actions(__plugin_module, None)
+        for __a in __actions:
+            if __a not in g15actions.actions:
+                g15actions.actions.append(__a)
     except Exception as __plugin_load_exception:
         logger.error("Failed to load plugin module %s.", __plugin_dir, exc_info=__plugin_load_exception)
+__manifest.save()
+discovery_time = time.time() - __discovery_started
+logger.info("Found %d plugins in %.3f seconds (%d from manifest, %d scanned)", len(imported_plugins),
+            discovery_time, __manifest.hits, __manifest.misses)
 
 
 class G15Plugins:
@@ -294,6 +366,17 @@ class G15Plugins:
         self.plugin_map = {}
         self.state = UNINITIALISED
 
+        """
+        How long each plugin took to activate, keyed by plugin module ID. Each
+        value is a tuple of the time (in seconds) and one of "activated",
+        "failed" or "timeout" 
+        """
+        self.activation_times = OrderedDict()
+
+        # Guards activated and activation_times, which plugins activating on
+        # the activation queue update concurrently
+        self.activation_lock = threading.Lock()
+
     def is_activated(self):
         """
         Get if the plugin manager is currently fully ACTIVATED.
@@ -371,6 +454,11 @@ class G15Plugins:
 
                         if self.conf_client.get_bool(key) and \
                                 not is_passive_plugin(mod):
+                            try:
+                                mod.load()
+                            except Exception as e:
+                                logger.error("Failed to import plugin %s.", mod.id, exc_info=e)
+                                continue
                             try:
                                 instance = self._create_instance(mod, plugin_dir_key)
                                 if self.screen is None or self.screen.driver.get_model_name() in get_supported_models(
@@ -428,8 +516,9 @@ class G15Plugins:
             self.lock.acquire()
             try:
                 self.state = ACTIVATING
-                self.activated = []
-                idx = 0
+                with self.activation_lock:
+                    self.activated = []
+                to_activate = []
                 for plugin in plugin if isinstance(plugin, list) else self.started:
                     mod = self.plugin_map[plugin]
 
@@ -439,9 +528,9 @@ class G15Plugins:
                     needs_net = is_needs_network(mod)
                     if not needs_net or (needs_net and
                                          self.network_manager.is_network_available()):
-                        self._activate_instance(plugin, callback, idx)
+                        to_activate.append(plugin)
 
-                    idx += 1
+                self._activate_instances(to_activate, callback)
                 self.state = ACTIVATED
             except Exception as e:
                 self.state = STARTED
@@ -451,7 +540,24 @@ class G15Plugins:
                 self.lock.release()
             logger.debug("Activated plugins")
         else:
-            self._activate_instance(plugin, callback, 0)
+            self._run_activation(plugin)
+
+    def get_activated(self):
+        """
+        Get a copy of the list of plugin instances that are currently activated.
+        """
+        with self.activation_lock:
+            return list(self.activated)
+
+    def get_activation_times(self):
+        """
+        Get how long each plugin took to activate the last time it was
+        activated, as a list of tuples of plugin ID, time in seconds and
+        status ("activated", "failed" or "timeout"), slowest first.
+        """
+        with self.activation_lock:
+            times = [(mod_id, t[0], t[1]) for mod_id, t in self.activation_times.items()]
+        return sorted(times, key=lambda t: t[1], reverse=True)
 
     def deactivate(self, plugin=None):
         """
@@ -469,7 +575,7 @@ class G15Plugins:
             self.lock.acquire()
             try:
                 self.state = DEACTIVATING
-                for plugin in plugin if isinstance(plugin, list) else list(self.activated):
+                for plugin in plugin if isinstance(plugin, list) else self.get_activated():
                     self._deactivate_instance(plugin)
             finally:
                 self.state = DEACTIVATED
@@ -498,17 +604,17 @@ class G15Plugins:
     def _deactivate_instance(self, plugin):
         mod = self.plugin_map[plugin]
         logger.debug("De-activating %s", mod.id)
-        if plugin not in self.activated:
-            raise Exception("%s is not activated" % mod.id)
+        with self.activation_lock:
+            if plugin not in self.activated:
+                raise Exception("%s is not activated" % mod.id)
+            self.activated.remove(plugin)
         try:
             plugin.deactivate()
         except Exception as e:
             logger.warning("Failed to deactive plugin properly.", exc_info=e)
         finally:
             mod_id = self.plugin_map[plugin].id
-            if mod_id in self.service.active_plugins:
-                del self.service.active_plugins[mod_id]
-        self.activated.remove(plugin)
+            self.service.active_plugins.pop(mod_id, None)
 
     def _get_plugin_key(self, subkey=None):
         folder = self.screen.device.uid if self.screen is not None else "global"
@@ -541,9 +647,9 @@ class G15Plugins:
                     instance = self._create_instance(plugin, self._get_plugin_key(plugin_id))
                     self.started.append(instance)
                     if self.is_in_active_state():
-                        self._activate_instance(instance)
+                        self._run_activation(instance)
                 elif not now_enabled and instance is not None:
-                    if instance in self.activated:
+                    if instance in self.get_activated():
                         self._deactivate_instance(instance)
                     if instance in self.started:
                         self.started.remove(instance)
@@ -552,22 +658,196 @@ class G15Plugins:
         finally:
             self.lock.release()
 
-    def _activate_instance(self, instance, callback=None, idx=0):
+    def _activate_instances(self, instances, callback=None):
+        """
+        Activate a number of plugins, up to ACTIVATION_WORKERS at a time. A
+        plugin is not started until any plugins it must be activated after (see
+        get_activate_after()) have finished. Plugins that may be activated in
+        parallel (see is_activate_in_parallel()) are run on the activation
+        queue, and the rest are passed to the gobject thread. If a plugin takes
+        longer than ACTIVATION_TIMEOUT once it has started, it is left to finish
+        in the background and this function moves on. Plugins that must be
+        activated after it are held back until it does finish.
+        
+        Keyword arguments:
+        instances     --    plugin instances to activate, in preferred order
+        callback      --    function to invoke with the number of plugins finished,
+                            the total and the name of the plugin being activated
+        """
+        g15scheduler.create_queue(ACTIVATION_QUEUE, ACTIVATION_WORKERS)
+        batch = _ActivationBatch(set(self.plugin_map[instance].id for instance in instances))
+        pending = list(instances)
+        finished_ids = set()
+        running = set()
+        late = set()
+
+        def start(instance):
+            mod = self.plugin_map[instance]
+            pending.remove(instance)
+            running.add(instance)
+            if callback is not None:
+                callback(len(finished_ids), len(instances), mod.name)
+            self._start_activation(instance, batch)
+
+        while len(pending) > 0 or len(running) > 0:
+            # Start as many plugins as are ready to go
+            for instance in list(pending):
+                if len(running) >= ACTIVATION_WORKERS:
+                    break
+                if len(self._get_waiting_for(instance, batch.ids, finished_ids)) == 0:
+                    start(instance)
+            if len(running) == 0:
+                held = self._get_held_back(pending, batch.ids, finished_ids, late)
+                if len(held) < len(pending):
+                    # Everything left is waiting for something that can't finish first (e.g. a cycle)
+                    instance = [instance for instance in pending if instance not in held][0]
+                    logger.warning("Plugin %s has unsatisfied activation dependencies, activating anyway",
+                                   self.plugin_map[instance].id)
+                    start(instance)
+                    continue
+
+                # Everything left is waiting for plugins that timed out, so leave them to be started when
+                # those finish
+                with self.activation_lock:
+                    if len(late & batch.completed) == 0:
+                        batch.deferred = list(pending)
+                if batch.deferred is not None:
+                    for instance in pending:
+                        logger.warning("Plugin %s will be activated once %s have finished",
+                                       self.plugin_map[instance].id,
+                                       ", ".join(self._get_waiting_for(instance, batch.ids, finished_ids)))
+                    break
+
+            # Wait for the next plugin to start or finish, or the oldest to time out
+            with self.activation_lock:
+                started = [batch.started[instance] for instance in running if instance in batch.started]
+            timeout = min(started) + ACTIVATION_TIMEOUT - time.time() if len(started) > 0 else None
+            try:
+                instance, finished = batch.results.get(timeout=None if timeout is None else max(0.0, timeout))
+            except Queue.Empty:
+                with self.activation_lock:
+                    instance = min((i for i in running if i in batch.started), key=batch.started.get)
+                    if instance in batch.completed:
+                        # Finished just as we gave up waiting, so its result is on the queue
+                        continue
+                    mod = self.plugin_map[instance]
+                    batch.timed_out.add(instance)
+                    self.activation_times[mod.id] = (time.time() - batch.started[instance], "timeout")
+                logger.warning("Plugin %s took more than %.1f seconds to activate, continuing without it",
+                               mod.id, ACTIVATION_TIMEOUT)
+                running.remove(instance)
+                late.add(instance)
+                continue
+            if finished:
+                running.discard(instance)
+                late.discard(instance)
+                finished_ids.add(self.plugin_map[instance].id)
+
+    def _get_waiting_for(self, instance, batch_ids, finished_ids):
+        return [mod_id for mod_id in get_activate_after(self.plugin_map[instance])
+                if mod_id in batch_ids and mod_id not in finished_ids]
+
+    def _get_held_back(self, pending, batch_ids, finished_ids, late):
+        """
+        Get the pending plugins that are waiting, directly or through other
+        pending plugins, for plugins that timed out.
+        """
+        held = []
+        held_ids = set(self.plugin_map[instance].id for instance in late)
+        changed = True
+        while changed:
+            changed = False
+            for instance in pending:
+                if instance not in held and \
+                        any(mod_id in held_ids for mod_id in self._get_waiting_for(instance, batch_ids, finished_ids)):
+                    held.append(instance)
+                    held_ids.add(self.plugin_map[instance].id)
+                    changed = True
+        return held
+
+    def _start_activation(self, instance, batch):
+        if is_activate_in_parallel(self.plugin_map[instance]):
+            g15scheduler.execute(ACTIVATION_QUEUE, "Activate%s" % self.plugin_map[instance].id,
+                                 self._run_activation, instance, batch)
+        elif g15pythonlang.is_gobject_thread():
+            self._run_activation(instance, batch)
+        else:
+            gobject.idle_add(self._run_activation, instance, batch)
+
+    def _start_deferred(self, batch):
+        """
+        Start any plugins a batch left waiting for plugins that timed out, now
+        that those they must be activated after have finished.
+        """
+        with self.activation_lock:
+            finished_ids = set(self.plugin_map[instance].id for instance in batch.completed)
+            ready = [instance for instance in batch.deferred
+                     if len(self._get_waiting_for(instance, batch.ids, finished_ids)) == 0]
+            for instance in ready:
+                batch.deferred.remove(instance)
+        for instance in ready:
+            if self.is_in_active_state():
+                logger.info("Activating %s, now that the plugins it waits for have finished",
+                            self.plugin_map[instance].id)
+                self._start_activation(instance, batch)
+
+    def _run_activation(self, instance, batch=None):
+        """
+        Activate a single plugin and record how long it took. If the plugin
+        belongs to a batch that gave up waiting for it, and the plugin manager
+        has since been de-activated, the plugin is de-activated again.
+        """
+        mod = self.plugin_map[instance]
+        started = time.time()
+        if batch is not None:
+            with self.activation_lock:
+                batch.started[instance] = started
+            batch.results.put((instance, False))
+        activated = self._activate_instance(instance)
+        elapsed = time.time() - started
+        late = False
+        deferred = False
+        with self.activation_lock:
+            if batch is not None:
+                late = instance in batch.timed_out
+                deferred = batch.deferred is not None
+                batch.completed.add(instance)
+            self.activation_times[mod.id] = (elapsed, "activated" if activated else "failed")
+        logger.info("Activated %s in %.3f seconds", mod.id, elapsed)
+        if batch is not None:
+            if late:
+                logger.warning("Plugin %s finally activated after %.1f seconds", mod.id, elapsed)
+                if activated and not self.is_in_active_state():
+                    self._deactivate_instance(instance)
+            batch.results.put((instance, True))
+            if deferred:
+                self._start_deferred(batch)
+        # Don't run again if this was invoked as an idle callback
+        return False
+
+    def _activate_instance(self, instance):
         mod = self.plugin_map[instance]
         logger.info("Activating %s", mod.id)
+        claimed = False
         try:
             if self._is_single_instance(mod):
                 logger.info("%s may only be run once, checking if there is another instance", mod.id)
-                if mod.id in self.service.active_plugins:
-                    raise Exception("Plugin may %s only run on one device at a time." % mod.id)
-            if callback is not None:
-                callback(idx, len(self.started), mod.name)
+                with _single_instance_lock:
+                    if mod.id in self.service.active_plugins:
+                        raise Exception("Plugin may %s only run on one device at a time." % mod.id)
+                    self.service.active_plugins[mod.id] = True
+                    claimed = True
             instance.activate()
             self.service.active_plugins[mod.id] = True
-            self.activated.append(instance)
+            with self.activation_lock:
+                self.activated.append(instance)
+            return True
         except Exception as e:
+            if claimed:
+                self.service.active_plugins.pop(mod.id, None)
             logger.error("Failed to activate plugin %s.", mod.id, exc_info=e)
             self.conf_client.set_bool(self._get_plugin_key("%s/enabled" % mod.id), False)
+            return False
 
     @staticmethod
     def _is_single_instance(module):
@@ -583,3 +863,18 @@ class G15Plugins:
         self.plugin_map[instance] = module
         logger.info("Loaded %s", module.id)
         return instance
+
+
+class _ActivationBatch:
+    """
+    State shared between a call to G15Plugins._activate_instances and the
+    activations it starts
+    """
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.results = Queue.Queue()
+        self.started = {}
+        self.completed = set()
+        self.timed_out = set()
+        self.deferred = None
@@ -0,0 +1,378 @@
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2011 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Extracts plugin metadata (id, name, supported models, actions etc) from the
+source of plugin modules without importing them, and caches it in a manifest
+file keyed by the modification time and size of each module.
+
+Only simple module level assignments are understood. These may be made up of
+literals, lists, tuples and dictionaries, references to g15driver constants and
+strings marked for translation with _(), where _ is the usual
+
+    _ = g15locale.get_translation("domain", modfile=__file__).ugettext
+
+Anything else (or any attribute that is assigned more than once) is left out
+of the manifest, and reading it from a PluginModule will import the real module.
+"""
+
+import ast
+import json
+import logging
+import os.path
+import threading
+
+import g15globals
+import g15driver
+import g15locale
+import util.g15os as g15os
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 2
+MANIFEST_FILE = os.path.join(g15globals.user_cache_dir, "plugin-manifest.json")
+
+"""
+Module attributes that are read from the manifest rather than the module
+"""
+METADATA = ["id", "name", "description", "author", "copyright", "site", "has_preferences",
+            "supported_models", "unsupported_models", "needs_network", "global_plugin",
+            "passive", "default_enabled", "single_instance", "actions", "activate_after",
+            "activate_in_parallel"]
+
+# Translatable strings are stored in the manifest as { GETTEXT : "text" }
+GETTEXT = "__gettext__"
+
+
+class PluginManifest:
+    """
+    Cache of the metadata of all plugin modules. Entries are re-scanned when the
+    module they were scanned from changes.
+    """
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._seen = set()
+        self._dirty = False
+        self._load()
+
+    def get(self, module_file):
+        """
+        Get the manifest entry for a plugin module, scanning it if it has not
+        been seen before or has changed since.
+
+        Keyword arguments:
+        module_file        -- path of plugin module source
+        """
+        stat = os.stat(module_file)
+        stamp = [stat.st_mtime, stat.st_size]
+        self._seen.add(module_file)
+        entry = self.entries.get(module_file)
+        if entry is not None and entry["stamp"] == stamp:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        entry = scan(module_file)
+        entry["stamp"] = stamp
+        self.entries[module_file] = entry
+        self._dirty = True
+        return entry
+
+    def save(self):
+        """
+        Write the manifest if anything changed, dropping the entries for any
+        modules that no longer exist.
+        """
+        for module_file in list(self.entries):
+            if module_file not in self._seen:
+                del self.entries[module_file]
+                self._dirty = True
+        if not self._dirty:
+            return
+        try:
+            g15os.mkdir_p(os.path.dirname(self.path))
+            tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+            with open(tmp_path, "w") as f:
+                json.dump({"version": MANIFEST_VERSION, "plugins": self.entries}, f)
+            os.rename(tmp_path, self.path)
+            self._dirty = False
+        except Exception as e:
+            logger.warning("Failed to write plugin manifest %s", self.path, exc_info=e)
+
+    """
+    Private
+    """
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                self.entries = manifest["plugins"]
+        except Exception as e:
+            logger.warning("Ignoring invalid plugin manifest %s", self.path, exc_info=e)
+
+
+class PluginModule:
+    """
+    Stands in for a plugin module. Metadata found in the manifest is available
+    straight away, the module itself is imported the first time anything else
+    is needed (usually when the plugin is created by G15Plugins.start).
+    """
+
+    def __init__(self, module_name, module_file, entry):
+        self._module_name = module_name
+        self._module_file = module_file
+        self._module = None
+        self._lock = threading.Lock()
+        self._names = set(entry["names"])
+        self._star_import = entry["star_import"]
+        translate = None
+        if entry["domain"] is not None:
+            translate = g15locale.get_translation(entry["domain"], modfile=module_file).ugettext
+        for key, value in entry["values"].items():
+            self.__dict__[str(key)] = _translate(value, translate)
+
+    def is_loaded(self):
+        return self._module is not None
+
+    def load(self):
+        """
+        Import the plugin module if it has not already been imported, and
+        return it.
+        """
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    logger.info("Importing plugin module %s", self._module_name)
+                    self._module = __import__(self._module_name)
+        return self._module
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name in self._names or self._star_import:
+            return getattr(self.load(), name)
+        raise AttributeError("Plugin module %s has no attribute %s" % (self._module_name, name))
+
+    def __repr__(self):
+        return "<plugin module '%s' from '%s'%s>" % (self._module_name, self._module_file,
+                                                    "" if self._module is not None else " (not loaded)")
+
+
+def scan(module_file):
+    """
+    Scan the source of a plugin module for its metadata. The returned entry is
+    a dictionary containing the values of the metadata attributes that could be
+    determined, the names of all module level attributes, whether there were
+    any "from x import *" statements, and the translation domain used for _().
+
+    Keyword arguments:
+    module_file        -- path of plugin module source
+    """
+    entry = {"values": {}, "names": [], "star_import": True, "domain": None}
+    try:
+        with open(module_file, "rb") as f:
+            tree = ast.parse(f.read(), module_file)
+    except Exception as e:
+        logger.debug("Could not parse plugin module %s, it will be imported to get its metadata", module_file,
+                     exc_info=e)
+        return entry
+
+    scanner = _ModuleScanner()
+    scanner.scan(tree)
+    entry["names"] = sorted(scanner.assignments)
+    entry["star_import"] = scanner.star_import
+    domain = scanner.get_domain()
+    entry["domain"] = domain
+    for statement in tree.body:
+        if isinstance(statement, ast.Assign) and len(statement.targets) == 1 and \
+                isinstance(statement.targets[0], ast.Name):
+            name = statement.targets[0].id
+            if (name in METADATA or name.startswith("actions_")) and scanner.assignments[name] == 1:
+                try:
+                    entry["values"][name] = _evaluate(statement.value, scanner.modules, domain is not None)
+                except ValueError:
+                    pass
+    return entry
+
+
+"""
+Private
+"""
+
+
+class _ModuleScanner(ast.NodeVisitor):
+    """
+    Collects the module level names of a module, how many times each is bound,
+    and which are aliases of modules.
+    """
+
+    def __init__(self):
+        self.assignments = {}
+        self.modules = {}
+        self.star_import = False
+        self._domain_call = None
+        self._depth = 0
+
+    def scan(self, tree):
+        self.visit(tree)
+
+    def get_domain(self):
+        """
+        Get the translation domain _ is bound to, or None if _ is not the usual
+        g15locale translation function.
+        """
+        call = self._domain_call
+        if call is not None and self.assignments.get("_") == 1 and \
+                isinstance(call.func, ast.Attribute) and call.func.attr == "get_translation" and \
+                len(call.args) > 0 and isinstance(call.args[0], _STRING_NODES):
+            return _string_value(call.args[0])
+
+    def visit_FunctionDef(self, node):
+        self._bind(node.name)
+        self._depth += 1
+        self.generic_visit(node)
+        self._depth -= 1
+
+    visit_ClassDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        self._depth += 1
+        self.generic_visit(node)
+        self._depth -= 1
+
+    def visit_Global(self, node):
+        # Module attributes bound inside functions can not be known statically
+        for name in node.names:
+            self._bind(name, 2)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            bound = alias.asname if alias.asname else alias.name.split(".")[0]
+            self._bind(bound)
+            if self._depth == 0 and alias.asname:
+                self.modules[bound] = alias.name
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name == "*":
+                self.star_import = True
+            else:
+                bound = alias.asname if alias.asname else alias.name
+                self._bind(bound)
+                if self._depth == 0:
+                    self.modules[bound] = "%s.%s" % (node.module, alias.name) if node.module else alias.name
+
+    def visit_Assign(self, node):
+        if self._depth == 0 and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name) and \
+                node.targets[0].id == "_" and isinstance(node.value, ast.Attribute) and \
+                isinstance(node.value.value, ast.Call):
+            self._domain_call = node.value.value
+        self.generic_visit(node)
+
+    def visit_AugAssign(self, node):
+        if isinstance(node.target, ast.Name):
+            self._bind(node.target.id, 2)
+        self.generic_visit(node)
+
+    def visit_Name(self, node):
+        if not isinstance(node.ctx, ast.Load):
+            self._bind(node.id)
+
+    def visit_ExceptHandler(self, node):
+        # Python 3 binds the exception to a plain name rather than a Name node
+        if isinstance(node.name, str):
+            self._bind(node.name)
+        self.generic_visit(node)
+
+    def _bind(self, name, count=1):
+        if self._depth == 0 or count > 1:
+            self.assignments[name] = self.assignments.get(name, 0) + count
+
+
+_STRING_NODES = tuple(getattr(ast, n) for n in ["Str", "Constant"] if hasattr(ast, n))
+_JSON_TYPES = (str, int, float, bool, type(None), type(u""))
+
+
+def _string_value(node):
+    value = node.s if hasattr(node, "s") else node.value
+    if not isinstance(value, (str, type(u""))):
+        raise ValueError("Not a string")
+    return value
+
+
+def _evaluate(node, modules, gettext):
+    """
+    Evaluate a node of a metadata assignment to a value that can be stored in
+    the JSON manifest. ValueError is raised if this is not possible.
+    """
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [_evaluate(n, modules, gettext) for n in node.elts]
+    elif isinstance(node, ast.Dict):
+        d = {}
+        for k, v in zip(node.keys, node.values):
+            key = _evaluate(k, modules, gettext) if k is not None else None
+            if not isinstance(key, (str, type(u""))):
+                raise ValueError("Dictionary keys must be strings")
+            d[key] = _evaluate(v, modules, gettext)
+        return d
+    elif isinstance(node, ast.Call):
+        if gettext and isinstance(node.func, ast.Name) and node.func.id == "_" and len(node.args) == 1 \
+                and not node.keywords and isinstance(node.args[0], _STRING_NODES):
+            return {GETTEXT: _string_value(node.args[0])}
+        raise ValueError("Unsupported call")
+    elif isinstance(node, ast.Attribute):
+        if isinstance(node.value, ast.Name) and node.value.id in modules and \
+                modules[node.value.id].split(".")[-1] == "g15driver":
+            try:
+                value = getattr(g15driver, node.attr)
+            except AttributeError:
+                raise ValueError("Unknown constant")
+            if not isinstance(value, _JSON_TYPES):
+                raise ValueError("Unsupported constant")
+            return value
+        raise ValueError("Unsupported attribute")
+    elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left = _evaluate(node.left, modules, gettext)
+        right = _evaluate(node.right, modules, gettext)
+        if isinstance(left, dict) or isinstance(right, dict):
+            raise ValueError("Cannot concatenate translated strings")
+        try:
+            return left + right
+        except TypeError:
+            raise ValueError("Unsupported operands")
+    else:
+        try:
+            value = ast.literal_eval(node)
+        except Exception:
+            raise ValueError("Not a literal")
+        if isinstance(value, (list, tuple, set, dict)) or not isinstance(value, _JSON_TYPES):
+            raise ValueError("Unsupported literal")
+        return value
+
+
+def _translate(value, translate):
+    if isinstance(value, list):
+        return [_translate(v, translate) for v in value]
+    elif isinstance(value, dict):
+        if len(value) == 1 and GETTEXT in value:
+            return translate(value[GETTEXT])
+        return dict((k, _translate(v, translate)) for k, v in value.items())
+    return value
@@ -23,11 +23,14 @@ getting the default or active profile.
 """
 
 import codecs
+import copy
+from collections import OrderedDict
 import logging
 import os.path
 import re
 import stat
 import sys
+from threading import RLock
 import time
 import zipfile
 
@@ -67,11 +70,216 @@ profile_listeners = []
 wm = pyinotify.WatchManager()
 mask = pyinotify.IN_DELETE | pyinotify.IN_MODIFY | pyinotify.IN_CREATE | pyinotify.IN_ATTRIB  # watched events
 
+# Number of recent window titles to remember the matching profile for
+WINDOW_MATCH_MEMO_SIZE = 32
+
 # Create macro profiles directory
 conf_dir = os.path.join(g15globals.user_config_dir, "macro_profiles")
 g15os.mkdir_p(conf_dir)
 
 
+class ProfileRegistry(object):
+    """
+    Process wide cache of loaded profiles and profile directory listings.
+    Each profile file is read and parsed once. The cached G15Profile is never
+    handed out, every caller gets their own copy of it (see
+    G15Profile.copy()), so changes made by one caller are not seen by others
+    until they are saved. Entries in directories watched by
+    inotify are dropped when events arrive for them, entries elsewhere (e.g.
+    directories added by plugins) are checked against the file modification
+    time.
+    """
+
+    def __init__(self):
+        self.loads = 0
+        self.hits = 0
+        self.generation = 0
+        self._profiles = {}
+        self._listings = {}
+        self._matchers = {}
+        self._lock = RLock()
+
+    def get_profile(self, device, profile_id, path):
+        """
+        Get the profile stored at a path, loading it if it is not cached.
+        None is returned if the file does not exist.
+        
+        Keyword arguments:
+        device        -- device associated with profile
+        profile_id    -- ID of profile
+        path          -- path of profile file
+        """
+        key = (device.uid, path)
+        stamp = None if self._is_watched(path) else self._get_stamp(path)
+        self._lock.acquire()
+        try:
+            entry = self._profiles.get(key)
+            if entry is not None and entry[1] == stamp:
+                self.hits += 1
+                return entry[0].copy()
+        finally:
+            self._lock.release()
+
+        if not os.path.exists(path):
+            return None
+        profile = G15Profile(device, profile_id, file_path=path)
+        self._lock.acquire()
+        try:
+            self.loads += 1
+            self.generation += 1
+            self._profiles[key] = (profile, stamp)
+        finally:
+            self._lock.release()
+        return profile.copy()
+
+    def list_profile_files(self, profile_dir):
+        """
+        Get the names of the profile files in a directory
+        
+        Keyword arguments:
+        profile_dir    -- directory
+        """
+        stamp = None if self._is_watched(os.path.join(profile_dir, "")) else self._get_stamp(profile_dir)
+        self._lock.acquire()
+        try:
+            entry = self._listings.get(profile_dir)
+            if entry is not None and entry[1] == stamp:
+                return entry[0]
+        finally:
+            self._lock.release()
+
+        files = []
+        if os.path.exists(profile_dir):
+            files = [f for f in os.listdir(profile_dir) if not f.startswith(".") and f.endswith(".macros")]
+        self._lock.acquire()
+        try:
+            self._listings[profile_dir] = (files, stamp)
+        finally:
+            self._lock.release()
+        return files
+
+    def invalidate(self, path):
+        """
+        Drop any cached profiles loaded from a path, and the listing of the
+        directory that contains it.
+        
+        Keyword arguments:
+        path        -- path of changed file
+        """
+        self._lock.acquire()
+        try:
+            self.generation += 1
+            for key in [k for k in self._profiles if k[1] == path]:
+                del self._profiles[key]
+            self._listings.pop(os.path.dirname(path), None)
+            self._listings.pop(path, None)
+        finally:
+            self._lock.release()
+
+    def get_window_matcher(self, device):
+        """
+        Get the WindowMatcher for all of a device's profiles. This is only
+        rebuilt when profiles have been loaded or changed since it was last
+        built.
+        
+        Keyword arguments:
+        device        -- device
+        """
+        generation = self.generation
+        entry = self._matchers.get(device.uid)
+        if entry is not None and entry[0] == generation:
+            return entry[1]
+        matcher = WindowMatcher(get_profiles(device))
+        self._matchers[device.uid] = (generation, matcher)
+        return matcher
+
+    def get_statistics(self):
+        return {"loads": self.loads, "hits": self.hits, "profiles": len(self._profiles)}
+
+    """
+    Private
+    """
+
+    @staticmethod
+    def _is_watched(path):
+        return wm.get_wd(os.path.dirname(path)) is not None
+
+    @staticmethod
+    def _get_stamp(path):
+        try:
+            st = os.stat(path)
+            return st.st_mtime, st.st_size
+        except OSError:
+            return None
+
+
+class WindowMatcher(object):
+    """
+    Finds the first profile (in the order supplied) that should activate
+    when a window is focused, i.e. the first whose window name is contained
+    in the window title (ignoring case). All the window names are compiled
+    into a single expression, so the title is only scanned once. The results
+    for recent titles are remembered.
+    """
+
+    def __init__(self, profiles):
+        self.profiles = []
+        self.indexes = {}
+        for profile in profiles:
+            if not profile.get_default() and profile.activate_on_focus and profile.window_name:
+                window_name = profile.window_name.lower()
+                if window_name not in self.indexes:
+                    self.indexes[window_name] = len(self.profiles)
+                    self.profiles.append(profile)
+
+        # A lookahead reports every position a name occurs at. Where names
+        # overlap at the same position, the one that comes first wins
+        names = sorted(self.indexes, key=self.indexes.get)
+        self.pattern = re.compile("(?=(%s))" % "|".join(re.escape(n) for n in names)) if names else None
+        self._memo = OrderedDict()
+        self._lock = RLock()
+
+    def match(self, title):
+        """
+        Get the profile that matches a window title, or None if there is no match.
+        
+        Keyword arguments:
+        title        -- window title or application name
+        """
+        if self.pattern is None or title is None:
+            return None
+        title = title.lower()
+        self._lock.acquire()
+        try:
+            if title in self._memo:
+                profile = self._memo.pop(title)
+                self._memo[title] = profile
+                return profile
+        finally:
+            self._lock.release()
+
+        best = None
+        for match in self.pattern.finditer(title):
+            index = self.indexes[match.group(1)]
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+        profile = self.profiles[best] if best is not None else None
+
+        self._lock.acquire()
+        try:
+            while len(self._memo) >= WINDOW_MATCH_MEMO_SIZE:
+                self._memo.popitem(last=False)
+            self._memo[title] = profile
+        finally:
+            self._lock.release()
+        return profile
+
+
+registry = ProfileRegistry()
+
+
 class EventHandler(pyinotify.ProcessEvent):
     """
     Event handle the listens for the inotify events and informs all callbacks
@@ -87,6 +295,7 @@ class EventHandler(pyinotify.ProcessEvent):
             return id_no, device_uid
 
     def _notify(self, event):
+        registry.invalidate(event.pathname)
         ids = self._get_profile_ids(event)
         if ids:
             for profile_listener in profile_listeners:
@@ -166,6 +375,28 @@ def remove_profile_dir(profile_dir):
     __profile_dirs.remove(profile_dir)
 
 
+def get_registry_statistics():
+    """
+    Get the number of profiles loaded from disk and the number of times a
+    cached profile was used instead.
+    """
+    return registry.get_statistics()
+
+
+def find_profile_for_window(device, application_name):
+    """
+    Get the first profile that is set to activate on focus and whose window
+    name is contained in the supplied application (or window) name. None
+    is returned if there is no such profile.
+    
+    Keyword arguments:
+    device              -- device
+    application_name    -- application or window name
+    """
+    profile = registry.get_window_matcher(device).match(application_name)
+    return profile.copy() if profile is not None else None
+
+
 def get_profile_by_name(device, name):
     """
     Get a profile given it's name. If there is more than one profile with
@@ -190,15 +421,11 @@ def get_profiles(device):
     """
     profiles = []
     for profile_dir in get_all_profile_dirs(device):
-        if os.path.exists(profile_dir):
-            for profile in os.listdir(profile_dir):
-                if not profile.startswith(".") and profile.endswith(".macros"):
-                    profile_id = ".".join(profile.split(".")[:-1])
-                    profile_object = G15Profile(device, profile_id,
-                                                file_path="%s/%s" %
-                                                          (profile_dir, profile))
-                    if device.model_id in profile_object.models:
-                        profiles.append(profile_object)
+        for profile in registry.list_profile_files(profile_dir):
+            profile_id = ".".join(profile.split(".")[:-1])
+            profile_object = registry.get_profile(device, profile_id, "%s/%s" % (profile_dir, profile))
+            if profile_object is not None and device.model_id in profile_object.models:
+                profiles.append(profile_object)
 
     if len(profiles) == 0:
         return [create_default(device)]
@@ -259,16 +486,16 @@ def get_profile(device, profile_id):
     """
     Get a profile given the device it is associated with and it's ID. The
     profile will be fully loaded on return. The object returned will be a 
-    new instance.
+    new instance, although the file is only read again when it changes.
     
     Keyword arguments:
     device        -- device associated with profile
     profile_id    -- ID of profile to load
     """
     for profile_dir in get_all_profile_dirs(device):
-        path = "%s/%s.macros" % (profile_dir, profile_id)
-        if os.path.exists(path):
-            return G15Profile(device, profile_id, file_path=path)
+        profile = registry.get_profile(device, profile_id, "%s/%s.macros" % (profile_dir, profile_id))
+        if profile is not None:
+            return profile
 
 
 def get_active_profile(device):
@@ -742,6 +969,24 @@ class G15Profile(object):
 
         self.load(self.filename)
 
+    def copy(self):
+        """
+        Get a new instance of this profile, that may be changed without
+        affecting this one. The file is not read again.
+        """
+        profile = copy.copy(self)
+        profile.parser = ConfigParser.ConfigParser({})
+        defaults = self.parser.defaults()
+        for key, value in defaults.items():
+            profile.parser.set("DEFAULT", key, value)
+        for section in self.parser.sections():
+            profile.parser.add_section(section)
+            for key, value in self.parser.items(section, raw=True):
+                if key not in defaults or defaults[key] != value:
+                    profile.parser.set(section, key, value)
+        profile.load()
+        return profile
+
     def can_launch(self, command_line):
         """
         Test if this profile can launch a command with the provided arguments,
@@ -931,6 +1176,7 @@ class G15Profile(object):
         Delete this macro profile
         """
         os.remove(self.filename)
+        registry.invalidate(self.filename)
 
     def delete_macro(self, activate_on, memory, keys):
         """
@@ -1209,6 +1455,7 @@ class G15Profile(object):
                 os.utime(save_file, None)
             finally:
                 fhandle.close()
+            registry.invalidate(save_file)
         else:
             self.parser.write(save_file)
 
@@ -56,10 +56,17 @@ logger = logging.getLogger(__name__)
 _ = g15locale.get_translation("gnome15").ugettext
 
 """
-Queues
+Queues. Each screen has its own redraw queue (and so its own render thread),
+named REDRAW_QUEUE followed by the device UID. See get_redraw_queue()
 """
 REDRAW_QUEUE = "redrawQueue"
 
+"""
+Default maximum frame rates, used when /apps/gnome15/<device>/max_fps is not set
+"""
+DEFAULT_COLOR_MAX_FPS = 30
+DEFAULT_MONO_MAX_FPS = 15
+
 """
 Page priorities
 """
@@ -86,20 +93,56 @@ COLOURS = [(0, 0, 0), (255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255
            (255, 255, 255)]
 
 
-def check_on_redraw():
+def get_redraw_queue(device):
+    """
+    Get the name of the redraw queue used by the screen for a device
+    
+    Keyword arguments:
+    device            -- device
+    """
+    return "%s-%s" % (REDRAW_QUEUE, device.uid)
+
+
+def is_on_redraw(screen=None):
     """
-    Helper to check the current thread is the redraw thread
+    Get if the current thread is the redraw thread of a screen, or of any
+    screen if none is provided
+    
+    Keyword arguments:
+    screen            -- screen, or None for any screen
     """
-    #    if not jobqueue.is_on_queue(REDRAW_QUEUE):
-    #        raise Exception("Illegal thread access (on queue %s)." % jobqueue.get_current_queue())
+    queue_name = g15scheduler.get_current_queue()
+    if screen is not None:
+        return queue_name == screen.redraw_queue
+    return queue_name == REDRAW_QUEUE or queue_name.startswith(REDRAW_QUEUE + "-")
+
+
+def check_on_redraw(screen=None):
+    """
+    Helper to check the current thread is a redraw thread (that of a particular
+    screen if one is provided)
+    """
+    #    if not is_on_redraw(screen):
+    #        raise Exception("Illegal thread access (on queue %s)." % g15scheduler.get_current_queue())
     pass
 
 
 def run_on_redraw(cb, *args):
     """
-    Helper to run a callback function on the redraw queue.
+    Helper to run a callback function on a redraw queue. Prefer
+    G15Screen.run_on_redraw(), which always uses the queue of that screen.
+    Here, if the callback is a method of an object that has a screen (as
+    plugins do) that screen's queue is used, otherwise the queue of the
+    current redraw thread.
     """
-    g15scheduler.queue(REDRAW_QUEUE, "Redraw", 0, cb, *args)
+    screen = getattr(getattr(cb, "__self__", None), "screen", None)
+    if isinstance(screen, G15Screen):
+        queue_name = screen.redraw_queue
+    elif is_on_redraw():
+        queue_name = g15scheduler.get_current_queue()
+    else:
+        queue_name = REDRAW_QUEUE
+    g15scheduler.queue(queue_name, "Redraw", 0, cb, *args)
 
 
 class ScreenChangeAdapter(object):
@@ -260,6 +303,222 @@ class Painter:
         raise Exception("Not implemented")
 
 
+class Transition(object):
+    """
+    Animates the change from one page to another. Transition functions (see
+    G15Screen.set_transition()) return one of these rather than painting the
+    animation themselves. The screen then draws it a frame at a time on its
+    redraw queue, at the screen's frame rate, so the redraw thread is never
+    blocked by the animation.
+    
+    Progress is worked out from the time since the transition started, so a
+    transition always takes its duration, however quickly the device can be
+    written to. When the device is slow, steps are simply skipped. If the page
+    changes again before the transition completes, the screen drops it and
+    the next transition starts from whatever frame was last shown.
+    """
+
+    def __init__(self, old_surface, duration, surface=None):
+        """
+        Constructor
+        
+        Keyword arguments:
+        old_surface      -- surface of the page being changed from
+        duration         -- duration in seconds
+        surface          -- surface to paint frames into. Transitions may share one, as
+                            only one transition runs on a screen at a time
+        """
+        width = old_surface.get_width()
+        height = old_surface.get_height()
+        self.duration = duration
+        self.frames = 0
+        self.started = g15pythonlang.monotonic()
+
+        # The old surface is redrawn (or is the last frame of another transition), so copy it
+        self.old_surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        old_context = cairo.Context(self.old_surface)
+        old_context.set_source_surface(old_surface)
+        old_context.set_operator(cairo.OPERATOR_SOURCE)
+        old_context.paint()
+
+        if surface is None:
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        self.surface = surface
+
+    def get_progress(self):
+        """
+        Get how far through the transition it is now, from 0.0 to 1.0
+        """
+        if self.duration <= 0:
+            return 1.0
+        return min(1.0, (g15pythonlang.monotonic() - self.started) / self.duration)
+
+    def is_complete(self):
+        return self.get_progress() >= 1.0
+
+    def frame(self, new_surface):
+        """
+        Paint the frame for the current time. Returns the surface painted to,
+        or None if the transition is complete and the new surface should be
+        shown as is.
+        
+        Keyword arguments:
+        new_surface      -- latest surface of the page being changed to
+        """
+        progress = self.get_progress()
+        if progress >= 1.0:
+            return None
+        canvas = cairo.Context(self.surface)
+        canvas.save()
+        canvas.set_operator(cairo.OPERATOR_CLEAR)
+        canvas.paint()
+        canvas.restore()
+        self.paint(canvas, self.old_surface, new_surface, progress)
+        self.frames += 1
+        return self.surface
+
+    def paint(self, canvas, old_surface, new_surface, progress):
+        """
+        Subclasses must override to paint a single frame
+        
+        Keyword arguments:
+        canvas            -- canvas of the (cleared) frame surface
+        old_surface       -- surface of the page being changed from
+        new_surface       -- surface of the page being changed to
+        progress          -- progress from 0.0 to 1.0
+        """
+        raise Exception("Not implemented")
+
+
+class RedrawCoordinator(object):
+    """
+    Merges redraw requests for a screen into a single 'next frame' ticket, and
+    limits how often frames are drawn. While a ticket is waiting to run, any
+    further requests are folded into it, keeping the strongest flags (content
+    is redrawn and transitions are run if any request asked for it).
+    """
+
+    def __init__(self, screen):
+        """
+        Constructor
+        
+        Keyword arguments:
+        screen            -- screen to redraw
+        """
+        self.screen = screen
+        self.max_fps = 0
+        self.lock = RLock()
+        self.pending = None
+        self.scheduled = False
+        self.timer = None
+        self.last_frame = 0
+        self.requests = 0
+        self.merged = 0
+        self.frames = 0
+        self.cancelled = 0
+
+    def request(self, page=None, direction="up", transitions=True, redraw_content=True):
+        """
+        Request a redraw. The frame will be drawn on the redraw queue as soon
+        as the frame rate allows.
+        
+        Keyword arguments:
+        page              -- page to redraw, or None for the visible page
+        direction         -- transition direction
+        transitions       -- run transitions
+        redraw_content    -- repaint the page content
+        """
+        self.lock.acquire()
+        try:
+            self.requests += 1
+            if self.pending is None:
+                self.pending = [[page], direction, transitions, redraw_content]
+            else:
+                self.merged += 1
+                pages, pending_direction, pending_transitions, pending_redraw_content = self.pending
+                if page not in pages:
+                    pages.append(page)
+                self.pending = [pages,
+                                direction if transitions or not pending_transitions else pending_direction,
+                                transitions or pending_transitions,
+                                redraw_content or pending_redraw_content]
+
+            if not self.scheduled:
+                self.scheduled = True
+                delay = self.last_frame + 1.0 / self.get_max_fps() - time.time()
+                if delay > 0:
+                    self.timer = g15scheduler.queue(self.screen.redraw_queue, "Redraw", delay, self._run)
+                else:
+                    g15scheduler.execute(self.screen.redraw_queue, "Redraw", self._run)
+        finally:
+            self.lock.release()
+
+    def cancel(self):
+        """
+        Discard any pending ticket. Used when the redraw queue is cleared.
+        """
+        self.lock.acquire()
+        try:
+            if self.pending is not None:
+                self.cancelled += 1
+            self.pending = None
+            self.scheduled = False
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        finally:
+            self.lock.release()
+
+    def frame_drawn(self):
+        """
+        Record that a frame has been drawn, whether through a ticket or
+        directly
+        """
+        self.last_frame = time.time()
+        self.frames += 1
+
+    def get_max_fps(self):
+        if self.max_fps > 0:
+            return self.max_fps
+        driver = self.screen.driver
+        return DEFAULT_COLOR_MAX_FPS if driver is not None and driver.get_bpp() > 1 else DEFAULT_MONO_MAX_FPS
+
+    def get_statistics(self):
+        """
+        Get a dictionary of counters for redraw requests and the frames drawn
+        for them
+        """
+        return {
+            "requests": self.requests,
+            "merged": self.merged,
+            "cancelled": self.cancelled,
+            "frames": self.frames,
+            "pending": 1 if self.pending is not None else 0,
+            "queue_depth": g15scheduler.get_queue_size(self.screen.redraw_queue),
+            "max_fps": self.get_max_fps()
+        }
+
+    """
+    Private
+    """
+
+    def _run(self):
+        self.lock.acquire()
+        try:
+            ticket = self.pending
+            self.pending = None
+            self.scheduled = False
+            self.timer = None
+            if ticket is not None:
+                # Requests made while this frame is drawn are rate limited from now
+                self.last_frame = time.time()
+        finally:
+            self.lock.release()
+        if ticket is not None:
+            pages, direction, transitions, redraw_content = ticket
+            self.screen._do_redraw_pages(pages, direction, transitions, redraw_content)
+
+
 class G15Screen:
 
     def __init__(self, plugin_manager_module, service, device):
@@ -268,6 +527,7 @@ class G15Screen:
         self.device = device
         self.driver = None
         self.screen_change_listeners = []
+        self.listener_lock = RLock()
         self.local_data = threading.local()
         self.local_data.surface = None
         self.plugins = []
@@ -299,6 +559,8 @@ class G15Screen:
         self.temp_acquired_controls = {}
         self.key_handler = g15keyboard.G15KeyHandler(self)
         self.glass_pane = g15theme.Component("glasspane")
+        self.redraw_queue = get_redraw_queue(device)
+        self.redraw_coordinator = RedrawCoordinator(self)
 
         if not self._load_driver():
             raise Exception("Driver failed to load")
@@ -307,26 +569,35 @@ class G15Screen:
         """
         Set the currently active application (may be a window name or a high
         level application name). Returns a boolean indicating whether or not
-        a profile that matches was found
+        the active profile was changed
         
         Keyword arguments:
         application_name        -- application name
-        splash                  -- splash callback
-        startup                 -- True when this change is the result of startup
+        """
+        return self.set_active_application_names([application_name])
+
+    def set_active_application_names(self, application_names):
+        """
+        Set the currently active application given all of the names it is
+        known by (e.g. application names followed by the window title). The
+        profile for the first name that matches one is made active, or the
+        default profile if none do. Returns a boolean indicating whether or not
+        the active profile was changed
+        
+        Keyword arguments:
+        application_names       -- list of application or window names
         """
         if self.device is None:
             return False
 
-        found = False
+        changed = False
         if self.defeat_profile_change < 1 and not g15profile.is_locked(self.device):
-            choose_profile = None
             # Active window has changed, see if we have a profile that matches it
-            if application_name is not None:
-                for profile in g15profile.get_profiles(self.device):
-                    if not profile.get_default() and profile.activate_on_focus and len(
-                            profile.window_name) > 0 and application_name.lower().find(
-                            profile.window_name.lower()) != -1:
-                        choose_profile = profile
+            choose_profile = None
+            for name in application_names:
+                if name:
+                    choose_profile = g15profile.find_profile_for_window(self.device, name)
+                    if choose_profile is not None:
                         break
 
             # No applicable profile found. Look for a default profile, and see if it is set to activate by default
@@ -337,12 +608,12 @@ class G15Screen:
                 if (active_profile is None or active_profile.id != default_profile.id) \
                         and default_profile.activate_on_focus:
                     default_profile.make_active()
-                    found = True
+                    changed = True
             elif active_profile is None or choose_profile.id != active_profile.id:
                 choose_profile.make_active()
-                found = True
+                changed = True
 
-        return found
+        return changed
 
     def start(self):
         logger.info("Starting %s.", self.device.uid)
@@ -373,6 +644,8 @@ class G15Screen:
         self.notify_handles.append(
             self.conf_client.notify_add("%s/active_profile" % screen_key, self.active_profile_changed))
         self.notify_handles.append(self.conf_client.notify_add("%s/driver" % screen_key, self.driver_changed))
+        self.notify_handles.append(self.conf_client.notify_add("%s/max_fps" % screen_key, self._max_fps_changed))
+        self._max_fps_changed()
         for control in self.driver.get_controls():
             self.notify_handles.append(
                 self.conf_client.notify_add("%s/%s" % (screen_key, control.id), self._control_changed))
@@ -454,12 +727,23 @@ class G15Screen:
             self.driver.disconnect()
 
     def add_screen_change_listener(self, screen_change_listener):
-        if screen_change_listener not in self.screen_change_listeners:
-            self.screen_change_listeners.append(screen_change_listener)
+        # The list is replaced rather than changed, so it may be iterated
+        # while plugins are being activated on other threads
+        self.listener_lock.acquire()
+        try:
+            if screen_change_listener not in self.screen_change_listeners:
+                self.screen_change_listeners = self.screen_change_listeners + [screen_change_listener]
+        finally:
+            self.listener_lock.release()
 
     def remove_screen_change_listener(self, screen_change_listener):
-        if screen_change_listener in self.screen_change_listeners:
-            self.screen_change_listeners.remove(screen_change_listener)
+        self.listener_lock.acquire()
+        try:
+            if screen_change_listener in self.screen_change_listeners:
+                self.screen_change_listeners = [l for l in self.screen_change_listeners
+                                                if l is not screen_change_listener]
+        finally:
+            self.listener_lock.release()
 
     def set_available_size(self, size):
         self.available_size = size
@@ -960,7 +1244,9 @@ class G15Screen:
         self.draw_lock = threading.Lock()
         self.visible_page = None
         self.old_canvas = None
+        self.old_surface = None
         self.transition_function = None
+        self.transition = None
         self.painter_function = None
         self.mkey = 1
         self.reverting = {}
@@ -1065,15 +1351,16 @@ class G15Screen:
             We don't need to deactivate during startup, nothing will be activated 
             """
             lst = []
-            for plugin in self.plugins.activated:
+            for plugin in self.plugins.get_activated():
                 mod = self.plugins.plugin_map[plugin]
                 if self._should_deactivate(choose_profile, mod):
                     lst.append(plugin)
             for plugin in lst:
                 self.plugins.deactivate(plugin=plugin)
 
+        activated = self.plugins.get_activated()
         for plugin in self.plugins.started:
-            if plugin not in self.plugins.activated:
+            if plugin not in activated:
                 mod = self.plugins.plugin_map[plugin]
                 if self._should_activate(choose_profile, mod):
                     to_activate.append(plugin)
@@ -1144,28 +1431,61 @@ class G15Screen:
         return o_painter
 
     def set_transition(self, transition):
+        """
+        Set the function called when the visible page changes, returning the
+        previous one so it may be chained. The function is called with the old
+        surface, the new surface, the old page, the new page and the direction,
+        and should return a Transition to animate the change (or None).
+        
+        Keyword arguments:
+        transition        -- transition function
+        """
         o_transition = self.transition_function
         self.transition_function = transition
         return o_transition
 
+    def cancel_transition(self):
+        """
+        Stop any running transition, and show the current page as it is.
+        """
+        if self.transition is not None:
+            self.transition = None
+            self.redraw(redraw_content=False, transitions=False)
+
     def cycle_to(self, page, transitions=True):
-        g15scheduler.clear_jobs(REDRAW_QUEUE)
-        g15scheduler.execute(REDRAW_QUEUE, "cycleTo", self._do_cycle_to, page, transitions)
+        g15scheduler.clear_jobs(self.redraw_queue)
+        self.redraw_coordinator.cancel()
+        g15scheduler.execute(self.redraw_queue, "cycleTo", self._do_cycle_to, page, transitions)
 
     def cycle(self, number, transitions=True):
-        g15scheduler.clear_jobs(REDRAW_QUEUE)
-        g15scheduler.execute(REDRAW_QUEUE, "doCycle", self._do_cycle, number, transitions)
+        g15scheduler.clear_jobs(self.redraw_queue)
+        self.redraw_coordinator.cancel()
+        g15scheduler.execute(self.redraw_queue, "doCycle", self._do_cycle, number, transitions)
+
+    def run_on_redraw(self, cb, *args):
+        """
+        Run a callback function on the redraw queue of this screen.
+        
+        Keyword arguments:
+        cb                -- function to run
+        args              -- arguments
+        """
+        g15scheduler.queue(self.redraw_queue, "Redraw", 0, cb, *args)
 
     def redraw(self, page=None, direction="up", transitions=True, redraw_content=True, queue=True):
         if page:
             logger.debug("Redrawing %s", page.id)
         else:
             logger.debug("Redrawing current page")
-        if queue:
-            g15scheduler.execute(REDRAW_QUEUE, "redraw", self._do_redraw, page, direction, transitions, redraw_content)
+        # Never draw on another screen's redraw thread, it would hold up that device
+        if queue or (is_on_redraw() and not is_on_redraw(self)):
+            self.redraw_coordinator.request(page, direction, transitions, redraw_content)
         else:
             self._do_redraw(page, direction, transitions, redraw_content)
 
+    def get_redraw_statistics(self):
+        return self.redraw_coordinator.get_statistics()
+
     def set_color_for_mkey(self):
         control = self.driver.get_control_for_hint(g15driver.HINT_DIMMABLE)
         rgb = None
@@ -1225,7 +1545,8 @@ class G15Screen:
                 self._started_plugins = True
 
             self.loading_complete = False
-            self.first_page = self.conf_client.get_string("/apps/gnome15/%s/last_page" % self.device.uid)
+            self.first_page = g15gconf.get_cache(self.conf_client).get_string(
+                "/apps/gnome15/%s/last_page" % self.device.uid)
 
             if delay != 0.0:
                 self.reconnect_timer = g15scheduler.schedule("ReconnectTimer", delay, self.attempt_connection)
@@ -1325,7 +1646,9 @@ class G15Screen:
             if visible_page != self.visible_page:
                 logger.debug("Page has changed, recreating surface")
                 if visible_page.priority == PRI_NORMAL and not self.stopping:
-                    self.service.conf_client.set_string("/apps/gnome15/%s/last_page" % self.device.uid, visible_page.id)
+                    # Written through the cache, so only page changes are written and rapid ones coalesce
+                    g15gconf.get_cache(self.service.conf_client).set_string(
+                        "/apps/gnome15/%s/last_page" % self.device.uid, visible_page.id)
                 surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, self.width, self.height)
 
             self.local_data.surface = surface
@@ -1403,18 +1726,38 @@ class G15Screen:
                 if painter.place == FOREGROUND_PAINTER:
                     painter.paint(canvas)
 
-            # Run any transitions
+            # Start any transitions. A transition that is still running when the page changes is dropped, and
+            # the next one starts from the last frame shown
+            if old_page is not None:
+                self.transition = None
             if transitions and self.transition_function is not None and self.old_canvas is not None:
-                self.transition_function(self.old_surface, surface, old_page, self.visible_page, direction)
+                transition = self.transition_function(self.old_surface, surface, old_page, self.visible_page,
+                                                      direction)
+                if transition is not None:
+                    self.transition = transition
+
+            # Draw the current frame of the transition, and ask for another until it completes
+            frame = surface
+            transition = self.transition
+            if transition is not None:
+                frame = transition.frame(surface)
+                if frame is None:
+                    self.transition = None
+                    frame = surface
+                else:
+                    self.redraw_coordinator.request(transitions=False, redraw_content=False)
 
             # Now apply any global transformations and paint
             if self.painter_function is not None:
-                self.painter_function(surface)
+                self.painter_function(frame)
             else:
-                self.driver.paint(surface)
+                self.driver.paint(frame)
+            if self.service.first_frame_time is None:
+                self.service.first_frame_painted()
 
             self.old_canvas = canvas
-            self.old_surface = surface
+            self.old_surface = frame
+            self.redraw_coordinator.frame_drawn()
         finally:
             self.draw_lock.release()
 
@@ -1494,16 +1837,27 @@ class G15Screen:
             self._cycle_pages(number, self._get_pages_of_priority(PRI_NORMAL))
 
     def _do_redraw(self, page=None, direction="up", transitions=True, redraw_content=True):
+        self._do_redraw_pages([page], direction, transitions, redraw_content)
+
+    def _do_redraw_pages(self, pages, direction="up", transitions=True, redraw_content=True):
+        """
+        Redraw the visible page if it, or None (meaning whatever is visible), is
+        in the list of pages. Otherwise, only redraw the panel if any of the
+        pages have a panel painter.
+        """
         self.page_model_lock.acquire()
         try:
             current_page = self._get_next_page_to_display()
-            if page is None or page == current_page:
+            if None in pages or current_page in pages:
                 self._draw_page(current_page, direction, transitions, redraw_content)
-            elif page is not None and page.panel_painter is not None:
+            elif any(page.panel_painter is not None for page in pages):
                 self._draw_page(current_page, direction, transitions, False)
         finally:
             self.page_model_lock.release()
 
+    def _max_fps_changed(self, client=None, connection_id=None, entry=None, args=None):
+        self.redraw_coordinator.max_fps = self.conf_client.get_int("/apps/gnome15/%s/max_fps" % self.device.uid)
+
     def _flush_reverts_and_deletes(self):
         self.page_model_lock.acquire()
         try:
@@ -1541,6 +1895,11 @@ increased, creating a fading effect
 
 
 class Fader(Painter):
+    """
+    Fades the screen out over 'duration' seconds. The opacity is derived from
+    the time elapsed since the fade started, so the fade takes as long as
+    it is asked to however many frames actually get painted.
+    """
 
     def __init__(self, screen, stay_faded=False, duration=3.0, step=1):
         Painter.__init__(self, FOREGROUND_PAINTER, 9999)
@@ -1550,13 +1909,26 @@ class Fader(Painter):
         self.step = step
         self.stay_faded = stay_faded
         self.interval = (duration / 255) * step
+        self.started = None
+
+    def get_opacity(self):
+        """
+        Get the opacity (0 - 255) for the current time
+        """
+        if self.started is None:
+            return 0
+        if self.duration <= 0:
+            return 255
+        return min(255, int(255 * (g15pythonlang.monotonic() - self.started) / self.duration))
 
     def run(self):
+        self.started = g15pythonlang.monotonic()
         self.screen.painters.append(self)
         try:
-            while self.opacity <= 255:
+            while self.get_opacity() < 255:
                 self.screen.redraw(redraw_content=False)
                 time.sleep(self.interval)
+            self.screen.redraw(redraw_content=False)
         finally:
             if not self.stay_faded:
                 self.screen.painters.remove(self)
@@ -1567,10 +1939,10 @@ class Fader(Painter):
             col = 1.0
         else:
             col = 0.0
+        self.opacity = self.get_opacity()
         canvas.set_source_rgba(col, col, col, float(self.opacity) / 255.0)
         canvas.rectangle(0, 0, self.screen.width, self.screen.height)
         canvas.fill()
-        self.opacity += self.step
 
 
 class G15Splash:
@@ -1592,7 +1964,7 @@ class G15Splash:
     def complete(self):
         self.progress = 100
         self.screen.redraw(self.page)
-        g15scheduler.queue(REDRAW_QUEUE, "ClearSplash", 2.0, self._hide)
+        g15scheduler.queue(self.screen.redraw_queue, "ClearSplash", 2.0, self._hide)
 
     def update_splash(self, value, max_value, text=None):
         self.progress = (float(value) / float(max_value)) * 100.0
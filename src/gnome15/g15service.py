@@ -54,6 +54,7 @@ import util.g15os as g15os
 import g15pluginmanager
 import g15actions
 import g15upgrade
+import g15windowmonitor
 
 logger = logging.getLogger(__name__)
 
@@ -558,7 +559,9 @@ class MacroScriptExecution(object):
 
 class G15Service(g15desktop.G15AbstractService):
 
-    def __init__(self, service_host, no_trap=False):
+    def __init__(self, service_host, no_trap=False, start_time=None):
+        self.start_time = start_time if start_time is not None else time.time()
+        self.first_frame_time = None
         self.exit_on_no_devices = False
         self.active_plugins = {}
         self.session_active = True
@@ -574,7 +577,7 @@ class G15Service(g15desktop.G15AbstractService):
         self.device_notify_handles = {}
         self.font_faces = {}
         self.stopping = False
-        self.window_title_listener = None
+        self.window_monitor = None
         self.active_application_name = None
         self.active_window_title = None
         self.ignore_next_sigint = False
@@ -636,6 +639,10 @@ class G15Service(g15desktop.G15AbstractService):
                 except Exception as e:
                     logger.debug("Error stopping profile change notification", exc_info=e)
                     pass
+                if self.window_monitor is not None:
+                    logger.info("Stopping window monitor")
+                    self.window_monitor.stop()
+                    self.window_monitor = None
                 try:
                     logger.info("Stopping account change notification")
                     g15accounts.notifier.stop()
@@ -648,6 +655,8 @@ class G15Service(g15desktop.G15AbstractService):
                 logger.info("Stopping screens")
                 self._check_state_of_all_devices_async(quickly)
                 logger.info("Screens stopped")
+                # Write anything the screens left in the configuration cache (e.g. last page)
+                g15gconf.get_cache(self.conf_client).flush()
                 self.started = False
             finally:
                 self.stopping = False
@@ -678,98 +687,38 @@ class G15Service(g15desktop.G15AbstractService):
     def get_active_application_name(self):
         return self.active_application_name
 
+    def first_frame_painted(self):
+        """
+        Called by the screens when they paint a frame, the first time this
+        happens the time since the service was started is recorded.
+        """
+        if self.first_frame_time is None:
+            self.first_frame_time = time.time() - self.start_time
+            logger.info("First frame painted %.2f seconds after start (%.2f seconds finding plugins)",
+                        self.first_frame_time, g15pluginmanager.discovery_time)
+
+    def get_startup_statistics(self):
+        """
+        Get how long (in seconds) it took to find plugins, and to paint the first
+        frame after starting (-1 if no frame has been painted yet).
+        """
+        return {"plugin_discovery": g15pluginmanager.discovery_time,
+                "first_frame": self.first_frame_time if self.first_frame_time is not None else -1.0}
+
     """
     Private
     """
 
-    def _active_window_changed(self, old, object_name):
-        if object_name != "":
-            app = self.session_bus.get_object("org.ayatana.bamf", object_name)
-            view = None
+    def _active_window_changed(self, application_names, window_title):
+        self.active_application_name = application_names[0] if application_names else None
+        self.active_window_title = window_title
+        logger.info("Active application is now %s (%s)", self.active_application_name, window_title)
+        names = list(application_names) + [window_title]
+        for screen in list(self.screens):
             try:
-                view = dbus.Interface(app, 'org.ayatana.bamf.view')
-                self.active_application_name = view.Name()
-            except dbus.DBusException as e:
-                logger.debug("Could not get current application name", exc_info=e)
-                self.active_application_name = None
-
-            if view is not None:
-                screens = list(self.screens)
-                for s in list(screens):
-                    if self._check_active_application(s, app, view):
-                        screens.remove(s)
-
-            window = dbus.Interface(app, 'org.ayatana.bamf.window')
-            self.active_window_title = self._get_x_prop(window, '_NET_WM_VISIBLE_NAME')
-            if not self.active_window_title:
-                self.active_window_title = self._get_x_prop(window, '_NET_WM_NAME')
-            for s in list(screens):
-                if self._check_active_window(s, app, window):
-                    screens.remove(s)
-
-            """
-            Start listening for name changes within the view as well
-            """
-            if self.window_title_listener is not None:
-                self.window_title_listener.remove()
-
-            def _window_title_changed(old_name, new_name):
-                self.active_window_title = new_name
-                for s in list(self.screens):
-                    self._check_active_window(s, app, window)
-
-    #            self.window_title_listener = view.connect_to_signal('NameChanged', _window_title_changed, None)
-
-    @staticmethod
-    def _get_x_prop(window, key):
-        try:
-            return window.XProps(key)
-        except dbus.DBusException as e:
-            logger.debug("Could not get window XProps", exc_info=e)
-            return None
-
-    def _check_active_window(self, screen, app, window):
-        try:
-            if screen.set_active_application_name(self.active_window_title):
-                return True
-        except dbus.DBusException as e:
-            logger.debug("Could not check active window", exc_info=e)
-            pass
-
-    def _check_active_application(self, screen, app, view):
-        try:
-            if view is not None and view.IsActive() == 1:
-                vn = view.Name()
-                if screen.set_active_application_name(vn):
-                    return True
-                else:
-                    parents = view.Parents()
-                    for parent in parents:
-                        app = self.session_bus.get_object("org.ayatana.bamf", parent)
-                        view = dbus.Interface(app, 'org.ayatana.bamf.view')
-                        if self._check_active_application(screen, app, view):
-                            return True
-        except dbus.DBusException as e:
-            logger.debug("Could not check active application", exc_info=e)
-            pass
-
-    def _check_active_application_with_wnck(self, event=None):
-        try:
-            from gi.repository import Wnck as wnck
-            window = wnck.Screen.get_default().get_active_window()
-            if window is not None and not window.is_skip_pager():
-                app = window.get_application()
-                active_application_name = app.get_name() if app is not None else ""
-                if active_application_name != self.active_application_name:
-                    self.active_application_name = active_application_name
-                    self.active_window_title = active_application_name
-                    logger.info("Active application is now %s", self.active_application_name)
-                    for screen in self.screens:
-                        screen.set_active_application_name(active_application_name)
-        except Exception as e:
-            logger.warning("Failed to activate profile for active window", exc_info=e)
-
-        gobject.timeout_add(500, self._check_active_application_with_wnck)
+                screen.set_active_application_names(names)
+            except Exception as e:
+                logger.warning("Failed to activate profile for active window", exc_info=e)
 
     def _check_state_of_all_devices(self, quickly=False):
         logger.info("Checking state of %d devices", len(self.devices))
@@ -1081,26 +1030,9 @@ class G15Service(g15desktop.G15AbstractService):
             g15scheduler.queue(SERVICE_QUEUE, "activeSessionChanged", 0.0, self._check_state_of_all_devices)
 
     def _configure_window_monitoring(self):
-        logger.info("Attempting to set up BAMF")
-        try:
-            bamf_object = self.session_bus.get_object('org.ayatana.bamf', '/org/ayatana/bamf/matcher')
-            self.bamf_matcher = dbus.Interface(bamf_object, 'org.ayatana.bamf.matcher')
-            self.session_bus.add_signal_receiver(self._active_window_changed, dbus_interface='org.ayatana.bamf.matcher',
-                                                 signal_name="ActiveWindowChanged")
-            active_window = self.bamf_matcher.ActiveWindow()
-            logger.info("Will be using BAMF for window matching")
-            if active_window:
-                self._active_window_changed("", active_window)
-        except Exception as e:
-            logger.info("BAMF not available, falling back to polling WNCK.")
-            logger.debug("BAMF attempt below :", exc_info=e)
-            try:
-                gi.require_version("Wnck", "3.0")
-                from gi.repository import Wnck as wnck
-                wnck.__file__
-                self._check_active_application_with_wnck()
-            except Exception as e:
-                logger.warning("Python Wnck not available either, no automatic profile switching", exc_info=e)
+        self.window_monitor = g15windowmonitor.create_monitor(self._active_window_changed, self.session_bus)
+        if self.window_monitor is None:
+            logger.warning("No window monitor available, no automatic profile switching")
 
     def _add_screen(self, device):
         try:
@@ -1164,6 +1096,7 @@ class G15Service(g15desktop.G15AbstractService):
             logger.info("Disabling device %s", device.uid)
             screen.stop(quickly)
             self.screens.remove(screen)
+            g15scheduler.stop_queue(screen.redraw_queue)
             for listener in self.service_listeners:
                 listener.screen_removed(screen)
             logger.info("Disabled device %s", device.uid)
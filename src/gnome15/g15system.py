@@ -68,7 +68,11 @@ class SystemService(dbus.service.Object):
 
     @dbus.service.method(IF_NAME, in_signature='ssn')
     def SetLight(self, device, light, value):
-        self._controller.devices[device].leds[light].set_led_value(value);
+        self._controller.devices[device].set_led_values({light: value})
+
+    @dbus.service.method(IF_NAME, in_signature='sa{sn}')
+    def SetLights(self, device, values):
+        self._controller.devices[device].set_led_values(values)
 
     @dbus.service.method(IF_NAME, in_signature='ss', out_signature='n')
     def GetLight(self, device, light):
@@ -130,6 +134,34 @@ class KeyboardDevice:
             light_key = "%s:%s" % (color, control)
             self.leds[light_key] = LED(light_key, self, f)
 
+    def set_led_values(self, values):
+        """
+        Set the brightness of a number of LEDs. They are all written together
+        on the System queue.
+        
+        Keyword arguments:
+        values         -- dictionary of light keys and brightness values
+        """
+        leds = []
+        for light_key, val in values.items():
+            led = self.leds[str(light_key)]
+            led.check_value(val)
+            leds.append((led, int(val)))
+        g15scheduler.execute("System", "setLEDs", self._write_led_values, leds)
+
+    def close(self):
+        for led in self.leds.values():
+            led.close()
+
+    """
+    Private
+    """
+
+    @staticmethod
+    def _write_led_values(leds):
+        for led, val in leds:
+            led.write_value(val)
+
 
 class LED:
     """
@@ -141,6 +173,8 @@ class LED:
         self.light_key = light_key
         self.keyboard_device = keyboard_device
         self.filename = filename
+        self._max = None
+        self._fd = None
 
     def set_led_value(self, val):
         """
@@ -149,15 +183,52 @@ class LED:
         Keyword arguments:
         val            --
         """
+        self.check_value(val)
+        g15scheduler.execute("System", "setLED", self.write_value, int(val))
+
+    def check_value(self, val):
         if val < 0 or val > self.get_max():
             raise Exception("LED value out of range")
-        set_value(os.path.join(self.filename, "brightness"), val)
+
+    def write_value(self, val):
+        """
+        Write the brightness now. The brightness file is kept open, so this
+        is a single write (the file is reopened if the write fails, e.g. if
+        the device was replugged).
+        
+        Keyword arguments:
+        val            -- brightness
+        """
+        logger.debug("Writing %s to %s", val, self.filename)
+        data = ("%d\n" % val).encode("ascii")
+        for attempt in range(2):
+            try:
+                if self._fd is None:
+                    self._fd = os.open(os.path.join(self.filename, "brightness"), os.O_WRONLY)
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                os.write(self._fd, data)
+                return
+            except OSError as e:
+                self.close()
+                if attempt > 0:
+                    logger.warning("Failed to write %s to %s", val, self.filename, exc_info=e)
 
     def get_value(self):
         return get_int_value(os.path.join(self.filename, "brightness"))
 
     def get_max(self):
-        return get_int_value(os.path.join(self.filename, "max_brightness"))
+        # The maximum brightness of an LED never changes
+        if self._max is None:
+            self._max = get_int_value(os.path.join(self.filename, "max_brightness"))
+        return self._max
+
+    def close(self):
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError as e:
+                logger.debug("Failed to close %s", self.filename, exc_info=e)
+            self._fd = None
 
 
 DEVICES_PATH = "/sys/bus/hid/devices"
@@ -196,6 +267,7 @@ class G15SystemServiceController:
     def shutdown(self):
         logger.info("Shutting down")
         self._loop.quit()
+        self._close_devices()
 
     """
     Private
@@ -205,7 +277,12 @@ class G15SystemServiceController:
         self._scan_devices()
         SystemService(self._bus, self)
 
+    def _close_devices(self):
+        for keyboard_device in self.devices.values():
+            keyboard_device.close()
+
     def _scan_devices(self):
+        self._close_devices()
         self.devices = {}
         indices = {}
         if os.path.exists(DEVICES_PATH):
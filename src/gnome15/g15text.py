@@ -14,7 +14,10 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from collections import OrderedDict
 import logging
+import math
+from threading import Lock, local
 
 import cairo
 import gi
@@ -24,9 +27,47 @@ from gi.repository import PangoCairo as pangocairo
 
 logger = logging.getLogger(__name__)
 
-# Shared pango context
-# pango_context = pangocairo.cairo_font_map_get_default().create_context()
-pango_context = pangocairo.FontMap.get_default().create_context()
+# Number of font descriptions (and their metrics) to keep
+FONT_CACHE_SIZE = 64
+
+# Number of shaped layouts to keep
+LAYOUT_CACHE_SIZE = 128
+
+# Number of pre-rendered shadowed text surfaces to keep
+SHADOW_CACHE_SIZE = 32
+
+
+class LRUCache(object):
+    """
+    A simple thread safe least recently used cache
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.pop(key, None)
+            if value is not None:
+                self._items[key] = value
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items.pop(key, None)
+            while len(self._items) >= self.size:
+                self._items.popitem(last=False)
+            self._items[key] = value
+
+
+font_cache = LRUCache(FONT_CACHE_SIZE)
+shadow_cache = LRUCache(SHADOW_CACHE_SIZE)
+
+# Pango contexts and shaped layouts are not thread safe, and each screen
+# renders on its own thread, so these are kept for each thread
+_thread_local = local()
 
 """
 Handles drawing and measuring of text on a screen. 
@@ -44,6 +85,57 @@ def new_text(screen=None):
         return G15PangoText(True)
 
 
+def get_context(antialias=True):
+    """
+    Get the calling thread's pango context for an antialias mode. The font
+    options are set once, when the context is created, as changing them
+    causes every layout made from the context to be shaped again.
+    
+    Keyword arguments:
+    antialias             -- cairo antialias mode
+    """
+    contexts = getattr(_thread_local, "contexts", None)
+    if contexts is None:
+        contexts = _thread_local.contexts = {}
+    context = contexts.get(antialias)
+    if context is None:
+        context = pangocairo.FontMap.get_default().create_context()
+        pangocairo.context_set_font_options(context, _create_font_options(antialias))
+        contexts[antialias] = context
+    return context
+
+
+def get_layout_cache():
+    """
+    Get the calling thread's cache of shaped layouts.
+    """
+    cache = getattr(_thread_local, "layout_cache", None)
+    if cache is None:
+        cache = _thread_local.layout_cache = LRUCache(LAYOUT_CACHE_SIZE)
+    return cache
+
+
+def get_font(font_desc_name, font_absolute_size=None, antialias=True):
+    """
+    Get a (shared) font description and its metrics. These must not be
+    modified.
+    
+    Keyword arguments:
+    font_desc_name        -- font description string, e.g. "Sans Bold 12"
+    font_absolute_size    -- absolute size in pango units, or None to use the size in the description
+    antialias             -- cairo antialias mode the metrics are for
+    """
+    key = (font_desc_name, font_absolute_size, antialias)
+    font = font_cache.get(key)
+    if font is None:
+        font_desc = pango.FontDescription(font_desc_name)
+        if font_absolute_size is not None:
+            font_desc.set_absolute_size(font_absolute_size)
+        font = (font_desc, get_context(antialias).get_metrics(font_desc))
+        font_cache.put(key, font)
+    return font
+
+
 class G15Text(object):
     def __init__(self, antialias):
         self.antialias = antialias
@@ -61,50 +153,27 @@ class G15Text(object):
     def set_canvas(self, canvas):
         self.canvas = canvas
 
-    """
-    Private
-    """
-
-    def _create_font_options(self):
-        fo = cairo.FontOptions()
-        fo.set_antialias(self.antialias)
-        if self.antialias == cairo.ANTIALIAS_NONE:
-            fo.set_hint_style(cairo.HINT_STYLE_NONE)
-            fo.set_hint_metrics(cairo.HINT_METRICS_OFF)
-
 
 class G15PangoText(G15Text):
     def __init__(self, antialias):
         G15Text.__init__(self, antialias)
-        pangocairo.context_set_font_options(pango_context, self._create_font_options())
-        self.__pango_cairo_context = None
-        self.__layout = None
         self.valign = pango.Alignment.CENTER
-        self.__layout = pango.Layout(pango_context)
-
-    def set_canvas(self, canvas):
-        G15Text.set_canvas(self, canvas)
-        self.__pango_cairo_context = pangocairo.create_context(self.canvas)
+        self.metrics = None
+        self.__layout = None
+        self.__layout_key = None
+        self.__layout_cache = None
 
     def set_attributes(self, text, bounds=None, wrap=None, align=pango.Alignment.LEFT, width=None, spacing=None,
                        font_desc=None, font_absolute_size=None, attributes=None,
                        weight=None, style=None, font_pt_size=None,
                        valign=None, pxwidth=None):
 
-        logger.debug("Text: %s, bounds = %s, wrap = %s, align = %s, width = %s, "
-                     "attributes = %s, spacing = %s, font_desc = %s, weight = %s, "
-                     "style = %s, font_pt_size = %s",
-                     str(text),
-                     str(bounds),
-                     str(wrap),
-                     str(align),
-                     str(width),
-                     str(attributes),
-                     str(spacing),
-                     str(font_desc),
-                     str(weight),
-                     str(style),
-                     str(font_pt_size))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Text: %s, bounds = %s, wrap = %s, align = %s, width = %s, "
+                         "attributes = %s, spacing = %s, font_desc = %s, weight = %s, "
+                         "style = %s, font_pt_size = %s",
+                         text, bounds, wrap, align, width, attributes, spacing, font_desc, weight, style,
+                         font_pt_size)
 
         G15Text.set_attributes(self, text, bounds)
         self.valign = valign
@@ -116,52 +185,143 @@ class G15PangoText(G15Text):
             font_desc_name += " %s" % style
         if font_pt_size:
             font_desc_name += " " + str(font_pt_size)
-        font_desc = pango.FontDescription(font_desc_name)
-        if font_absolute_size is not None:
-            font_desc.set_absolute_size(font_absolute_size)
-        self.__layout.set_font_description(font_desc)
+        font_desc, self.metrics = get_font(font_desc_name, font_absolute_size, self.antialias)
 
-        if align is not None:
-            self.__layout.set_alignment(align)
-        if spacing is not None:
-            self.__layout.set_spacing(spacing)
-        if width is not None:
-            self.__layout.set_width(width)
         if pxwidth is not None:
-            self.__layout.set_width(int(pango.SCALE * pxwidth))
-        if wrap:
-            self.__layout.set_wrap(wrap)
+            width = int(pango.SCALE * pxwidth)
+
         if attributes:
+            # Attribute lists cannot be compared, so these layouts are not shared
+            self.__layout_key = None
+            self.__layout_cache = None
+            self.__layout = self._create_layout(text, font_desc, align, spacing, width, wrap)
             self.__layout.set_attributes(attributes)
-
-        self.__layout.set_text(text, None)
-        self.metrics = pango_context.get_metrics(self.__layout.get_font_description())
+        else:
+            # Layouts are not changed once shaped, so can be shared by all text handlers on this thread
+            key = (text, font_desc_name, font_absolute_size, align, spacing, width, wrap, self.antialias)
+            layout_cache = get_layout_cache()
+            if key != self.__layout_key or layout_cache is not self.__layout_cache:
+                layout = layout_cache.get(key)
+                if layout is None:
+                    layout = self._create_layout(text, font_desc, align, spacing, width, wrap)
+                    layout_cache.put(key, layout)
+                self.__layout = layout
+                self.__layout_key = key
+                self.__layout_cache = layout_cache
 
     def measure(self):
         text_extents = self.__layout.get_extents()[1]
-        return text_extents[0] / pango.SCALE, text_extents[1] / pango.SCALE, text_extents[2] / pango.SCALE, \
-               text_extents[3] / pango.SCALE
+        return text_extents.x / pango.SCALE, text_extents.y / pango.SCALE, text_extents.width / pango.SCALE, \
+               text_extents.height / pango.SCALE
 
     def draw(self, x=None, y=None):
-        self.__pango_cairo_context.save()
+        self.canvas.save()
+        try:
+            x, y = self._clip_and_position(x, y)
+            if x is not None and y is not None:
+                self.canvas.move_to(x, y)
+            pangocairo.show_layout(self.canvas, self.__layout)
+        finally:
+            self.canvas.restore()
+
+    def draw_shadowed(self, shadow_rgb, rgb, x=None, y=None):
+        """
+        Draw the text with a one pixel shadow all around it. The result is
+        rendered once to a surface and reused while the text, font, colours
+        and sub-pixel position stay the same.
+        
+        Keyword arguments:
+        shadow_rgb        -- shadow colour as tuple of ratios
+        rgb               -- text colour as tuple of ratios
+        x                 -- x position (defaults to the bounds)
+        y                 -- y position (defaults to the bounds)
+        """
+        self.canvas.save()
+        try:
+            x, y = self._clip_and_position(x, y)
+            if x is None or y is None:
+                x, y = self.canvas.get_current_point()
+            matrix = self.canvas.get_matrix()
+            if self.__layout_key is None or matrix.xx != 1 or matrix.yy != 1 or matrix.xy != 0 or matrix.yx != 0:
+                # Cannot reuse the surface, just draw the text 9 times
+                self._draw_shadowed_layout(self.canvas, shadow_rgb, rgb, x, y)
+                return
+
+            dx, dy = self.canvas.user_to_device(x, y)
+            fx = dx - math.floor(dx)
+            fy = dy - math.floor(dy)
+            ink = self.__layout.get_pixel_extents()[0]
+            key = (self.__layout_key, tuple(shadow_rgb), tuple(rgb), fx, fy)
+            surface = shadow_cache.get(key)
+            if surface is None:
+                # Leave room for the shadow and anti-aliasing on each side
+                surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, max(1, ink.width + 4), max(1, ink.height + 4))
+                context = cairo.Context(surface)
+                self._draw_shadowed_layout(context, shadow_rgb, rgb, 2 - ink.x + fx, 2 - ink.y + fy)
+                shadow_cache.put(key, surface)
 
+            self.canvas.identity_matrix()
+            self.canvas.set_source_surface(surface, math.floor(dx) + ink.x - 2, math.floor(dy) + ink.y - 2)
+            self.canvas.paint()
+        finally:
+            self.canvas.restore()
+
+    """
+    Private
+    """
+
+    def _create_layout(self, text, font_desc, align, spacing, width, wrap):
+        layout = pango.Layout(get_context(self.antialias))
+        layout.set_font_description(font_desc)
+        if align is not None:
+            layout.set_alignment(align)
+        if spacing is not None:
+            layout.set_spacing(spacing)
+        if width is not None:
+            layout.set_width(width)
+        if wrap:
+            layout.set_wrap(wrap)
+        layout.set_text(text, -1)
+        return layout
+
+    def _clip_and_position(self, x, y):
         if self.bounds is not None:
             if x is None:
                 x = self.bounds[0]
             if y is None:
                 y = self.bounds[1]
 
-            self.__pango_cairo_context.rectangle(self.bounds[0] - 1, self.bounds[1] - 1, self.bounds[2] + 2,
-                                                 self.bounds[3] + 2)
-            self.__pango_cairo_context.clip()
+            self.canvas.rectangle(self.bounds[0] - 1, self.bounds[1] - 1, self.bounds[2] + 2,
+                                  self.bounds[3] + 2)
+            self.canvas.clip()
 
             if self.valign == pango.Alignment.RIGHT:
                 y += self.bounds[3] - (self.metrics.get_ascent() / 1000.0)
             elif self.valign == pango.Alignment.CENTER:
                 y += (self.bounds[3] - (self.metrics.get_ascent() / 1000.0)) / 2
+        return x, y
+
+    def _draw_shadowed_layout(self, context, shadow_rgb, rgb, x, y):
+        context.set_source_rgb(shadow_rgb[0], shadow_rgb[1], shadow_rgb[2])
+        for ox in range(-1, 2):
+            for oy in range(-1, 2):
+                if ox != 0 or oy != 0:
+                    context.move_to(x + ox, y + oy)
+                    pangocairo.show_layout(context, self.__layout)
+        context.set_source_rgb(rgb[0], rgb[1], rgb[2])
+        context.move_to(x, y)
+        pangocairo.show_layout(context, self.__layout)
+
+
+"""
+Private
+"""
 
-        if x is not None and y is not None:
-            self.__pango_cairo_context.move_to(x, y)
 
-        self.__pango_cairo_context.show_layout(self.__layout)
-        self.__pango_cairo_context.restore()
+def _create_font_options(antialias):
+    fo = cairo.FontOptions()
+    fo.set_antialias(antialias)
+    if antialias == cairo.ANTIALIAS_NONE:
+        fo.set_hint_style(cairo.HINT_STYLE_NONE)
+        fo.set_hint_metrics(cairo.HINT_METRICS_OFF)
+    return fo
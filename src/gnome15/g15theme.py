@@ -39,9 +39,11 @@ for progress bars, scroll bars.
 
 from __future__ import print_function
 import base64
+from collections import OrderedDict
 from copy import deepcopy
 import logging
 from lxml import etree
+import math
 import os
 from string import Template
 import sys
@@ -80,6 +82,15 @@ DEBUG_SVG = False
 # The color in SVG theme files that by default gets replaced with the current 'highlight' color
 DEFAULT_HIGHLIGHT_COLOR = "#ff0000"
 
+# Maximum number of parsed SVG handles each theme keeps for reuse
+SVG_HANDLE_CACHE_SIZE = 8
+
+# Maximum number of rasterised static backgrounds each theme keeps
+BACKGROUND_CACHE_SIZE = 4
+
+# SVG elements that do not draw anything themselves. These are kept in both layers
+NON_DRAWING_ELEMENTS = ("defs", "metadata", "namedview", "title", "desc", "style", "script")
+
 
 class ThemeDefinition(object):
     def __init__(self, theme_id, directory, plugin_module=None):
@@ -158,6 +169,330 @@ class Render(object):
         self.text_boxes = text_boxes
         self.attributes = attributes
         self.processing_result = processing_result
+        self.template = None
+        self.background = None
+        self.encoded_properties = {}
+
+    def get_template(self, dynamic_ids=()):
+        """
+        Get the substitution template for the processed document, serialising
+        it if this has not yet been done (or the document has since been
+        changed, e.g. by scrolling). The document is split into a static
+        background layer (see background) and the dynamic overlay this
+        template is for.
+        
+        Keyword arguments:
+        dynamic_ids        -- IDs of elements that must always be treated as dynamic
+        """
+        if self.template is None:
+            self.background, xml = split_layers(self.document, dynamic_ids)
+            self.template = SlotTemplate(xml)
+            self.encoded_properties = {}
+        return self.template
+
+    def document_changed(self):
+        self.template = None
+        self.background = None
+
+    def substitute(self, dynamic_ids=()):
+        """
+        Substitute the (XML encoded) property values into the dynamic layer
+        of the processed document. Encoded values are remembered, so only
+        properties whose value has changed since the last call are encoded
+        again.
+        
+        Keyword arguments:
+        dynamic_ids        -- IDs of elements that must always be treated as dynamic
+        """
+        template = self.get_template(dynamic_ids)
+        encoded = self.encoded_properties
+        for key in template.names:
+            if key in self.properties:
+                value = self.properties[key]
+                cached = encoded.get(key)
+                if cached is None or cached[0] is not value:
+                    encoded[key] = (value, _encode_value(value))
+            elif key in encoded:
+                del encoded[key]
+        return template.substitute(encoded)
+
+
+class SlotTemplate(object):
+    """
+    A string.Template that is split into literal text and substitution slots
+    once, so that substituting is just a join. safe_substitute() semantics
+    are kept, i.e. slots with no value are left as is.
+    """
+
+    def __init__(self, text):
+        self.literals = []
+        self.slots = []
+        literal = []
+        pos = 0
+        for match in Template.pattern.finditer(text):
+            literal.append(text[pos:match.start()])
+            pos = match.end()
+            name = match.group("named") or match.group("braced")
+            if name is not None:
+                self.literals.append("".join(literal))
+                self.slots.append((name, match.group()))
+                literal = []
+            elif match.group("escaped") is not None:
+                literal.append(Template.delimiter)
+            else:
+                literal.append(match.group())
+        literal.append(text[pos:])
+        self.literals.append("".join(literal))
+        self.names = frozenset(name for name, original in self.slots)
+
+    def substitute(self, encoded):
+        """
+        Substitute values. 
+
+        Keyword arguments:
+        encoded        -- dictionary of slot names to (value, encoded text) tuples
+        """
+        buf = [self.literals[0]]
+        for (name, original), literal in zip(self.slots, self.literals[1:]):
+            value = encoded.get(name)
+            buf.append(value[1] if value is not None else original)
+            buf.append(literal)
+        return "".join(buf)
+
+
+class CompiledTheme(object):
+    """
+    The result of analysing a theme's SVG document once, when it is loaded.
+    It records which properties are referenced by the document and how.
+    Properties that are only substituted into the text of the document
+    ('slot' properties) can change without the document having to be
+    processed again. Properties that delete elements, set progress bars,
+    provide images or are used in text that may scroll or wrap
+    ('structural' properties) require the document to be processed.
+    """
+
+    def __init__(self, root, nsmap):
+        self.slot_properties = set()
+        self.structural_properties = set()
+
+        for element in root.iter():
+            if not isinstance(element.tag, str):
+                continue
+            self._add_slots(element.text)
+            self._add_slots(element.tail)
+            for value in element.attrib.values():
+                self._add_slots(value)
+
+        for element in root.xpath('//svg:*[@title]', namespaces=nsmap):
+            args = element.get("title").split(" ")
+            if args[0] == "del" and len(args) > 1:
+                self.structural_properties.add(args[1][1:] if args[1].startswith("!") else args[1])
+        for element in root.xpath('//svg:rect[@class=\'progress\']', namespaces=nsmap):
+            element_id = element.get("id")
+            if element_id and element_id.endswith("_progress"):
+                self.structural_properties.add(element_id[:-9])
+        for element in root.xpath('//svg:image[@title]', namespaces=nsmap):
+            self.structural_properties.add(element.get("title"))
+        for element in root.xpath('//svg:text[@clip-path]', namespaces=nsmap):
+            for text in element.itertext():
+                self.structural_properties.update(self._get_names(text))
+        for element in root.xpath('//svg:rect[@class=\'textbox\']', namespaces=nsmap):
+            self.structural_properties.add(element.get("id"))
+
+        self.referenced_properties = frozenset(self.slot_properties | self.structural_properties)
+
+    def references(self, keys):
+        """
+        Get if any of the property keys are used by the document
+        
+        Keyword arguments:
+        keys        -- property keys
+        """
+        return not self.referenced_properties.isdisjoint(keys)
+
+    def requires_processing(self, keys):
+        """
+        Get if a change to any of the property keys means the document must
+        be processed again (rather than just re-substituted)
+        
+        Keyword arguments:
+        keys        -- property keys
+        """
+        return not self.structural_properties.isdisjoint(keys)
+
+    """
+    Private
+    """
+
+    def _add_slots(self, text):
+        if text and Template.delimiter in text:
+            self.slot_properties.update(self._get_names(text))
+
+    @staticmethod
+    def _get_names(text):
+        names = []
+        if text and Template.delimiter in text:
+            for match in Template.pattern.finditer(text):
+                name = match.group("named") or match.group("braced")
+                if name is not None:
+                    names.append(name)
+        return names
+
+
+def split_layers(document, dynamic_ids=()):
+    """
+    Split a processed SVG document into a static background layer and a
+    dynamic overlay layer, returning the text of both documents. The
+    background consists of the drawing elements, in paint order, that come
+    before the first dynamic element, so painting the background then the
+    overlay gives the same result as painting the whole document. Dynamic
+    elements are those containing substitution slots, those with a title
+    (deletes, images), progress bars, text boxes, scrolling text, child
+    components and <use> elements. None is returned for the background if
+    there are no leading static elements.
+    
+    Keyword arguments:
+    document        -- processed document
+    dynamic_ids     -- IDs of elements that must always be treated as dynamic
+    """
+    root = document.getroot() if hasattr(document, "getroot") else document
+    static_paths = []
+    splittable = True
+
+    # Definitions (e.g. gradients) are shared by both layers, so cannot contain slots
+    for child in root:
+        if _local_name(child.tag) in NON_DRAWING_ELEMENTS and _is_dynamic(child, dynamic_ids):
+            splittable = False
+            break
+
+    if splittable:
+        _find_static_prefix(root, (), dynamic_ids, static_paths)
+
+    if len(static_paths) == 0:
+        return None, _to_text(root)
+
+    background = deepcopy(root)
+    overlay = deepcopy(root)
+
+    # Keep only the static elements (and the groups containing them) in the background
+    keep = set()
+    for path in static_paths:
+        for i in range(1, len(path) + 1):
+            keep.add(path[:i])
+    _remove_unkept(background, (), keep)
+
+    # Remove static elements from the overlay, last first so paths stay valid
+    for path in reversed(static_paths):
+        parent = overlay
+        for index in path[:-1]:
+            parent = parent[index]
+        parent.remove(parent[path[-1]])
+
+    return _to_text(background), _to_text(overlay)
+
+
+def _find_static_prefix(element, path, dynamic_ids, static_paths):
+    for index, child in enumerate(element):
+        name = _local_name(child.tag)
+        if name is None or name in NON_DRAWING_ELEMENTS:
+            continue
+        if not _is_dynamic(child, dynamic_ids):
+            static_paths.append(path + (index,))
+        elif name == "g" and _is_transparent_group(child):
+            if not _find_static_prefix(child, path + (index,), dynamic_ids, static_paths):
+                return False
+        else:
+            return False
+    return True
+
+
+def _remove_unkept(element, path, keep):
+    for index in range(len(element) - 1, -1, -1):
+        child = element[index]
+        child_path = path + (index,)
+        if child_path in keep:
+            _remove_unkept(child, child_path, keep)
+        elif _local_name(child.tag) not in NON_DRAWING_ELEMENTS:
+            element.remove(child)
+
+
+def _is_dynamic(element, dynamic_ids):
+    for el in element.iter():
+        name = _local_name(el.tag)
+        if name is None:
+            continue
+        if name == "use" or (name in ("text", "flowRoot") and el.get("clip-path")):
+            return True
+        if el.get("title") is not None or el.get("class") in ("progress", "textbox") or \
+                el.get("id") in dynamic_ids:
+            return True
+        if (el.text and Template.delimiter in el.text) or (el.tail and Template.delimiter in el.tail):
+            return True
+        for value in el.attrib.values():
+            if Template.delimiter in value:
+                return True
+    return False
+
+
+def _is_transparent_group(element):
+    """
+    Get if painting the children of a group separately gives the same result
+    as painting the group as a whole, i.e. the group is not composited
+    """
+    if element.get("opacity") or element.get("filter") or element.get("mask"):
+        return False
+    style = element.get("style")
+    return not style or not ("opacity" in style or "filter" in style or "mask" in style)
+
+
+def _local_name(tag):
+    if not isinstance(tag, str):
+        return None
+    return tag.rsplit("}", 1)[-1]
+
+
+def _to_text(element):
+    xml = etree.tostring(element)
+    return xml.decode("utf-8") if isinstance(xml, bytes) else xml
+
+
+def _encode_value(value):
+    """
+    XML encode a property value as text, so it can be joined with the
+    (decoded) literal text of a SlotTemplate. Byte strings, such as locale
+    formatted dates or the str() of most objects on Python 2, are decoded as
+    UTF-8.
+
+    Keyword arguments:
+    value        -- property value
+    """
+    text = value if isinstance(value, type(u"")) else str(value)
+    if isinstance(text, bytes):
+        text = text.decode("utf-8", "replace")
+    return saxutils.escape(text)
+
+
+def get_changed_keys(old, new):
+    """
+    Get the set of keys whose values differ between two dictionaries (including
+    keys that are only present in one of them)
+    
+    Keyword arguments:
+    old        -- old dictionary
+    new        -- new dictionary
+    """
+    changed = set()
+    for key, value in new.items():
+        if key not in old:
+            changed.add(key)
+        else:
+            old_value = old[key]
+            if old_value is not value and old_value != value:
+                changed.add(key)
+    for key in old:
+        if key not in new:
+            changed.add(key)
+    return changed
 
 
 class ScrollState(object):
@@ -289,6 +624,7 @@ class Component(object):
         self.theme_attributes = {}
         self.theme_properties_callback = None
         self.theme_attributes_callback = None
+        self.changed_theme_properties = None
         self.view_bounds = None
         self.view_element = None
         self.layout_manager = None
@@ -300,6 +636,89 @@ class Component(object):
         self.showing = True
         self.activatable = False
         self.scrollbar = None
+        self._common_properties = {}
+        self._theme_changed_keys = None
+
+    def set(self, key, value):
+        """
+        Set a theme property. Once properties are set using this function (or
+        update(), unset() and set_theme_properties()), the theme is told which
+        properties have changed since the last paint, and can skip any work
+        for properties it does not use. Properties should then not be changed
+        by modifying theme_properties directly.
+        
+        Returns True if the value actually changed.
+        
+        Keyword arguments:
+        key            -- property name
+        value          -- property value
+        """
+        self.get_tree_lock().acquire()
+        try:
+            if self.changed_theme_properties is None:
+                self.changed_theme_properties = set()
+            if key in self.theme_properties:
+                old_value = self.theme_properties[key]
+                if old_value is value or (type(old_value) == type(value) and old_value == value):
+                    return False
+            self.theme_properties[key] = value
+            self.changed_theme_properties.add(key)
+            return True
+        finally:
+            self.get_tree_lock().release()
+
+    def unset(self, key):
+        """
+        Remove a theme property. See set().
+        
+        Keyword arguments:
+        key            -- property name
+        """
+        self.get_tree_lock().acquire()
+        try:
+            if self.changed_theme_properties is None:
+                self.changed_theme_properties = set()
+            if key in self.theme_properties:
+                del self.theme_properties[key]
+                self.changed_theme_properties.add(key)
+        finally:
+            self.get_tree_lock().release()
+
+    def update(self, properties):
+        """
+        Set a number of theme properties. See set().
+        
+        Returns True if any value actually changed.
+        
+        Keyword arguments:
+        properties     -- dictionary of property names and values
+        """
+        self.get_tree_lock().acquire()
+        try:
+            changed = False
+            for key, value in properties.items():
+                if self.set(key, value):
+                    changed = True
+            return changed
+        finally:
+            self.get_tree_lock().release()
+
+    def set_theme_properties(self, properties):
+        """
+        Replace all theme properties, removing any not in the new dictionary.
+        See set().
+        
+        Keyword arguments:
+        properties     -- dictionary of property names and values
+        """
+        self.get_tree_lock().acquire()
+        try:
+            for key in list(self.theme_properties.keys()):
+                if key not in properties:
+                    self.unset(key)
+            self.update(properties)
+        finally:
+            self.get_tree_lock().release()
 
     def set_scrollbar(self, scrollbar):
         self.scrollbar = scrollbar
@@ -542,7 +961,7 @@ class Component(object):
         """
         Paint the theme. Do not call directly, instead call paint()
         """
-        self.theme.draw(canvas, properties, self.get_theme_attributes())
+        self.theme.draw(canvas, properties, self.get_theme_attributes(), self._theme_changed_keys)
 
     def paint(self, canvas):
         g15screen.check_on_redraw()
@@ -564,9 +983,16 @@ class Component(object):
                 canvas.save()
                 properties = self.get_theme_properties()
 
+                # Only properties maintained using set() are tracked
+                changed = None
+                if properties is self.theme_properties and self.changed_theme_properties is not None:
+                    changed = self.changed_theme_properties
+                    self.changed_theme_properties = set()
+
                 # Add some common properties
+                common = {}
                 if self.get_root().focused_component is not None:
-                    properties['%s_focused' % self.get_root().focused_component.id] = "true"
+                    common['%s_focused' % self.get_root().focused_component.id] = "true"
 
                 screen = self.get_screen()
                 if screen:
@@ -574,11 +1000,22 @@ class Component(object):
                     for k in states:
                         ks = states[k]
                         if ks.state_id == g15driver.KEY_STATE_DOWN:
-                            properties['key_%s' % k] = True
+                            common['key_%s' % k] = True
                         elif ks.state_id == g15driver.KEY_STATE_HELD:
-                            properties['key_%s_held' % k] = True
-
-                self.paint_theme(canvas, properties, self.get_theme_attributes())
+                            common['key_%s_held' % k] = True
+
+                if common or self._common_properties:
+                    if changed is not None:
+                        changed.update(get_changed_keys(self._common_properties, common))
+                    properties = dict(properties)
+                    properties.update(common)
+                self._common_properties = common
+
+                self._theme_changed_keys = changed
+                try:
+                    self.paint_theme(canvas, properties, self.get_theme_attributes())
+                finally:
+                    self._theme_changed_keys = None
                 canvas.restore()
 
             # Layout any children
@@ -689,7 +1126,7 @@ class G15Page(Component):
     def redraw(self, queue=True):
         screen = self.get_screen()
         if screen:
-            screen.redraw(self, queue)
+            screen.redraw(self, queue=queue)
 
     def next_focus(self, redraw=True):
         focus_list = self._add_to_focus_list(self, [])
@@ -1499,6 +1936,9 @@ class G15Theme(object):
         self.component = None
         self.auto_dirty = auto_dirty
         self.render = None
+        self.compiled = None
+        self.svg_handles = OrderedDict()
+        self.backgrounds = OrderedDict()
         self.scroll_state = {}
         self.nsmap = {
             'sodipodi': 'http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd',
@@ -1541,6 +1981,9 @@ class G15Theme(object):
                 self.page.on_shown_listeners.append(self._page_visibility_changed)
                 self.page.on_hidden_listeners.append(self._page_visibility_changed)
 
+            self.compiled = None
+            self.svg_handles.clear()
+            self.backgrounds.clear()
             if self.page is None:
                 self.document = None
                 self.screen = None
@@ -1587,6 +2030,7 @@ class G15Theme(object):
                     raise Exception("Must either supply theme directory or SVG text")
 
                 self.process_svg()
+                self.compiled = CompiledTheme(self.document.getroot(), self.nsmap)
                 self.bounds = g15svg.get_bounds(self.document.getroot())
         finally:
             self.render_lock.release()
@@ -1731,12 +2175,30 @@ class G15Theme(object):
 
     def mark_dirty(self):
         self.dirty = True
+        self.backgrounds.clear()
 
-    def draw(self, canvas, properties={}, attributes={}):
-        if self.render is not None and self.auto_dirty:
-            if self.render.properties != properties or self.render.attributes != attributes or \
-                    self.render.properties.values() != properties.values() or self.render.attributes.values() != attributes.values():
+    def draw(self, canvas, properties={}, attributes={}, changed_keys=None):
+        """
+        Draw the theme.
+        
+        Keyword arguments:
+        canvas            -- canvas
+        properties        -- theme properties
+        attributes        -- theme attributes
+        changed_keys      -- keys of the properties changed since the last draw if known (see Component.set()),
+                             otherwise the properties are compared with those of the last draw
+        """
+        if self.render is not None and self.auto_dirty and not self.dirty:
+            if self.render.attributes != attributes:
                 self.dirty = True
+            else:
+                changed = get_changed_keys(self.render.properties, properties) if changed_keys is None else changed_keys
+                if changed:
+                    if self._requires_processing(changed):
+                        self.dirty = True
+                    elif self.compiled.references(changed):
+                        # Only substituted text has changed, the processed document can be reused
+                        self.render.properties = dict(properties)
 
         if self.render is None or self.dirty:
             self.render_lock.acquire()
@@ -1791,7 +2253,7 @@ class G15Theme(object):
 
                 self._set_default_style(root)
 
-                self.render = Render(document, properties, text_boxes, attributes, processing_result)
+                self.render = Render(document, dict(properties), text_boxes, dict(attributes), processing_result)
                 self.dirty = False
             finally:
                 self.render_lock.release()
@@ -1810,6 +2272,8 @@ class G15Theme(object):
             if len(self.scroll_state) > 0:
                 for key in self.scroll_state:
                     self.scroll_state[key].next()
+                if self.render is not None:
+                    self.render.document_changed()
                 return True
         finally:
             self.render_lock.release()
@@ -1818,6 +2282,51 @@ class G15Theme(object):
     Private
     """
 
+    def _requires_processing(self, changed):
+        """
+        Get if changes to the given property keys mean the document must be
+        processed again. This is always the case if python code or an SVG
+        processor may use the properties.
+        
+        Keyword arguments:
+        changed        -- keys of changed properties
+        """
+        if self.compiled is None or self.svg_processor is not None:
+            return True
+        if self.instance is not None and (hasattr(self.instance, 'process_svg')
+                                          or hasattr(self.instance, 'paint_background')):
+            return True
+        return self.compiled.requires_processing(changed)
+
+    def _get_svg_handle(self, xml):
+        """
+        Get a parsed SVG handle for the given document text. Recently used
+        handles are kept, so documents whose content has not changed (e.g.
+        repainting for a transition or the panel) are not parsed again.
+        
+        Keyword arguments:
+        xml            -- SVG document text
+        """
+        svg = self.svg_handles.pop(xml, None)
+        if svg is None:
+            svg = rsvg.Handle()
+            try:
+                svg.write(xml.encode("utf-8") if not isinstance(xml, bytes) else xml)
+                if DEBUG_SVG:
+                    print("------------------------------------------------------")
+                    print(xml)
+                    print("------------------------------------------------------")
+            except Exception as e:
+                logger.debug("Could not write SVG", exc_info=e)
+            try:
+                svg.close()
+            except Exception as e:
+                logger.debug("Could not close SVG", exc_info=e)
+            while len(self.svg_handles) >= SVG_HANDLE_CACHE_SIZE:
+                self.svg_handles.popitem(last=False)
+        self.svg_handles[xml] = svg
+        return svg
+
     def _process_components(self, root):
         """
         Find all elements that are associated with child components in the component this
@@ -2113,29 +2622,11 @@ class G15Theme(object):
         pass
 
     def _render_document(self, canvas, render):
-
-        encoded_properties = {}
-        # Encode entities in all the property values
-        for key in render.properties.keys():
-            encoded_properties[key] = saxutils.escape(str(render.properties[key]))
-
-        xml = etree.tostring(render.document)
-        t = Template(xml)
-        xml = t.safe_substitute(encoded_properties)
-        svg = rsvg.Handle()
-        try:
-            svg.write(xml)
-            if DEBUG_SVG:
-                print("------------------------------------------------------")
-                print(xml)
-                print("------------------------------------------------------")
-        except Exception as e:
-            logger.debug("Could not write SVG", exc_info=e)
-        try:
-            svg.close()
-        except Exception as e:
-            logger.debug("Could not close SVG", exc_info=e)
-
+        dynamic_ids = self.component.child_map if self.component is not None else ()
+        xml = render.substitute(dynamic_ids)
+        if render.background is not None:
+            self._render_background(canvas, render.background)
+        svg = self._get_svg_handle(xml)
         svg.render_cairo(canvas)
 
         if len(render.text_boxes) > 0:
@@ -2154,6 +2645,51 @@ class G15Theme(object):
             except Exception as e:
                 logger.debug("Error painting foreground", exc_info=e)
 
+    def _render_background(self, canvas, xml):
+        """
+        Paint the static background layer. This is rasterised once for each
+        size and driver colour set, and then just painted on following frames.
+        The background is drawn as SVG if the canvas is rotated or flipped.
+        
+        Keyword arguments:
+        canvas        -- canvas
+        xml           -- background document text
+        """
+        matrix = canvas.get_matrix()
+        xx, yx, xy, yy, x0, y0 = matrix.xx, matrix.yx, matrix.xy, matrix.yy, matrix.x0, matrix.y0
+        if yx != 0 or xy != 0 or xx <= 0 or yy <= 0:
+            self._get_svg_handle(xml).render_cairo(canvas)
+            return
+
+        fx = x0 - math.floor(x0)
+        fy = y0 - math.floor(y0)
+        colors = (self.driver.get_color_as_hexrgb(g15driver.HINT_FOREGROUND, (0, 0, 0)),
+                  self.driver.get_color_as_hexrgb(g15driver.HINT_BACKGROUND, (255, 255, 255)),
+                  self.driver.get_color_as_hexrgb(g15driver.HINT_HIGHLIGHT, (255, 0, 0)))
+        key = (xml, xx, yy, fx, fy, colors)
+        surface = self.backgrounds.pop(key, None)
+        if surface is None:
+            svg = self._get_svg_handle(xml)
+            dimensions = svg.get_dimensions()
+            width = int(math.ceil(dimensions.width * xx + fx))
+            height = int(math.ceil(dimensions.height * yy + fy))
+            if width <= 0 or height <= 0:
+                return
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+            context = cairo.Context(surface)
+            context.translate(fx, fy)
+            context.scale(xx, yy)
+            svg.render_cairo(context)
+            while len(self.backgrounds) >= BACKGROUND_CACHE_SIZE:
+                self.backgrounds.popitem(last=False)
+        self.backgrounds[key] = surface
+
+        canvas.save()
+        canvas.identity_matrix()
+        canvas.set_source_surface(surface, x0 - fx, y0 - fy)
+        canvas.paint()
+        canvas.restore()
+
     def _render_text_box(self, canvas, text_box, rgb, bg_rgb):
         self._update_text(text_box, text_box.wrap)
 
@@ -2163,18 +2699,12 @@ class G15Theme(object):
         #            foreground = None
 
         if text_box.normal_shadow or text_box.reverse_shadow:
-            if text_box.normal_shadow:
-                canvas.set_source_rgb(bg_rgb[0], bg_rgb[1], bg_rgb[2])
-            else:
-                canvas.set_source_rgb(rgb[0], rgb[1], rgb[2])
-            for x in range(-1, 2):
-                for y in range(-1, 2):
-                    if x != 0 or y != 0:
-                        self.text.draw(text_box.bounds[0] + x, text_box.bounds[1] + y - text_box.base)
-
-        # Draw primary text to canvas                
-        canvas.set_source_rgb(rgb[0], rgb[1], rgb[2])
-        self.text.draw(text_box.bounds[0], text_box.bounds[1] - text_box.base)
+            self.text.draw_shadowed(bg_rgb if text_box.normal_shadow else rgb, rgb,
+                                    text_box.bounds[0], text_box.bounds[1] - text_box.base)
+        else:
+            # Draw primary text to canvas
+            canvas.set_source_rgb(rgb[0], rgb[1], rgb[2])
+            self.text.draw(text_box.bounds[0], text_box.bounds[1] - text_box.base)
 
     @staticmethod
     def _get_actual_size(element, width, height):
@@ -21,12 +21,34 @@ is the GObject based bindings, which would be great except it means converting
 ALL of Gnome15 to use such bindings.
 
 This class is stop gap until a better solution can be found
+
+It also provides snapshot(), which reads /proc/stat, /proc/meminfo,
+/proc/net/dev and the status of this process in a single pass, and is shared
+by everything that samples system statistics. The files are kept open and
+re-read from the start each time, and a snapshot is reused by anything asking
+for one within SNAPSHOT_MAX_AGE seconds of it being taken. The python-gtop
+compatible functions are built on top of this.
 """
 
 from __future__ import print_function
+import array
 import os
+import threading
 import time
 
+"""
+Snapshots younger than this (in seconds) are shared rather than re-sampled.
+Consumers refreshing on the same tick therefore share a sample.
+"""
+SNAPSHOT_MAX_AGE = 0.5
+
+"""
+Number of values per CPU in Snapshot.cpu_times (user, nice, sys, idle)
+"""
+CPU_FIELDS = 4
+
+_READ_SIZE = 65536
+
 
 class CPU:
     def __init__(self, name):
@@ -38,22 +60,16 @@ class CPU:
 
 
 class CPUS(CPU):
-    def __init__(self):
+    def __init__(self, sample=None):
         CPU.__init__(self, "CPUS")
-        cpu_data = open('/proc/stat')
+        if sample is None:
+            sample = snapshot()
+        self.user, self.nice, self.sys, self.idle = [int(v) for v in sample.get_cpu_times(-1)]
         self.cpus = []
-        try:
-            for line in cpu_data:
-                if line.startswith("cpu"):
-                    (name, cuse, cn, csys, idle, tail) = line.split(None, 5)
-                    cpu_obj = self if name == "cpu" else CPU(name)
-                    self.user = int(cuse)
-                    self.nice = int(cn)
-                    self.sys = int(csys)
-                    self.idle = int(idle)
-                    self.cpus.append(cpu_obj)
-        finally:
-            cpu_data.close()
+        for i, name in enumerate(sample.cpu_names[1:]):
+            cpu_obj = CPU(name)
+            cpu_obj.user, cpu_obj.nice, cpu_obj.sys, cpu_obj.idle = [int(v) for v in sample.get_cpu_times(i)]
+            self.cpus.append(cpu_obj)
 
 
 class ProcState:
@@ -83,25 +99,179 @@ class NetworkLoad:
 
 
 class Mem:
+    def __init__(self, sample=None):
+        if sample is None:
+            sample = snapshot()
+        self.total = sample.mem_total
+        self.free = sample.mem_free
+        self.cached = sample.mem_cached
+
+
+class Snapshot:
+    """
+    A single sample of system statistics. CPU and network figures are held in
+    flat arrays, indexed in the same order as the corresponding list of names.
+
+    cpu_names        -- "cpu" (the total) followed by "cpu0", "cpu1" ...
+    cpu_times        -- CPU_FIELDS values (user, nice, sys, idle) for each CPU, in USER_HZ
+    net_names        -- network interface names
+    net_bytes        -- bytes received and bytes sent for each interface
+    mem_total        -- total memory in bytes
+    mem_free         -- free memory in bytes
+    mem_cached       -- cached memory in bytes
+    vm_size          -- virtual memory size of this process in bytes
+    vm_rss           -- resident memory size of this process in bytes
+    vm_stk           -- stack size of this process in bytes
+    time             -- time the sample was taken
+    """
+
     def __init__(self):
-        self.total = 0
-        self.free = 0
-        self.cached = 0
-        memdata = open('/proc/meminfo')
+        self.cpu_names = []
+        self.cpu_times = array.array("d")
+        self.net_names = []
+        self.net_bytes = array.array("d")
+        self.mem_total = 0
+        self.mem_free = 0
+        self.mem_cached = 0
+        self.vm_size = 0
+        self.vm_rss = 0
+        self.vm_stk = 0
+        self.time = 0
+
+    def get_cpu_times(self, number):
+        """
+        Get the (user, nice, sys, idle) times of a CPU
+
+        Keyword arguments:
+        number        --    CPU number, or -1 for the total
+        """
+        offset = (number + 1) * CPU_FIELDS
+        return tuple(self.cpu_times[offset:offset + CPU_FIELDS])
+
+    def get_net_bytes(self, net):
+        """
+        Get the (received, sent) byte counts of a network interface, or None
+        if there is no such interface
+
+        Keyword arguments:
+        net        --    network interface name
+        """
         try:
-            for line in memdata:
-                if line.startswith("MemTotal"):
-                    self.total = self._get_value(line)
-                elif line.startswith("MemFree"):
-                    self.free = self._get_value(line)
-                elif line.startswith("Cached"):
-                    self.cached = self._get_value(line)
-        finally:
-            memdata.close()
+            offset = self.net_names.index(net) * 2
+        except ValueError:
+            return None
+        return self.net_bytes[offset], self.net_bytes[offset + 1]
+
+
+class Sampler:
+    """
+    Takes snapshots. Each /proc file is opened once, and read from the start
+    with pread() every time a snapshot is taken.
+    """
+
+    def __init__(self):
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def sample(self):
+        with self._lock:
+            snap = Snapshot()
+            snap.time = time.time()
+            self._parse_stat(snap, self._read("/proc/stat"))
+            self._parse_meminfo(snap, self._read("/proc/meminfo"))
+            self._parse_net_dev(snap, self._read("/proc/net/dev"))
+            self._parse_status(snap, self._read("/proc/self/status"))
+            return snap
+
+    def close(self):
+        with self._lock:
+            for fd in self._files.values():
+                os.close(fd)
+            self._files = {}
+
+    """
+    Private
+    """
+
+    def _read(self, path):
+        fd = self._files.get(path)
+        if fd is None:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                # Not Linux, or not allowed
+                return ""
+            self._files[path] = fd
+        chunks = []
+        offset = 0
+        while True:
+            chunk = _pread(fd, _READ_SIZE, offset)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+        data = b"".join(chunks)
+        return data if isinstance(data, str) else data.decode("utf-8", "replace")
 
     @staticmethod
-    def _get_value(line):
-        return int(line[line.index(':') + 1:line.index('kB')]) * 1024
+    def _parse_stat(snap, text):
+        for line in text.splitlines():
+            if not line.startswith("cpu"):
+                break
+            fields = line.split(None, CPU_FIELDS + 1)
+            snap.cpu_names.append(fields[0])
+            snap.cpu_times.extend(float(v) for v in fields[1:CPU_FIELDS + 1])
+
+    @staticmethod
+    def _parse_meminfo(snap, text):
+        for line in text.splitlines():
+            if line.startswith("MemTotal:"):
+                snap.mem_total = _get_kb_value(line)
+            elif line.startswith("MemFree:"):
+                snap.mem_free = _get_kb_value(line)
+            elif line.startswith("Cached:"):
+                snap.mem_cached = _get_kb_value(line)
+
+    @staticmethod
+    def _parse_net_dev(snap, text):
+        for line in text.splitlines():
+            idx = line.find(":")
+            if idx == -1:
+                continue
+            data = line[idx + 1:].split()
+            snap.net_names.append(line[:idx].strip())
+            snap.net_bytes.append(float(data[0]))
+            snap.net_bytes.append(float(data[8]))
+
+    @staticmethod
+    def _parse_status(snap, text):
+        for line in text.splitlines():
+            if line.startswith("VmSize:"):
+                snap.vm_size = _get_kb_value(line)
+            elif line.startswith("VmRSS:"):
+                snap.vm_rss = _get_kb_value(line)
+            elif line.startswith("VmStk:"):
+                snap.vm_stk = _get_kb_value(line)
+
+
+_sampler = Sampler()
+_last_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def snapshot(max_age=SNAPSHOT_MAX_AGE):
+    """
+    Get a snapshot of system statistics. If one was taken less than max_age
+    seconds ago it is returned, otherwise a new one is taken.
+
+    Keyword arguments:
+    max_age        --    maximum age in seconds of a shared snapshot (0 to always sample)
+    """
+    global _last_snapshot
+    with _snapshot_lock:
+        if _last_snapshot is None or time.time() - _last_snapshot.time >= max_age:
+            _last_snapshot = _sampler.sample()
+        return _last_snapshot
 
 
 def netload(net):
@@ -112,32 +282,16 @@ def netload(net):
     Keyword arguments:
     net        --    network interface name
     """
-    prefix = '%6s:' % net
-    netdata = open('/proc/net/dev')
-    try:
-        for line in netdata:
-            if line.startswith(prefix):
-                data = line[line.index(':') + 1:].split()
-                return NetworkLoad(net, int(data[0]), int(data[8]))
-    finally:
-        netdata.close()
+    net_bytes = snapshot().get_net_bytes(net)
+    if net_bytes is not None:
+        return NetworkLoad(net, int(net_bytes[0]), int(net_bytes[1]))
 
 
 def netlist():
     """
     Returns a list of Net objects, one for each available network interface 
     """
-    nets = []
-    f = open("/proc/net/dev", "r")
-    tmp = f.readlines(2000)
-    f.close()
-    for line in tmp:
-        line = line.strip()
-        line = line.split(' ')
-        if len(line) > 0 and line[0].endswith(":"):
-            nets.append(line[0][:-1])
-
-    return nets
+    return list(snapshot().net_names)
 
 
 def cpu():
@@ -211,6 +365,22 @@ def uptime():
     return Uptime(float(vals[0]), float(vals[1]))
 
 
+"""
+Private
+"""
+
+
+def _get_kb_value(line):
+    return int(line[line.index(':') + 1:line.rindex('kB')]) * 1024
+
+
+def _pread(fd, size, offset):
+    if hasattr(os, "pread"):
+        return os.pread(fd, size, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, size)
+
+
 if __name__ == "__main__":
     for __d in proclist():
         ps = proc_state(__d)
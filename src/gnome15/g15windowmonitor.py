@@ -0,0 +1,402 @@
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2011 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Monitors which window is active, so the macro profile may be switched when
+the focus changes. A number of backends are available, tried in this order :-
+
+    bamf        ActiveWindowChanged signals from the BAMF daemon on the session bus
+    wnck        active-window-changed signals from libwnck
+    xlib        PropertyNotify events for _NET_ACTIVE_WINDOW on the root window
+    polling     querying libwnck every POLL_INTERVAL seconds (last resort)
+
+All backends call back with a list of application names (most specific first)
+and the window title whenever the active window (or its title) changes. The
+time taken from receiving the event to the callback completing is recorded,
+see AbstractWindowMonitor.get_statistics().
+
+tools/window_monitor.py starts a monitor and prints each change, e.g.
+against a local Xvfb server :-
+
+    DISPLAY=:99 python2 tools/window_monitor.py xlib
+"""
+
+import logging
+import time
+
+import dbus
+from gi.repository import GLib as glib
+
+logger = logging.getLogger(__name__)
+
+# How often (in seconds) the polling backend checks the active window
+POLL_INTERVAL = 0.5
+
+BACKENDS = ["bamf", "wnck", "xlib", "polling"]
+
+
+def create_monitor(callback, session_bus=None, backends=None):
+    """
+    Create and start the first available window monitor. None is returned if
+    no backend could be started.
+
+    Keyword arguments:
+    callback        -- function to invoke with (application_names, window_title) on change
+    session_bus     -- session bus, required for the BAMF backend
+    backends        -- list of backend names to try, defaults to BACKENDS
+    """
+    for backend in backends if backends is not None else BACKENDS:
+        if backend == "bamf":
+            if session_bus is None:
+                continue
+            monitor = BAMFWindowMonitor(callback, session_bus)
+        elif backend == "wnck":
+            monitor = WnckWindowMonitor(callback)
+        elif backend == "xlib":
+            monitor = XlibWindowMonitor(callback)
+        elif backend == "polling":
+            monitor = PollingWindowMonitor(callback)
+        else:
+            raise Exception("Unknown window monitor backend %s" % backend)
+        try:
+            monitor.start()
+            logger.info("Will be using %s for window matching", backend)
+            return monitor
+        except Exception as e:
+            logger.info("Window monitor backend %s not available", backend)
+            logger.debug("Window monitor error", exc_info=e)
+
+
+class AbstractWindowMonitor(object):
+    """
+    Base class for window monitors. Subclasses must implement start() and
+    stop(), and call _changed() when the active window changes.
+    """
+
+    def __init__(self, name, callback):
+        self.name = name
+        self.callback = callback
+        self.application_names = []
+        self.window_title = None
+        self.events = 0
+        self.changes = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+
+    def start(self):
+        """
+        Start monitoring. An exception should be raised if the backend is not
+        available.
+        """
+        raise Exception("Not implemented")
+
+    def stop(self):
+        raise Exception("Not implemented")
+
+    def get_statistics(self):
+        """
+        Get the number of events received, the number of changes passed on to
+        the callback, and how long (in seconds) it took from receiving the
+        event to the callback completing. For the polling backend this does
+        not include the time spent waiting for the next poll.
+        """
+        return {"backend": self.name,
+                "events": self.events,
+                "changes": self.changes,
+                "last_latency": self.last_latency,
+                "mean_latency": self.total_latency / self.changes if self.changes > 0 else 0.0,
+                "max_latency": self.max_latency}
+
+    """
+    Private
+    """
+
+    def _changed(self, application_names, window_title, received):
+        self.events += 1
+        application_names = [n for n in application_names if n]
+        if application_names == self.application_names and window_title == self.window_title:
+            return
+        self.application_names = application_names
+        self.window_title = window_title
+        try:
+            self.callback(application_names, window_title)
+        except Exception as e:
+            logger.warning("Failed to handle active window change", exc_info=e)
+        latency = time.time() - received
+        self.changes += 1
+        self.last_latency = latency
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        logger.debug("Active window change to %s (%s) took %.1fms", application_names, window_title,
+                     latency * 1000.0)
+
+
+class BAMFWindowMonitor(AbstractWindowMonitor):
+    """
+    Uses the ActiveWindowChanged signal from the BAMF daemon
+    """
+
+    def __init__(self, callback, session_bus):
+        AbstractWindowMonitor.__init__(self, "bamf", callback)
+        self.session_bus = session_bus
+        self._receiver = None
+
+    def start(self):
+        bamf_object = self.session_bus.get_object('org.ayatana.bamf', '/org/ayatana/bamf/matcher')
+        matcher = dbus.Interface(bamf_object, 'org.ayatana.bamf.matcher')
+        active_window = matcher.ActiveWindow()
+        self._receiver = self.session_bus.add_signal_receiver(self._active_window_changed,
+                                                              dbus_interface='org.ayatana.bamf.matcher',
+                                                              signal_name="ActiveWindowChanged")
+        if active_window:
+            self._active_window_changed("", active_window)
+
+    def stop(self):
+        if self._receiver is not None:
+            self._receiver.remove()
+            self._receiver = None
+
+    """
+    Private
+    """
+
+    def _active_window_changed(self, old, object_name):
+        received = time.time()
+        if object_name == "":
+            return
+        app = self.session_bus.get_object("org.ayatana.bamf", object_name)
+        application_names = []
+        try:
+            view = dbus.Interface(app, 'org.ayatana.bamf.view')
+            self._add_view_names(view, application_names)
+        except dbus.DBusException as e:
+            logger.debug("Could not get current application name", exc_info=e)
+
+        window = dbus.Interface(app, 'org.ayatana.bamf.window')
+        window_title = self._get_x_prop(window, '_NET_WM_VISIBLE_NAME')
+        if not window_title:
+            window_title = self._get_x_prop(window, '_NET_WM_NAME')
+        self._changed(application_names, window_title, received)
+
+    def _add_view_names(self, view, application_names):
+        if view.IsActive() == 1:
+            application_names.append(view.Name())
+            for parent in view.Parents():
+                parent_view = dbus.Interface(self.session_bus.get_object("org.ayatana.bamf", parent),
+                                             'org.ayatana.bamf.view')
+                self._add_view_names(parent_view, application_names)
+
+    @staticmethod
+    def _get_x_prop(window, key):
+        try:
+            return window.XProps(key)
+        except dbus.DBusException as e:
+            logger.debug("Could not get window XProps", exc_info=e)
+            return None
+
+
+class WnckWindowMonitor(AbstractWindowMonitor):
+    """
+    Uses libwnck's active-window-changed signal (and name-changed signal of
+    the active window)
+    """
+
+    def __init__(self, callback):
+        AbstractWindowMonitor.__init__(self, "wnck", callback)
+        self._screen = None
+        self._screen_handle = None
+        self._window = None
+        self._window_handle = None
+
+    def start(self):
+        import gi
+        gi.require_version("Wnck", "3.0")
+        from gi.repository import Wnck as wnck
+        self._screen = wnck.Screen.get_default()
+        if self._screen is None:
+            raise Exception("No Wnck screen")
+        self._screen.force_update()
+        self._screen_handle = self._screen.connect("active-window-changed", self._active_window_changed)
+        self._active_window_changed(self._screen, None)
+
+    def stop(self):
+        self._watch_window(None)
+        if self._screen_handle is not None:
+            self._screen.disconnect(self._screen_handle)
+            self._screen_handle = None
+
+    """
+    Private
+    """
+
+    def _active_window_changed(self, screen, previous_window):
+        received = time.time()
+        window = screen.get_active_window()
+        self._watch_window(window)
+        self._window_changed(window, received)
+
+    def _name_changed(self, window):
+        self._window_changed(window, time.time())
+
+    def _window_changed(self, window, received):
+        if window is not None and not window.is_skip_pager():
+            app = window.get_application()
+            self._changed([app.get_name() if app is not None else ""], window.get_name(), received)
+
+    def _watch_window(self, window):
+        if self._window is not None:
+            self._window.disconnect(self._window_handle)
+        self._window = window
+        self._window_handle = window.connect("name-changed", self._name_changed) if window is not None else None
+
+
+class XlibWindowMonitor(AbstractWindowMonitor):
+    """
+    Watches for PropertyNotify events for _NET_ACTIVE_WINDOW on the root
+    window (and the title properties of the active window) using a dedicated
+    X connection, that is read from the main loop when it has data.
+    """
+
+    def __init__(self, callback, display_name=None):
+        AbstractWindowMonitor.__init__(self, "xlib", callback)
+        self.display_name = display_name
+        self._display = None
+        self._source = None
+        self._window = None
+
+    def start(self):
+        import Xlib.display
+        import Xlib.X
+        import Xlib.Xatom
+        self._display = Xlib.display.Display(self.display_name)
+        self._root = self._display.screen().root
+        self._net_active_window = self._display.intern_atom("_NET_ACTIVE_WINDOW")
+        self._net_wm_name = self._display.intern_atom("_NET_WM_NAME")
+        self._utf8_string = self._display.intern_atom("UTF8_STRING")
+        self._title_atoms = (self._net_wm_name, Xlib.Xatom.WM_NAME)
+        if self._root.get_full_property(self._net_active_window, Xlib.X.AnyPropertyType) is None:
+            self._display.close()
+            self._display = None
+            raise Exception("Window manager does not support _NET_ACTIVE_WINDOW")
+        self._root.change_attributes(event_mask=Xlib.X.PropertyChangeMask)
+        self._display.flush()
+        self._source = glib.io_add_watch(self._display.fileno(), glib.IO_IN, self._handle_events)
+        self._active_window_changed(time.time())
+
+    def stop(self):
+        if self._source is not None:
+            glib.source_remove(self._source)
+            self._source = None
+        if self._display is not None:
+            self._display.close()
+            self._display = None
+
+    """
+    Private
+    """
+
+    def _handle_events(self, fd, condition):
+        import Xlib.X
+        received = time.time()
+        active_changed = False
+        title_changed = False
+        try:
+            for __ in range(self._display.pending_events()):
+                event = self._display.next_event()
+                if event.type != Xlib.X.PropertyNotify:
+                    continue
+                if event.window == self._root and event.atom == self._net_active_window:
+                    active_changed = True
+                elif self._window is not None and event.window == self._window and event.atom in self._title_atoms:
+                    title_changed = True
+            if active_changed:
+                self._active_window_changed(received)
+            elif title_changed:
+                self._window_changed(received)
+        except Exception as e:
+            logger.debug("Error handling X events", exc_info=e)
+        return True
+
+    def _active_window_changed(self, received):
+        import Xlib.X
+        import Xlib.error
+        prop = self._root.get_full_property(self._net_active_window, Xlib.X.AnyPropertyType)
+        window_id = prop.value[0] if prop is not None and len(prop.value) > 0 else 0
+        if self._window is not None:
+            self._window.change_attributes(event_mask=Xlib.X.NoEventMask, onerror=Xlib.error.CatchError())
+        self._window = self._display.create_resource_object("window", window_id) if window_id else None
+        if self._window is not None:
+            self._window.change_attributes(event_mask=Xlib.X.PropertyChangeMask, onerror=Xlib.error.CatchError())
+            self._display.flush()
+        self._window_changed(received)
+
+    def _window_changed(self, received):
+        import Xlib.error
+        if self._window is None:
+            return
+        try:
+            wm_class = self._window.get_wm_class()
+            title = self._window.get_full_property(self._net_wm_name, self._utf8_string)
+            if title is not None:
+                title = title.value
+                if isinstance(title, bytes):
+                    title = title.decode("utf-8", "replace")
+            else:
+                title = self._window.get_wm_name()
+        except Xlib.error.XError as e:
+            logger.debug("Active window went away", exc_info=e)
+            return
+        self._changed([wm_class[1] if wm_class else ""], title, received)
+
+
+class PollingWindowMonitor(AbstractWindowMonitor):
+    """
+    Polls libwnck for the active window. Only used if none of the event driven
+    backends are available.
+    """
+
+    def __init__(self, callback, interval=POLL_INTERVAL):
+        AbstractWindowMonitor.__init__(self, "polling", callback)
+        self.interval = interval
+        self._timer = None
+
+    def start(self):
+        import gi
+        gi.require_version("Wnck", "3.0")
+        from gi.repository import Wnck as wnck
+        self._wnck = wnck
+        self._timer = glib.timeout_add(int(self.interval * 1000), self._poll)
+        self._poll()
+
+    def stop(self):
+        if self._timer is not None:
+            glib.source_remove(self._timer)
+            self._timer = None
+
+    """
+    Private
+    """
+
+    def _poll(self):
+        try:
+            window = self._wnck.Screen.get_default().get_active_window()
+            if window is not None and not window.is_skip_pager():
+                app = window.get_application()
+                self._changed([app.get_name() if app is not None else ""], window.get_name(), time.time())
+        except Exception as e:
+            logger.warning("Failed to check active window", exc_info=e)
+        return self._timer is not None
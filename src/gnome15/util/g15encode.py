@@ -0,0 +1,487 @@
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2011 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Frame encoders that turn the ARGB32 buffer of a Cairo image surface into the
+raw format a device expects.
+
+Monochrome frames are thresholded on luminance, optionally inverted, and
+packed 8 pixels to a byte in one of two layouts :-
+
+    libg15          pixels packed continuously, most significant bit first,
+                    as expected by libg15's writePixmapToLCD()
+    framebuffer     each row packed least significant bit first, with rows
+                    starting every 'line_length' bytes, as expected by the
+                    kernel framebuffer drivers
+
+Colour frames are converted to little-endian 16 bit RGB (5-6-5), written
+straight into a caller supplied buffer (for example one that already holds a
+device's frame header) so no intermediate buffers are needed.
+
+NumPy is used if available. Otherwise the conversion is done using slicing,
+str/bytes.translate() and arbitrary precision integer arithmetic, so there is
+no per-pixel Python in either case. The pure Python encoder works with both
+Python 2 and 3.
+"""
+
+import array
+import binascii
+import logging
+import mmap
+import sys
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy
+except ImportError as __e:
+    logger.debug("NumPy not available, using pure Python frame encoder", exc_info=__e)
+    numpy = None
+
+"""
+Default luminance threshold. Pixels darker than this are 'on'
+"""
+DEFAULT_THRESHOLD = 128
+
+"""
+Byte offsets of the colour channels within a Cairo ARGB32 pixel. The format
+is native endian 32 bit words, so the byte order depends on the platform
+"""
+if sys.byteorder == "little":
+    _R, _G, _B = 2, 1, 0
+else:
+    _R, _G, _B = 1, 2, 3
+
+"""
+Luminance weights (ITU-R 601, scaled to 256). The weighted sum of a pixel
+always fits in 16 bits
+"""
+_R_WEIGHT, _G_WEIGHT, _B_WEIGHT = 77, 150, 29
+
+"""
+Translation tables used by the pure Python encoder to turn a 0/1 pixel
+byte into the bit for its position within a packed byte
+"""
+_MSB_BITS = [bytes(bytearray([0, 1 << (7 - i)] + [0] * 254)) for i in range(8)]
+_LSB_BITS = [bytes(bytearray([0, 1 << i] + [0] * 254)) for i in range(8)]
+
+"""
+Translation tables used by the pure Python RGB565 encoder. Each gives the
+contribution of a channel to the low or high byte of a pixel
+"""
+_RGB565_G_LOW = bytes(bytearray(((v >> 2) & 0x07) << 5 for v in range(256)))
+_RGB565_B_LOW = bytes(bytearray(v >> 3 for v in range(256)))
+_RGB565_R_HIGH = bytes(bytearray((v >> 3) << 3 for v in range(256)))
+_RGB565_G_HIGH = bytes(bytearray(v >> 5 for v in range(256)))
+
+"""
+Cairo's FORMAT_RGB16_565. Not imported from Cairo so this module can be used
+without it
+"""
+_CAIRO_FORMAT_RGB16_565 = 4
+
+_threshold_tables = {}
+
+
+def has_numpy():
+    return numpy is not None
+
+
+def encode_mono_libg15(data, width, height, stride=None, invert=False, threshold=DEFAULT_THRESHOLD, length=None):
+    """
+    Encode an ARGB32 buffer in the libg15 layout.
+
+    Keyword arguments:
+    data        -- ARGB32 buffer (anything supporting the buffer protocol)
+    width       -- width of the frame in pixels
+    height      -- height of the frame in pixels
+    stride      -- bytes per row in 'data' (defaults to width * 4)
+    invert      -- if True, light pixels are 'on' instead of dark ones
+    threshold   -- luminance (0-255) below which a pixel is dark
+    length      -- pad the result with zeros to at least this many bytes
+    """
+    stride = width * 4 if stride is None else stride
+    if numpy is not None:
+        bits = _numpy_bits(data, width, height, stride, invert, threshold)
+        buf = numpy.packbits(bits.ravel()).tobytes()
+    else:
+        bits = _python_bits(data, width, height, stride, invert, threshold)
+        buf = _python_pack(bits, _MSB_BITS, "big")
+    if length is not None and len(buf) < length:
+        buf += b"\0" * (length - len(buf))
+    return buf
+
+
+def encode_mono_framebuffer(data, width, height, line_length, stride=None, invert=False,
+                            threshold=DEFAULT_THRESHOLD):
+    """
+    Encode an ARGB32 buffer in the framebuffer layout. The result is
+    height * line_length bytes long.
+
+    Keyword arguments:
+    data        -- ARGB32 buffer (anything supporting the buffer protocol)
+    width       -- width of the frame in pixels
+    height      -- height of the frame in pixels
+    line_length -- bytes per row in the framebuffer
+    stride      -- bytes per row in 'data' (defaults to width * 4)
+    invert      -- if True, light pixels are 'on' instead of dark ones
+    threshold   -- luminance (0-255) below which a pixel is dark
+    """
+    stride = width * 4 if stride is None else stride
+    row_bytes = (width + 7) // 8
+    if numpy is not None:
+        bits = _numpy_bits(data, width, height, stride, invert, threshold)
+        if width % 8 != 0:
+            bits = numpy.concatenate((bits, numpy.zeros((height, row_bytes * 8 - width), bits.dtype)), axis=1)
+        # packbits() is most significant bit first (its bitorder argument needs NumPy 1.17), so reverse each byte
+        rows = numpy.packbits(bits.reshape(height, row_bytes, 8)[:, :, ::-1], axis=2).reshape(height, row_bytes)
+        if line_length == row_bytes:
+            return rows.tobytes()
+        out = numpy.zeros((height, line_length), numpy.uint8)
+        out[:, :row_bytes] = rows
+        return out.tobytes()
+
+    bits = _python_bits(data, width, height, stride, invert, threshold)
+    if width % 8 != 0:
+        # Pad each row out to a whole number of bytes
+        pad = b"\0" * (row_bytes * 8 - width)
+        bits = b"".join(bits[r * width:(r + 1) * width] + pad for r in range(height))
+    rows = _python_pack(bits, _LSB_BITS, "little")
+    if line_length == row_bytes:
+        return rows
+    out = bytearray(height * line_length)
+    for r in range(height):
+        out[r * line_length:r * line_length + row_bytes] = rows[r * row_bytes:(r + 1) * row_bytes]
+    return bytes(out)
+
+
+def encode_mono_surface(surface, layout_fn, *args, **kwargs):
+    """
+    Convenience to encode a Cairo ARGB32 image surface using one of the
+    encode_mono_* functions.
+
+    Keyword arguments:
+    surface     -- cairo.ImageSurface in FORMAT_ARGB32
+    layout_fn   -- encode_mono_libg15 or encode_mono_framebuffer
+    """
+    surface.flush()
+    return layout_fn(surface.get_data(), surface.get_width(), surface.get_height(), *args,
+                     stride=surface.get_stride(), **kwargs)
+
+
+def encode_rgb565(data, width, height, out, offset=0, stride=None):
+    """
+    Convert an ARGB32 buffer to little-endian RGB565, writing the result
+    into 'out' starting at 'offset'. 'out' must be a writable buffer (e.g.
+    bytearray, array.array('B') or mmap) of at least offset + width * height * 2
+    bytes.
+
+    Keyword arguments:
+    data        -- ARGB32 buffer (anything supporting the buffer protocol)
+    width       -- width of the frame in pixels
+    height      -- height of the frame in pixels
+    out         -- writable buffer to receive the pixels
+    offset      -- byte offset in 'out' of the first pixel
+    stride      -- bytes per row in 'data' (defaults to width * 4)
+    """
+    stride = width * 4 if stride is None else stride
+    pixel_count = width * height
+    if numpy is not None:
+        pixels = numpy.frombuffer(data, numpy.uint8, count=stride * height).reshape(height, stride)
+        pixels = pixels[:, :width * 4].reshape(height, width, 4)
+        dest = numpy.frombuffer(out, "<u2", count=pixel_count, offset=offset).reshape(height, width)
+        numpy.left_shift(pixels[:, :, _R] >> 3, 11, out=dest, dtype=numpy.uint16)
+        dest |= (pixels[:, :, _G] >> 2).astype(numpy.uint16) << 5
+        dest |= pixels[:, :, _B] >> 3
+        return
+
+    data = _to_bytes(data, stride * height)
+    if stride != width * 4:
+        data = b"".join(data[r * stride:r * stride + width * 4] for r in range(height))
+    red = data[_R::4]
+    green = data[_G::4]
+    blue = data[_B::4]
+    low = _from_bytes(green.translate(_RGB565_G_LOW)) | _from_bytes(blue.translate(_RGB565_B_LOW))
+    high = _from_bytes(red.translate(_RGB565_R_HIGH)) | _from_bytes(green.translate(_RGB565_G_HIGH))
+    pixels = bytearray(pixel_count * 2)
+    pixels[0::2] = _int_to_bytes(low, pixel_count)
+    pixels[1::2] = _int_to_bytes(high, pixel_count)
+    _write(out, offset, pixels)
+
+
+def encode_rgb565_surface(surface, out, offset=0):
+    """
+    Write the pixels of a Cairo image surface into 'out' as little-endian
+    RGB565. Surfaces already in FORMAT_RGB16_565 are copied as is, anything
+    else is assumed to be FORMAT_ARGB32 and converted.
+
+    Keyword arguments:
+    surface     -- cairo.ImageSurface in FORMAT_RGB16_565 or FORMAT_ARGB32
+    out         -- writable buffer to receive the pixels
+    offset      -- byte offset in 'out' of the first pixel
+    """
+    surface.flush()
+    width = surface.get_width()
+    height = surface.get_height()
+    stride = surface.get_stride()
+    data = surface.get_data()
+    if surface.get_format() != _CAIRO_FORMAT_RGB16_565:
+        encode_rgb565(data, width, height, out, offset, stride)
+        return
+
+    row_bytes = width * 2
+    data = _to_bytes(data, stride * height)
+    if stride != row_bytes:
+        data = b"".join(data[r * stride:r * stride + row_bytes] for r in range(height))
+    _write(out, offset, data)
+
+
+class FrameDiff(object):
+    """
+    Remembers the last frame sent to a device so that drivers can skip
+    writing frames that have not changed, or (for devices that allow partial
+    updates such as a memory mapped framebuffer) write only the rows that
+    have.
+
+    Drivers should call reset() whenever the device contents may no longer
+    match the last frame seen (e.g. on connect).
+    """
+
+    def __init__(self):
+        self.last = None
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+
+    def reset(self):
+        self.last = None
+
+    def changed(self, buf):
+        """
+        Get if 'buf' differs from the last frame. If it does, it is
+        remembered as the last frame sent.
+
+        Keyword arguments:
+        buf         -- encoded frame
+        """
+        if not isinstance(buf, (bytes, bytearray)):
+            # Python 2 does not compare bytearray with array.array by content
+            buf = bytearray(buf)
+        if self.last is not None and len(self.last) == len(buf) and self.last == buf:
+            self._skipped(len(buf))
+            return False
+        self.last = bytearray(buf)
+        self._sent(len(buf), len(buf))
+        return True
+
+    def changed_spans(self, buf, line_length):
+        """
+        Compare 'buf' row by row against the last frame, returning a list of
+        (start, end) byte ranges covering the rows that differ. Adjacent
+        changed rows are merged into a single range. An empty list means
+        nothing has changed. The changed rows are remembered as the last
+        frame sent.
+
+        Keyword arguments:
+        buf         -- encoded frame
+        line_length -- number of bytes in each row of 'buf'
+        """
+        size = len(buf)
+        if self.last is None or len(self.last) != size or line_length <= 0 or size % line_length != 0:
+            self.last = bytearray(buf)
+            self._sent(size, size)
+            return [(0, size)]
+
+        rows = size // line_length
+        if numpy is not None:
+            new = numpy.frombuffer(buf, numpy.uint8, count=size).reshape(rows, line_length)
+            old = numpy.frombuffer(self.last, numpy.uint8).reshape(rows, line_length)
+            changed_rows = numpy.flatnonzero((new != old).any(axis=1)).tolist()
+        else:
+            old = self.last
+            changed_rows = [r for r in range(rows)
+                            if buf[r * line_length:(r + 1) * line_length] != old[r * line_length:(r + 1) * line_length]]
+
+        if not changed_rows:
+            self._skipped(size)
+            return []
+
+        spans = []
+        start = end = changed_rows[0]
+        for r in changed_rows[1:]:
+            if r != end + 1:
+                spans.append((start * line_length, (end + 1) * line_length))
+                start = r
+            end = r
+        spans.append((start * line_length, (end + 1) * line_length))
+
+        written = 0
+        for start, end in spans:
+            self.last[start:end] = buf[start:end]
+            written += end - start
+        self._sent(written, size)
+        return spans
+
+    def write_changed(self, buf, line_length, out):
+        """
+        Copy the rows of 'buf' that differ from the last frame into 'out',
+        which is usually a memory mapped framebuffer. Returns the spans
+        written, as changed_spans().
+
+        Keyword arguments:
+        buf         -- encoded frame
+        line_length -- number of bytes in each row of 'buf'
+        out         -- writable buffer at least as large as 'buf'
+        """
+        spans = self.changed_spans(buf, line_length)
+        for start, end in spans:
+            _write(out, start, buf[start:end])
+        return spans
+
+    def get_statistics(self):
+        """
+        Get a dictionary of the frame counters
+        """
+        return {
+            "frames_sent": self.frames_sent,
+            "frames_skipped": self.frames_skipped,
+            "bytes_sent": self.bytes_sent,
+            "bytes_saved": self.bytes_saved
+        }
+
+    """
+    Private
+    """
+
+    def _sent(self, written, size):
+        self.frames_sent += 1
+        self.bytes_sent += written
+        self.bytes_saved += size - written
+
+    def _skipped(self, size):
+        self.frames_skipped += 1
+        self.bytes_saved += size
+
+
+"""
+Private
+"""
+
+
+def _numpy_bits(data, width, height, stride, invert, threshold):
+    pixels = numpy.frombuffer(data, numpy.uint8, count=stride * height).reshape(height, stride)
+    pixels = pixels[:, :width * 4].reshape(height, width, 4)
+    lum = pixels[:, :, _R].astype(numpy.uint16) * _R_WEIGHT
+    lum += pixels[:, :, _G].astype(numpy.uint16) * _G_WEIGHT
+    lum += pixels[:, :, _B].astype(numpy.uint16) * _B_WEIGHT
+    lum >>= 8
+    if invert:
+        return lum >= threshold
+    return lum < threshold
+
+
+def _python_bits(data, width, height, stride, invert, threshold):
+    """
+    Returns one byte per pixel, 1 if the pixel is on, 0 if off.
+    """
+    data = _to_bytes(data, stride * height)
+    if stride != width * 4:
+        data = b"".join(data[r * stride:r * stride + width * 4] for r in range(height))
+
+    # Each channel is spread into 16 bit lanes of one big integer so that the
+    # weighted sum can be computed for all pixels in three multiplications
+    pixel_count = width * height
+    lum = _spread(data[_R::4], pixel_count) * _R_WEIGHT + \
+          _spread(data[_G::4], pixel_count) * _G_WEIGHT + \
+          _spread(data[_B::4], pixel_count) * _B_WEIGHT
+    lum = _int_to_bytes(lum, pixel_count * 2)[1::2]
+    return lum.translate(_get_threshold_table(invert, threshold))
+
+
+def _spread(channel, pixel_count):
+    lanes = bytearray(pixel_count * 2)
+    lanes[0::2] = channel
+    return _from_bytes(bytes(lanes))
+
+
+def _python_pack(bits, tables, byteorder):
+    if len(bits) % 8 != 0:
+        bits += b"\0" * (8 - len(bits) % 8)
+    byte_count = len(bits) // 8
+    packed = 0
+    for i in range(8):
+        packed |= _from_bytes(bits[i::8].translate(tables[i]), byteorder)
+    return _int_to_bytes(packed, byte_count, byteorder)
+
+
+def _to_bytes(data, length):
+    """
+    Get the first 'length' bytes of a buffer as bytes (str on Python 2).
+    Slicing works for Python 2 buffer objects and Python 3 memoryviews alike.
+    """
+    data = data[:length]
+    if isinstance(data, bytes):
+        return data
+    elif hasattr(data, "tobytes"):
+        return data.tobytes()
+    return bytes(bytearray(data))
+
+
+def _from_bytes(data, byteorder="little"):
+    """
+    int.from_bytes() for Python 2 and 3
+    """
+    if len(data) == 0:
+        return 0
+    if byteorder == "little":
+        data = data[::-1]
+    return int(binascii.hexlify(data), 16)
+
+
+def _int_to_bytes(value, length, byteorder="little"):
+    """
+    int.to_bytes() for Python 2 and 3
+    """
+    data = binascii.unhexlify("%0*x" % (length * 2, value))
+    if byteorder == "little":
+        data = data[::-1]
+    return data
+
+
+def _write(out, offset, data):
+    """
+    Copy data into a writable buffer. Python 2 mmaps only accept str, and
+    arrays only accept arrays.
+    """
+    end = offset + len(data)
+    if isinstance(out, bytearray):
+        out[offset:end] = data
+    elif isinstance(out, array.array):
+        out[offset:end] = array.array(out.typecode, bytes(data))
+    elif isinstance(out, mmap.mmap):
+        out[offset:end] = bytes(data)
+    else:
+        memoryview(out)[offset:end] = bytes(data)
+
+
+def _get_threshold_table(invert, threshold):
+    key = (invert, threshold)
+    table = _threshold_tables.get(key)
+    if table is None:
+        table = bytes(bytearray(1 if (v >= threshold) == invert else 0 for v in range(256)))
+        _threshold_tables[key] = table
+    return table
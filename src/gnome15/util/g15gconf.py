@@ -16,9 +16,28 @@
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 """
-Set of utility methods to read values stored in gconf
+Set of utility methods to read values stored in gconf, and GConfCache, an in
+memory cache of gconf values for code that reads them frequently (e.g. while
+painting).
 """
 
+import logging
+import threading
+
+from gi.repository import GObject as gobject
+
+logger = logging.getLogger(__name__)
+
+"""
+How long (in milliseconds) writes made through a GConfCache are held before
+being written to gconf. Further writes to the same key in this time replace
+the pending value.
+"""
+WRITE_DELAY = 2000
+
+_caches = {}
+_caches_lock = threading.Lock()
+
 
 def get_float_or_default(gconf_client, key, default=None):
     """
@@ -117,6 +136,215 @@ def get_cairo_rgba_or_default(gconf_client, key, default):
     return float(val[0]) / 255.0, float(val[1]) / 255.0, float(val[2]) / 255.0, float(val[3]) / 255.0
 
 
+def get_cache(gconf_client):
+    """
+    Get the GConfCache shared by everything using a particular gconf client,
+    creating it if this is the first time it has been asked for.
+
+    Keyword arguments:
+    gconf_client : GConf client instance the cache reads from
+    """
+    with _caches_lock:
+        cache = _caches.get(gconf_client)
+        if cache is None:
+            cache = GConfCache(gconf_client)
+            _caches[gconf_client] = cache
+        return cache
+
+
+class GConfCache:
+    """
+    Caches gconf values in memory. The first time a key is read, the directory
+    it is in is watched (once, for all keys in that directory and below) and
+    the value is then served from memory until gconf reports it has changed.
+
+    Writes are held for WRITE_DELAY milliseconds and then written together on
+    the gobject thread. A write of the value a key already has is dropped.
+
+    Notification only works for directories the gconf client has been told
+    about with add_dir(). The service adds /apps/gnome15, so this is true for
+    all Gnome15 keys.
+    """
+
+    def __init__(self, gconf_client, write_delay=WRITE_DELAY):
+        self.gconf_client = gconf_client
+        self.write_delay = write_delay
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._lock = threading.RLock()
+        self._values = {}
+        self._pending = {}
+        self._dirs = {}
+        self._write_timer = None
+
+    def get(self, key):
+        """
+        Get the gconf value (or None) of a key.
+
+        Keyword arguments:
+        key          : full path of the key to be read
+        """
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                return self._values[key]
+            self.misses += 1
+            self._watch_dir(key.rsplit("/", 1)[0])
+            value = self.gconf_client.get(key)
+            self._values[key] = value
+            return value
+
+    def get_string(self, key, default=None):
+        return self._get_typed(key, "string", default)
+
+    def get_int(self, key, default=None):
+        return self._get_typed(key, "int", default)
+
+    def get_bool(self, key, default=None):
+        return self._get_typed(key, "bool", default)
+
+    def get_float(self, key, default=None):
+        return self._get_typed(key, "float", default)
+
+    def get_rgb(self, key, default=None):
+        """
+        Get a "rgb" value. See get_rgb_or_default.
+        """
+        val = self.get_string(key)
+        return default if val is None or val == "" else _to_rgb(val)
+
+    def get_cairo_rgba(self, key, default):
+        """
+        Get a "rgba" value as cairo ratios. See get_cairo_rgba_or_default.
+        """
+        v = self.get_rgb(key)
+        val = default if v is None else (v[0], v[1], v[2], self.get_int(key + "_opacity", 0))
+        return float(val[0]) / 255.0, float(val[1]) / 255.0, float(val[2]) / 255.0, float(val[3]) / 255.0
+
+    def set_string(self, key, value):
+        self._set_typed(key, "string", value)
+
+    def set_int(self, key, value):
+        self._set_typed(key, "int", value)
+
+    def set_bool(self, key, value):
+        self._set_typed(key, "bool", value)
+
+    def set_float(self, key, value):
+        self._set_typed(key, "float", value)
+
+    def notify_add(self, key, callback):
+        """
+        Watch a key (or directory) for changes, in the same way as the gconf
+        client's notify_add(), except the cache is updated before the callback
+        is invoked, so values read from the cache in the callback are current.
+        The returned handle should be removed using the gconf client's
+        notify_remove().
+
+        Keyword arguments:
+        key          : full path of the key or directory to watch
+        callback     : function to call on change
+        """
+        self.watch(key)
+
+        def _notify(client, connection_id, entry, args):
+            self._changed(client, connection_id, entry, args)
+            if callback is not None:
+                callback(client, connection_id, entry, args)
+
+        return self.gconf_client.notify_add(key, _notify)
+
+    def watch(self, key):
+        """
+        Watch a directory (or the directory containing a key) so that values
+        read from it are kept up to date. This happens anyway when a key is
+        first read, so is only needed to subscribe in advance.
+
+        Keyword arguments:
+        key          : full path of the key or directory to watch
+        """
+        with self._lock:
+            self._watch_dir(key)
+
+    def flush(self):
+        """
+        Write all pending values to gconf now.
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            if self._write_timer is not None:
+                gobject.source_remove(self._write_timer)
+                self._write_timer = None
+        for key, (value_type, value) in pending.items():
+            try:
+                getattr(self.gconf_client, "set_%s" % value_type)(key, value)
+                self.writes += 1
+            except Exception as e:
+                logger.warning("Failed to write %s to gconf", key, exc_info=e)
+            with self._lock:
+                # The new value will be read again when next asked for
+                self._values.pop(key, None)
+
+    def close(self):
+        """
+        Write any pending values and stop watching for changes.
+        """
+        self.flush()
+        with self._lock:
+            for h in self._dirs.values():
+                self.gconf_client.notify_remove(h)
+            self._dirs = {}
+            self._values = {}
+
+    """
+    Private
+    """
+
+    def _get_typed(self, key, value_type, default):
+        with self._lock:
+            if key in self._pending:
+                self.hits += 1
+                return self._pending[key][1]
+            value = self.get(key)
+        return default if value is None else getattr(value, "get_%s" % value_type)()
+
+    def _set_typed(self, key, value_type, value):
+        with self._lock:
+            if self._get_typed(key, value_type, None) == value:
+                return
+            self._pending[key] = (value_type, value)
+            if self._write_timer is None:
+                self._write_timer = gobject.timeout_add(self.write_delay, self._write)
+
+    def _write(self):
+        with self._lock:
+            self._write_timer = None
+        self.flush()
+        return False
+
+    def _watch_dir(self, directory):
+        for d in self._dirs:
+            if directory == d or directory.startswith(d + "/"):
+                return
+        logger.debug("Caching gconf values in %s", directory)
+        self._dirs[directory] = self.gconf_client.notify_add(directory, self._changed)
+
+    def _changed(self, client, connection_id, entry, args):
+        key = entry.get_key()
+        value = entry.get_value()
+        with self._lock:
+            if key in self._pending:
+                # A pending write will replace this anyway
+                return
+            if value is None:
+                # Unset, so the next read will get the schema default (if any)
+                self._values.pop(key, None)
+            else:
+                self._values[key] = value
+
+
 def _to_rgb(string_rgb, default=None):
     # This method should be in g15convert. The thing is that
     # g15convert depends on gtk and on Fedora it raises an error when launching
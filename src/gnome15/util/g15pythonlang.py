@@ -18,6 +18,7 @@
 import logging
 import re
 import threading
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -192,6 +193,17 @@ def total_seconds(time_delta):
     ) / 10.0 ** 6.0
 
 
+def monotonic():
+    """
+    Get the value of a clock that only ever goes forward, in seconds, for
+    timing animations. Falls back to the wall clock on older Pythons.
+    """
+    return _monotonic()
+
+
+_monotonic = getattr(time, "monotonic", time.time)
+
+
 """
 GObject thread. Hosting applications may set this so that is_gobject_thread()
 function works
@@ -0,0 +1,157 @@
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Fixed capacity history of numeric samples, for graphs and the like.
+
+Each value is stored twice, at its position in the ring and again one capacity
+further on, so the most recent values are always contiguous in storage. This
+makes appending O(1) and lets views of the most recent values (oldest first)
+be taken without copying or re-ordering anything.
+
+NumPy is used if available, in which case views are NumPy arrays. Otherwise
+storage is an array.array and views are memoryviews (or copies where the
+array type does not support them).
+"""
+
+import array
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy
+except ImportError as __e:
+    logger.debug("NumPy not available, using array based ring buffers", exc_info=__e)
+    numpy = None
+
+try:
+    memoryview(array.array("d"))
+    _array_views = True
+except TypeError:
+    # Python 2 arrays do not support the new buffer protocol
+    _array_views = False
+
+
+class RingBuffer:
+    """
+    Holds the last 'capacity' values appended to it. Slots that have never
+    been written read as 'fill', so a view of any size up to the capacity may
+    be taken at any time (as with a history list pre-filled with zeros).
+    """
+
+    def __init__(self, capacity, fill=0.0):
+        """
+        Constructor
+
+        Keyword arguments:
+        capacity        -- maximum number of values held
+        fill            -- value of slots never written
+        """
+        if capacity < 1:
+            raise ValueError("Capacity must be at least 1")
+        self.capacity = capacity
+        self._head = 0
+        self._count = 0
+        if numpy is not None:
+            self._data = numpy.empty(capacity * 2, dtype=numpy.float64)
+            self._data.fill(fill)
+        else:
+            self._data = array.array("d", [fill]) * (capacity * 2)
+
+    def append(self, value):
+        data = self._data
+        data[self._head] = value
+        data[self._head + self.capacity] = value
+        self._head = (self._head + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def get_last(self, default=None):
+        """
+        Get the most recently appended value, or default if there is none.
+        """
+        if self._count == 0:
+            return default
+        return self._data[self._head + self.capacity - 1]
+
+    def get_view(self, count=None):
+        """
+        Get the most recent values, oldest first, without copying them. The
+        view remains valid, but its contents change as values are appended.
+
+        Keyword arguments:
+        count        -- number of values (defaults to the number appended)
+        """
+        start, end = self._get_range(count)
+        if numpy is not None:
+            return self._data[start:end]
+        elif _array_views:
+            return memoryview(self._data)[start:end]
+        return self._data[start:end]
+
+    def tolist(self, count=None):
+        """
+        Get the most recent values, oldest first, as a list.
+
+        Keyword arguments:
+        count        -- number of values (defaults to the number appended)
+        """
+        start, end = self._get_range(count)
+        return self._data[start:end].tolist()
+
+    def downsample(self, count, buckets):
+        """
+        Summarise the most recent values by splitting them into (roughly)
+        equal buckets. Returns three lists, the minimum, maximum and mean of
+        each bucket, oldest first.
+
+        Keyword arguments:
+        count        -- number of values to summarise
+        buckets      -- number of buckets
+        """
+        start, end = self._get_range(count)
+        count = end - start
+        buckets = max(1, min(buckets, count))
+        edges = [start + (i * count) // buckets for i in range(buckets + 1)]
+        if numpy is not None:
+            values = self._data[start:end]
+            offsets = numpy.array(edges[:-1], dtype=numpy.intp) - start
+            sizes = numpy.diff(edges)
+            return (numpy.minimum.reduceat(values, offsets).tolist(),
+                    numpy.maximum.reduceat(values, offsets).tolist(),
+                    (numpy.add.reduceat(values, offsets) / sizes).tolist())
+        mins, maxs, avgs = [], [], []
+        for i in range(buckets):
+            values = self._data[edges[i]:edges[i + 1]]
+            mins.append(min(values))
+            maxs.append(max(values))
+            avgs.append(sum(values) / len(values))
+        return mins, maxs, avgs
+
+    def __len__(self):
+        return self._count
+
+    """
+    Private
+    """
+
+    def _get_range(self, count):
+        if count is None:
+            count = self._count
+        count = max(0, min(count, self.capacity))
+        end = self._head + self.capacity
+        return end - count, end
@@ -56,6 +56,38 @@ def run_on_gobject(function, *args):
         return True
 
 
+def get_current_queue():
+    return jobqueue.get_current_queue()
+
+
+def get_queue_size(queue_name):
+    return scheduler.get_queue_size(queue_name)
+
+
+def cancel_by_name(job_name):
+    return scheduler.cancel_by_name(job_name)
+
+
+def cancel_by_owner(owner):
+    return scheduler.cancel_by_owner(owner)
+
+
+def set_tracing(tracing):
+    scheduler.set_tracing(tracing)
+
+
+def is_tracing():
+    return scheduler.is_tracing()
+
+
+def get_trace_report():
+    return scheduler.get_trace_report()
+
+
+def create_queue(queue_name, number_of_workers=1):
+    scheduler.create_queue(queue_name, number_of_workers)
+
+
 def stop_queue(queue_name):
     scheduler.stop_queue(queue_name)
 
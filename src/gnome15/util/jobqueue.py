@@ -15,6 +15,7 @@
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from __future__ import print_function
+from collections import deque, OrderedDict
 import logging
 import sys
 import threading
@@ -32,6 +33,15 @@ else:
 # Can be adjusted to speed up time to aid debugging.
 TIME_FACTOR = 1
 
+# Upper bounds (in seconds) of the histogram buckets used when tracing
+TRACE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+# Jobs that run for longer than this (in seconds) are reported when tracing
+DEFAULT_SLOW_JOB_THRESHOLD = 0.1
+
+# Maximum number of slow jobs remembered when tracing
+MAX_SLOW_JOBS = 50
+
 logger = logging.getLogger(__name__)
 
 # Thread local to allow threads to detect what queue they are on
@@ -69,19 +79,21 @@ class GTimer:
         self.task_name = task_name
         self.source = gobject.timeout_add(int(float(interval) * 1000.0 * TIME_FACTOR), self.exec_item, function, *args)
         self.complete = False
-        self.scheduler.all_jobs.append(self)
+        self.scheduler.all_jobs_lock.acquire()
+        try:
+            self.scheduler.all_jobs[self] = None
+        finally:
+            self.scheduler.all_jobs_lock.release()
 
     def exec_item(self, function, *args):
         try:
-            logger.debug("Executing GTimer %s", str(self.task_name))
-            # ji = self.task_queue.run(self.stack, function, *args)
-            self.task_queue.run(self.stack, function, *args)
-            logger.debug("Executed GTimer %s", str(self.task_name))
+            logger.debug("Executing GTimer %s", self.task_name)
+            self.task_queue.submit(self.stack, self.task_name, function, args)
+            logger.debug("Executed GTimer %s", self.task_name)
         finally:
             self.scheduler.all_jobs_lock.acquire()
             try:
-                if self in self.scheduler.all_jobs:
-                    self.scheduler.all_jobs.remove(self)
+                self.scheduler.all_jobs.pop(self, None)
                 self.complete = True
             finally:
                 self.scheduler.all_jobs_lock.release()
@@ -94,20 +106,80 @@ class GTimer:
     def cancel(self, *args):
         self.scheduler.all_jobs_lock.acquire()
         try:
-            if self in self.scheduler.all_jobs:
-                self.scheduler.all_jobs.remove(self)
+            self.scheduler.all_jobs.pop(self, None)
             # Check if callback function was executed, if yes this means that the timeout
             # was automatically destroyed since the callback function returns False.
             # Avoid thousands of warnings from source_remove().
             if not self.is_complete():
                 gobject.source_remove(self.source)
-            logger.debug("Cancelled GTimer %s", str(self.task_name))
+            logger.debug("Cancelled GTimer %s", self.task_name)
         finally:
             self.scheduler.all_jobs_lock.release()
 
 
-class FakeException(Exception):
-    pass
+class JobTracer:
+    """
+    Collects statistics about jobs when scheduler tracing is enabled. For
+    each queue, histograms of how long jobs waited to be run and how long
+    they ran for are kept, and the slowest jobs are reported along with the
+    stack they were submitted from.
+    """
+
+    def __init__(self, slow_job_threshold=DEFAULT_SLOW_JOB_THRESHOLD):
+        self.slow_job_threshold = slow_job_threshold
+        self.started = time.time()
+        self.slow_jobs = deque(maxlen=MAX_SLOW_JOBS)
+        self.queues = {}
+        self.lock = threading.Lock()
+
+    def job_finished(self, queue_name, item):
+        if item.started is None or item.finished is None:
+            return
+        wait = item.started - item.queued
+        run = item.finished - item.started
+        with self.lock:
+            if queue_name not in self.queues:
+                self.queues[queue_name] = {"jobs": 0,
+                                           "wait": [0] * (len(TRACE_BUCKETS) + 1),
+                                           "run": [0] * (len(TRACE_BUCKETS) + 1)}
+            stats = self.queues[queue_name]
+            stats["jobs"] += 1
+            stats["wait"][self._get_bucket(wait)] += 1
+            stats["run"][self._get_bucket(run)] += 1
+            if run >= self.slow_job_threshold:
+                self.slow_jobs.append((queue_name, str(item.item), wait, run, item.stack))
+
+    def get_report(self):
+        """
+        Get a human readable report of the statistics collected so far
+        """
+        with self.lock:
+            lines = ["Scheduler trace (%.1f seconds)" % (time.time() - self.started)]
+            labels = ["<%gms" % (b * 1000.0) for b in TRACE_BUCKETS] + [">=%gms" % (TRACE_BUCKETS[-1] * 1000.0)]
+            for queue_name in sorted(self.queues):
+                stats = self.queues[queue_name]
+                lines.append("")
+                lines.append("Queue %s - %d jobs" % (queue_name, stats["jobs"]))
+                lines.append("    %-8s %s" % ("", " ".join("%8s" % l for l in labels)))
+                for key in ("wait", "run"):
+                    lines.append("    %-8s %s" % (key, " ".join("%8d" % c for c in stats[key])))
+            if len(self.slow_jobs) > 0:
+                lines.append("")
+                lines.append("Slow jobs (>= %gms)" % (self.slow_job_threshold * 1000.0))
+                for queue_name, function, wait, run, stack in self.slow_jobs:
+                    lines.append("    %s on %s, waited %.1fms, ran %.1fms" % (function, queue_name,
+                                                                              wait * 1000.0, run * 1000.0))
+                    if stack:
+                        for line in traceback.format_list(stack):
+                            lines.append("        %s" % line.rstrip().replace("\n", "\n        "))
+            return "\n".join(lines)
+
+    @staticmethod
+    def _get_bucket(value):
+        for i, bound in enumerate(TRACE_BUCKETS):
+            if value < bound:
+                return i
+        return len(TRACE_BUCKETS)
 
 
 """
@@ -120,13 +192,14 @@ class JobScheduler:
 
     def __init__(self):
         self.queues = {}
-        self.all_jobs = []
+        self.all_jobs = OrderedDict()
         self.all_jobs_lock = RLock()
+        self.tracer = None
 
     def print_all_jobs(self):
         print("Scheduled")
         print("------")
-        for j in self.all_jobs:
+        for j in list(self.all_jobs):
             print("    %s - %s" % (j.task_name, str(j.function)))
         print()
         print("Running")
@@ -137,6 +210,50 @@ class JobScheduler:
     def schedule(self, name, interval, function, *args):
         return self.queue("default", name, interval, function, *args)
 
+    def set_tracing(self, tracing, slow_job_threshold=DEFAULT_SLOW_JOB_THRESHOLD):
+        """
+        Enable or disable tracing. When enabled, the stack each job is
+        submitted from is recorded, and wait and run times are collected
+        (see get_trace_report()). Tracing is off by default as capturing
+        the stack is expensive.
+        
+        Keyword arguments:
+        tracing             -- enable tracing
+        slow_job_threshold  -- jobs running longer than this many seconds are reported
+        """
+        self.tracer = JobTracer(slow_job_threshold) if tracing else None
+        for queue_name in self.queues:
+            self.queues[queue_name].tracer = self.tracer
+        logger.info("Scheduler tracing is now %s", "on" if tracing else "off")
+
+    def is_tracing(self):
+        return self.tracer is not None
+
+    def get_trace_report(self):
+        tracer = self.tracer
+        return tracer.get_report() if tracer is not None else "Scheduler tracing is not enabled"
+
+    def cancel_by_name(self, name):
+        """
+        Cancel all scheduled timers and queued (but not yet started) jobs with
+        the given name. Returns the number of jobs cancelled.
+        
+        Keyword arguments:
+        name        -- job name
+        """
+        return self._cancel_matching(lambda function, job_name: job_name == name)
+
+    def cancel_by_owner(self, owner):
+        """
+        Cancel all scheduled timers and queued (but not yet started) jobs whose
+        function is a method of the given object, e.g. a plugin. Returns the
+        number of jobs cancelled.
+        
+        Keyword arguments:
+        owner        -- object that owns the job functions
+        """
+        return self._cancel_matching(lambda function, job_name: getattr(function, "__self__", None) is owner)
+
     def stop_all(self):
         logger.info("Stopping all queues")
         for queue_name in self.queues:
@@ -146,58 +263,100 @@ class JobScheduler:
         if queue_name in self.queues:
             self.queues[queue_name].clear()
 
+    def get_queue_size(self, queue_name):
+        if queue_name in self.queues:
+            return self.queues[queue_name].work_queue.qsize()
+        return 0
+
     def stop_queue(self, queue_name):
         if queue_name in self.queues:
             self.queues[queue_name].stop()
             del self.queues[queue_name]
 
     def execute(self, queue_name, name, function, *args):
-        logger.debug("Executing on queue %s", queue_name)
         if queue_name not in self.queues:
-            self.queues[queue_name] = JobQueue(name=queue_name)
-        self.queues[queue_name].run(self._get_stack(), function, *args)
+            self._create_queue(queue_name)
+        return self.queues[queue_name].submit(self._get_stack(), name, function, args)
 
-    @staticmethod
-    def _get_stack():
+    def _cancel_matching(self, matches):
+        self.all_jobs_lock.acquire()
         try:
-            raise FakeException
-        except FakeException:
-            # logger.exception(e)
-            # tb = sys.exc_info()[2]
-            return traceback.extract_stack()[:-5]
+            timers = [timer for timer in self.all_jobs if matches(timer.function, timer.task_name)]
+        finally:
+            self.all_jobs_lock.release()
+        for timer in timers:
+            timer.cancel()
+        cancelled = len(timers)
+        for job_queue in list(self.queues.values()):
+            cancelled += job_queue.cancel_matching(matches)
+        return cancelled
+
+    def create_queue(self, queue_name, number_of_workers=1):
+        """
+        Create a queue with a number of worker threads, so that jobs submitted
+        to it may run in parallel. If the queue already exists, it is left as it
+        is. Queues created implicitly by execute() and queue() only have one
+        worker.
+        
+        Keyword arguments:
+        queue_name          -- queue name
+        number_of_workers   -- number of worker threads
+        """
+        if queue_name not in self.queues:
+            self._create_queue(queue_name, number_of_workers)
+
+    def _create_queue(self, queue_name, number_of_workers=1):
+        job_queue = JobQueue(number_of_workers=number_of_workers, name=queue_name)
+        job_queue.tracer = self.tracer
+        self.queues[queue_name] = job_queue
+
+    def _get_stack(self):
+        if self.tracer is None:
+            return None
+        return traceback.extract_stack()[:-2]
 
     def queue(self, queue_name, name, interval, function, *args):
         if not hasattr(function, "__call__"):
             raise Exception("Not a function")
-        logger.debug("Queueing %s on %s for execution in %f", name, queue_name, interval)
         if queue_name not in self.queues:
-            self.queues[queue_name] = JobQueue(name=queue_name)
+            self._create_queue(queue_name)
 
         if interval == 0:
             # Optimisation, if this is un-timed, avoid putting on main loop
-            self.queues[queue_name].run(self._get_stack(), function, *args)
+            return self.queues[queue_name].submit(self._get_stack(), name, function, args)
         else:
-            timer = GTimer(self, self.queues[queue_name], name, interval, function, self._get_stack(), *args)
-            logger.debug("Queued %s", name)
-            return timer
+            return GTimer(self, self.queues[queue_name], name, interval, function, self._get_stack(), *args)
 
 
 class JobQueue:
     class JobItem:
-        def __init__(self, stack, item, args=None):
+        def __init__(self, stack, item, args=None, name=None):
             self.args = args
             self.item = item
+            self.name = name
             self.queued = time.time()
             self.started = None
             self.finished = None
             self.stack = stack
+            self.cancelled = False
+
+        def cancel(self, *args):
+            """
+            Cancel the job if it has not yet started. The job stays on the
+            work queue, but is skipped when it reaches the front.
+            """
+            self.cancelled = True
+
+        def is_complete(self):
+            return self.finished is not None
 
     def __init__(self, number_of_workers=1, name="JobQueue"):
         logger.debug("Creating job queue %s with %d workers", name, number_of_workers)
         self.work_queue = Queue.Queue()
-        self.queued_jobs = []
+        self.queued_jobs = OrderedDict()
         self.name = name
         self.stopping = False
+        self.tracer = None
         self.all_jobs_lock = threading.Lock()
         self.number_of_workers = number_of_workers
         self.threads = []
@@ -210,7 +369,7 @@ class JobQueue:
 
     def print_all_jobs(self):
         print("Queue %s" % self.name)
-        for s in self.queued_jobs:
+        for s in list(self.queued_jobs):
             print("     %s - %s" % (str(s.item), str(s.queued)))
 
     def stop(self):
@@ -224,6 +383,13 @@ class JobQueue:
     def _dummy(self):
         pass
 
+    def _remove_queued(self, item):
+        self.all_jobs_lock.acquire()
+        try:
+            self.queued_jobs.pop(item, None)
+        finally:
+            self.all_jobs_lock.release()
+
     def clear(self):
         jobs = self.work_queue.qsize()
         if jobs > 0:
@@ -238,57 +404,86 @@ class JobQueue:
                                  str(item.queued),
                                  str(item.started),
                                  str(item.finished))
-                    if item in self.queued_jobs:
-                        self.queued_jobs.remove(item)
+                    self._remove_queued(item)
             except Queue.Empty as e:
                 logger.debug("The queue is already empty", exc_info=e)
                 pass
             logger.info("Cleared queue %s", self.name)
 
     def run(self, stack, item, *args):
+        return self.submit(stack, None, item, args)
+
+    def submit(self, stack, name, item, args):
+        """
+        Queue a job. The returned job item may be used to cancel the job
+        
+        Keyword arguments:
+        stack        -- stack the job was submitted from (if tracing)
+        name         -- job name (may be None)
+        item         -- function to run
+        args         -- tuple of arguments to pass to function
+        """
         if self.stopping:
             return
         if item is None:
             logger.warning("Attempt to run empty job.")
             traceback.print_stack()
             return
+        ji = self.JobItem(stack, item, args, name)
         self.all_jobs_lock.acquire()
         try:
-            logger.debug("Queued task on %s", self.name)
-            ji = self.JobItem(stack, item, args)
-            self.queued_jobs.append(ji)
-            self.work_queue.put(ji)
-            jobs = self.work_queue.qsize()
-            if jobs > 1:
-                logger.debug("Queue %s filling, now at %d jobs.", self.name, jobs)
-
+            self.queued_jobs[ji] = None
         finally:
             self.all_jobs_lock.release()
+        self.work_queue.put(ji)
         return ji
 
+    def cancel_matching(self, matches):
+        """
+        Cancel all jobs that have not yet started and for which the matches
+        function (called with the job function and name) returns True.
+        Returns the number of jobs cancelled.
+        
+        Keyword arguments:
+        matches        -- function to test jobs
+        """
+        cancelled = 0
+        self.all_jobs_lock.acquire()
+        try:
+            for job_item in self.queued_jobs:
+                if job_item.started is None and not job_item.cancelled and matches(job_item.item, job_item.name):
+                    job_item.cancel()
+                    cancelled += 1
+        finally:
+            self.all_jobs_lock.release()
+        return cancelled
+
     def worker(self):
         queue_names.queue_name = self.name
         while not self.stopping:
             item = self.work_queue.get()
             try:
-                if item is not None:
+                if item is not None and item.cancelled:
+                    self._remove_queued(item)
+                elif item is not None:
                     try:
-                        logger.debug("Running task on %s", self.name)
                         item.started = time.time()
                         if item.args and len(item.args) > 0:
                             item.item(*item.args)
                         else:
                             item.item()
-                        item.finished = time.time()
-                        logger.debug("Ran task on %s", self.name)
                     finally:
-                        if item in self.queued_jobs:
-                            self.queued_jobs.remove(item)
+                        item.finished = time.time()
+                        tracer = self.tracer
+                        if tracer is not None:
+                            tracer.job_finished(self.name, item)
+                        self._remove_queued(item)
             except Exception as a:
                 try:
                     logger.debug("Error on worker", exc_info=a)
-                    logger.debug("Caused by job")
-                    logger.debug("%s\n", item.stack)
+                    if item.stack is not None:
+                        logger.debug("Caused by job")
+                        logger.debug("%s\n", item.stack)
                 except Exception as e:
                     logger.debug("Could not log error on worker", exc_info=e)
                     pass
@@ -176,18 +176,10 @@ class G15Background:
             self.notify_handlers.append(
                 self.gconf_client.notify_add("/desktop/gnome/background/picture_filename", self.config_changed))
             if os.path.exists("/usr/share/glib-2.0/schemas/org.gnome.desktop.background.gschema.xml"):
-                try:
-                    from gi.repository import Gio
-                    self.gnome_dconf_settings = Gio.Settings.new("org.gnome.desktop.background")
-                except Exception as e:
-                    logger.debug("Could not get background with GI, falling back", exc_info=e)
-                    # Work around on Ubuntu 12.10+ until Gnome15 is converted to GObject bindings
-                    import gnome15.g15dconf as g15dconf
-                    self.gnome_dconf_settings = g15dconf.GSettings("org.gnome.desktop.background")
-
-            if self.gnome_dconf_settings is not None:
-                self.gnome_dconf_handle = self.gnome_dconf_settings.connect("changed::picture_uri",
-                                                                            self._do_config_changed)
+                import gnome15.g15dconf as g15dconf
+                self.gnome_dconf_settings = g15dconf.get_settings("org.gnome.desktop.background")
+                self.gnome_dconf_handle = self.gnome_dconf_settings.connect("changed::picture-uri",
+                                                                           self._do_config_changed)
 
         # Listen for profile changes        
         g15profile.profile_listeners.append(self._profiles_changed)
@@ -202,7 +194,8 @@ class G15Background:
         self.screen.redraw()
         if self.gnome_dconf_handle is not None:
             self.gnome_dconf_settings.disconnect(self.gnome_dconf_handle)
-            self.gnome_dconf_settings.__del__()
+            self.gnome_dconf_settings.close()
+            self.gnome_dconf_handle = None
 
     def config_changed(self, client, connection_id, entry, args):
         self._do_config_changed()
@@ -31,7 +31,6 @@ import gnome15.util.g15uigconf as g15uigconf
 import gnome15.util.g15gconf as g15gconf
 import gnome15.util.g15cairo as g15cairo
 import gnome15.util.g15icontools as g15icontools
-import gnome15.g15screen as g15screen
 import gnome15.g15accounts as g15accounts
 import gnome15.g15plugin as g15plugin
 import gnome15.g15globals as g15globals
@@ -325,7 +324,7 @@ class G15Cal(g15plugin.G15Plugin):
         if self._timer is not None:
             self._timer.cancel()
         if self._page is not None:
-            g15screen.run_on_redraw(self.screen.del_page, self._page)
+            self.screen.run_on_redraw(self.screen.del_page, self._page)
 
     def destroy(self):
         pass
@@ -379,7 +378,7 @@ class G15Cal(g15plugin.G15Plugin):
         if amount == 0 or o_date.month != self._calendar_date.month or o_date.year != self._calendar_date.year:
             self._load_month_events(self._calendar_date)
         else:
-            g15screen.run_on_redraw(self._rebuild_components, self._calendar_date)
+            self.screen.run_on_redraw(self._rebuild_components, self._calendar_date)
 
     def _get_calendar_date(self):
         now = datetime.datetime.now()
@@ -461,7 +460,7 @@ class G15Cal(g15plugin.G15Plugin):
             except Exception as e:
                 logger.warning("Failed to load events for account %s.", acc.name, exc_info=e)
 
-        g15screen.run_on_redraw(self._rebuild_components, now)
+        self.screen.run_on_redraw(self._rebuild_components, now)
         self._page.mark_dirty()
 
     def _rebuild_components(self, now):
@@ -30,6 +30,7 @@ import gnome15.g15driver as g15driver
 import gnome15.g15globals as g15globals
 import gnome15.g15plugin as g15plugin
 import gnome15.g15theme as g15theme
+import gnome15.g15top as g15top
 import gnome15.util.g15scheduler as g15scheduler
 import gnome15.objgraph as objgraph
 import gnome15.g15logging as g15logging
@@ -298,6 +299,20 @@ class G15DBUSDebugService(dbus.service.Object):
     def ToggleDebugSVG(self):
         g15theme.DEBUG_SVG = not g15theme.DEBUG_SVG
 
+    @dbus.service.method(DEBUG_IF_NAME, in_signature='b')
+    def SetSchedulerTracing(self, tracing):
+        g15scheduler.set_tracing(tracing)
+
+    @dbus.service.method(DEBUG_IF_NAME, out_signature='b')
+    def IsSchedulerTracing(self):
+        return g15scheduler.is_tracing()
+
+    @dbus.service.method(DEBUG_IF_NAME, out_signature='s')
+    def SchedulerTrace(self):
+        report = g15scheduler.get_trace_report()
+        print(report)
+        return report
+
     @dbus.service.method(DEBUG_IF_NAME)
     def MostCommonTypes(self):
         print("Most used objects")
@@ -422,9 +437,10 @@ class G15Debug(g15plugin.G15RefreshingPlugin):
         g15plugin.G15RefreshingPlugin.deactivate(self)
 
     def refresh(self):
-        self.memory = memory()
-        self.resident = resident()
-        self.stack = stacksize()
+        sample = g15top.snapshot()
+        self.memory = float(sample.vm_size)
+        self.resident = float(sample.vm_rss)
+        self.stack = float(sample.vm_stk)
 
     def get_theme_properties(self):
         properties = g15plugin.G15RefreshingPlugin.get_theme_properties(self)
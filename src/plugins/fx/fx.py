@@ -16,7 +16,6 @@
 
 import os
 import random
-import time
 
 import cairo
 from gi.repository import Gtk as gtk
@@ -25,6 +24,7 @@ import gnome15.g15locale as g15locale
 import gnome15.g15screen as g15screen
 import gnome15.g15driver as g15driver
 import gnome15.util.g15uigconf as g15uigconf
+import gnome15.util.g15gconf as g15gconf
 
 _ = g15locale.get_translation("fx", modfile=__file__).ugettext
 
@@ -67,14 +67,19 @@ class G15Fx:
         self.screen = screen
         self.gconf_client = gconf_client
         self.gconf_key = gconf_key
+        self.conf_cache = g15gconf.get_cache(gconf_client)
+        self._surface = None
 
     def activate(self):
         self.chained_transition = self.screen.set_transition(self.transition)
-        self.notify_handler = self.gconf_client.notify_add(self.gconf_key, self.config_changed)
+        self.notify_handler = self.conf_cache.notify_add(self.gconf_key, self.config_changed)
 
     def deactivate(self):
         self.gconf_client.notify_remove(self.notify_handler)
         self.screen.set_transition(self.chained_transition)
+        if isinstance(self.screen.transition, FxTransition):
+            self.screen.cancel_transition()
+        self._surface = None
 
     def destroy(self):
         pass
@@ -85,130 +90,128 @@ class G15Fx:
         self.screen.redraw()
 
     def transition(self, old_surface, new_surface, old_page, new_page, direction="up"):
+        # Don't transition for high priority screens
+        if new_page is None or old_page is None or new_page.priority == g15screen.PRI_HIGH:
+            if self.chained_transition is not None:
+                return self.chained_transition(old_surface, new_surface, old_page, new_page, direction)
+            return None
+
         # Determine effect to use
-        effect = self.gconf_client.get_string(self.gconf_key + "/transition_effect")
+        effect = self.conf_cache.get_string(self.gconf_key + "/transition_effect", "")
         if effect == "":
             effect = "random"
         if effect == "random":
             effect = effects[int(random.random() * len(effects))]
 
         # Animation speed
-        speed_entry = self.gconf_client.get(self.gconf_key + "/anim_speed")
-        speed = 5.0 if speed_entry is None else speed_entry.get_float()
-
-        # Don't transition for high priority screens
-        if new_page is None or old_page is None or new_page.priority == g15screen.PRI_HIGH:
-            return
+        speed = self.conf_cache.get_float(self.gconf_key + "/anim_speed", 5.0)
 
         width = self.screen.width
         height = self.screen.height
 
-        # Create a working surface
-        img_surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, self.screen.width, self.screen.height)
-        img_context = cairo.Context(img_surface)
-        if effect == "vertical-scroll":
-            # Vertical scroll
-            step = max(int(speed), 1)
-            if direction == "down":
-                for i in range(0, self.screen.height, step):
-                    img_context.save()
-                    img_context.translate(0, -i)
-                    img_context.set_source_surface(old_surface)
-                    img_context.paint()
-                    img_context.translate(0, self.screen.height)
-                    img_context.set_source_surface(new_surface)
-                    img_context.paint()
-                    img_context.restore()
-                    self.screen.driver.paint(img_surface)
-                    self.anim_delay(speed)
-            else:
-                for i in range(0, self.screen.height, step):
-                    img_context.save()
-                    img_context.translate(0, -(self.screen.height - i))
-                    img_context.set_source_surface(new_surface)
-                    img_context.paint()
-                    img_context.translate(0, self.screen.height)
-                    img_context.set_source_surface(old_surface)
-                    img_context.paint()
-                    img_context.restore()
-                    self.screen.driver.paint(img_surface)
-                    self.anim_delay(speed)
+        # All frames are painted into the same surface
+        if self._surface is None or self._surface.get_width() != width or self._surface.get_height() != height:
+            self._surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
 
+        """
+        Speed is how far each step of the animation moves (in pixels, or alpha
+        levels for fades). The animation takes as long as drawing that many steps
+        at the screen's frame rate, with an extra delay per step at speeds below 1
+        """
+        step = max(int(speed), 1)
+        if effect == "vertical-scroll":
+            steps = height / float(step)
         elif effect == "horizontal-scroll":
-            # Horizontal scroll
-            step = max((width / height) * speed, 1)
-            if direction == "down":
-                for i in range(0, self.screen.width, int(step)):
-                    img_context.save()
-                    img_context.translate(-i, 0)
-                    img_context.set_source_surface(old_surface)
-                    img_context.paint()
-                    img_context.translate(self.screen.width, 0)
-                    img_context.set_source_surface(new_surface)
-                    img_context.paint()
-                    img_context.restore()
-                    self.screen.driver.paint(img_surface)
-                    self.anim_delay(speed)
-            else:
-                for i in range(0, self.screen.width, int(step)):
-                    img_context.save()
-                    img_context.translate(-(self.screen.width - i), 0)
-                    img_context.set_source_surface(new_surface)
-                    img_context.paint()
-                    img_context.translate(self.screen.width, 0)
-                    img_context.set_source_surface(old_surface)
-                    img_context.paint()
-                    img_context.restore()
-                    self.screen.driver.paint(img_surface)
-                    self.anim_delay(speed)
+            steps = width / float(max(int((float(width) / height) * speed), 1))
         elif effect == "fade":
-            step = max(int(speed), 1)
-            for i in range(0, 256, step):
-                img_context.set_source_surface(new_surface)
-                img_context.paint_with_alpha(float(i) / 256.0)
-                img_context.set_source_surface(old_surface)
-                img_context.paint_with_alpha(1.0 - (float(i) / 256.0))
-                self.screen.driver.paint(img_surface)
-                self.anim_delay(speed)
+            steps = 256.0 / step
         elif effect == "zoom":
-            step = max(int(speed), 1)
-            if direction == "down":
-                for i in range(1, self.screen.width, step):
-                    img_context.save()
-                    img_context.set_source_surface(old_surface)
-                    img_context.paint()
-                    scale = i / float(self.screen.width)
-                    scaled_width = self.screen.width * scale
-                    scaled_height = self.screen.height * scale
-                    img_context.translate((self.screen.width - scaled_width) / 2,
-                                          (self.screen.height - scaled_height) / 2)
-                    img_context.scale(scale, scale)
-                    img_context.set_source_surface(new_surface)
-                    img_context.paint()
-                    img_context.restore()
-                    self.screen.driver.paint(img_surface)
-                    self.anim_delay(speed)
-            else:
-                for i in range(self.screen.width, 0, step * -1):
-                    img_context.save()
-                    img_context.set_source_surface(new_surface)
-                    img_context.paint()
-                    scale = i / float(self.screen.width)
-                    scaled_width = self.screen.width * scale
-                    scaled_height = self.screen.height * scale
-                    img_context.translate((self.screen.width - scaled_width) / 2,
-                                          (self.screen.height - scaled_height) / 2)
-                    img_context.scale(scale, scale)
-                    img_context.set_source_surface(old_surface)
-                    img_context.paint()
-                    img_context.restore()
-                    self.screen.driver.paint(img_surface)
-                    self.anim_delay(speed)
-
-        if self.chained_transition is not None:
-            self.chained_transition(old_surface, new_surface, old_page, new_page, direction)
-
-    @staticmethod
-    def anim_delay(speed):
+            steps = width / float(step)
+        else:
+            return None
+        step_time = 1.0 / self.screen.redraw_coordinator.get_max_fps()
         if speed < 1.0:
-            time.sleep((1.0 - speed) / 50.0)
+            step_time += (1.0 - speed) / 50.0
+        duration = steps * step_time
+
+        if effect == "vertical-scroll":
+            return ScrollTransition(old_surface, duration, self._surface, direction, False)
+        elif effect == "horizontal-scroll":
+            return ScrollTransition(old_surface, duration, self._surface, direction, True)
+        elif effect == "fade":
+            return FadeTransition(old_surface, duration, self._surface, direction)
+        else:
+            return ZoomTransition(old_surface, duration, self._surface, direction)
+
+
+class FxTransition(g15screen.Transition):
+
+    def __init__(self, old_surface, duration, surface, direction):
+        g15screen.Transition.__init__(self, old_surface, duration, surface)
+        self.direction = direction
+
+
+class ScrollTransition(FxTransition):
+    """
+    Slides the new page in from below (or from the right), or from above (or
+    from the left) when going back
+    """
+
+    def __init__(self, old_surface, duration, surface, direction, horizontal):
+        FxTransition.__init__(self, old_surface, duration, surface, direction)
+        self.horizontal = horizontal
+
+    def paint(self, canvas, old_surface, new_surface, progress):
+        size = self.surface.get_width() if self.horizontal else self.surface.get_height()
+        offset = int(size * progress)
+        if self.direction == "down":
+            first, second, offset = old_surface, new_surface, -offset
+        else:
+            first, second, offset = new_surface, old_surface, -(size - offset)
+        if self.horizontal:
+            canvas.translate(offset, 0)
+        else:
+            canvas.translate(0, offset)
+        canvas.set_source_surface(first)
+        canvas.paint()
+        if self.horizontal:
+            canvas.translate(size, 0)
+        else:
+            canvas.translate(0, size)
+        canvas.set_source_surface(second)
+        canvas.paint()
+
+
+class FadeTransition(FxTransition):
+    """
+    Fades from the old page to the new page. On a monochrome LCD this appears
+    as more of a dissolve
+    """
+
+    def paint(self, canvas, old_surface, new_surface, progress):
+        canvas.set_source_surface(old_surface)
+        canvas.paint()
+        canvas.set_source_surface(new_surface)
+        canvas.paint_with_alpha(progress)
+
+
+class ZoomTransition(FxTransition):
+    """
+    Grows the new page from the center over the old page, or shrinks the old
+    page away to reveal the new page when going back
+    """
+
+    def paint(self, canvas, old_surface, new_surface, progress):
+        width = self.surface.get_width()
+        height = self.surface.get_height()
+        if self.direction == "down":
+            under, over, scale = old_surface, new_surface, progress
+        else:
+            under, over, scale = new_surface, old_surface, 1.0 - progress
+        canvas.set_source_surface(under)
+        canvas.paint()
+        if scale > 0:
+            canvas.translate((width - width * scale) / 2, (height - height * scale) / 2)
+            canvas.scale(scale, scale)
+            canvas.set_source_surface(over)
+            canvas.paint()
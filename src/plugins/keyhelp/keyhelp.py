@@ -50,6 +50,7 @@ site = "http://www.russo79.com/gnome15"
 has_preferences = False
 unsupported_models = [g15driver.MODEL_G110, g15driver.MODEL_G11, g15driver.MODEL_MX5500, g15driver.MODEL_G930,
                       g15driver.MODEL_G35]
+activate_in_parallel = True
 actions = {
     SHOW_KEY_HELP: _("Show Key Help"),
 }
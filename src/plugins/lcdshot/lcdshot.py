@@ -60,6 +60,7 @@ site = "http://www.russo79.com/gnome15"
 has_preferences = True
 unsupported_models = [g15driver.MODEL_G110, g15driver.MODEL_G11, g15driver.MODEL_MX5500, g15driver.MODEL_G930,
                       g15driver.MODEL_G35, g15driver.MODEL_Z10]
+activate_in_parallel = True
 actions = {
     SCREENSHOT: "Take LCD screenshot"
 }
@@ -143,6 +144,7 @@ class G15LCDShot:
         self._screen = screen
         self._gconf_client = gconf_client
         self._gconf_key = gconf_key
+        self._conf_cache = g15gconf.get_cache(gconf_client)
         self._recording = False
 
     def activate(self):
@@ -157,7 +159,7 @@ class G15LCDShot:
     def action_performed(self, binding):
         # TODO better key
         if binding.action == SCREENSHOT:
-            mode = g15gconf.get_string_or_default(self._gconf_client, "%s/mode" % self._gconf_key, "still")
+            mode = self._conf_cache.get_string("%s/mode" % self._gconf_key, "still")
             if mode == "still":
                 return self._take_still()
             else:
@@ -195,7 +197,7 @@ class G15LCDShot:
         t.start()
 
     def _start_recording(self):
-        self._record_fps = g15gconf.get_int_or_default(self._gconf_client, "%s/fps" % self._gconf_key, 10)
+        self._record_fps = self._conf_cache.get_int("%s/fps" % self._gconf_key, 10)
         path = self._find_next_free_filename("avi", _("Gnome15_Video"))
         g15notify.notify(_("LCD Screenshot"), _("Started recording video"), "dialog-info")
         g15os.mkdir_p("%s.tmp" % path)
@@ -224,8 +226,8 @@ class G15LCDShot:
             self._recording_timer = gobject.timeout_add(1000 / self._record_fps, self._frame)
 
     def _find_next_free_filename(self, ext, title):
-        dir_path = g15gconf.get_string_or_default(self._gconf_client, "%s/folder" %
-                                                  self._gconf_key, os.path.expanduser("~/Desktop"))
+        dir_path = self._conf_cache.get_string("%s/folder" % self._gconf_key,
+                                              os.path.expanduser("~/Desktop"))
         for i in range(1, 9999):
             path = "%s/%s-%s-%d.%s" % (dir_path,
                                        g15globals.name, title, i, ext)
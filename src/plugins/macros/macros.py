@@ -147,7 +147,7 @@ class G15Macros(g15plugin.G15MenuPlugin):
     """
 
     def memory_bank_changed(self):
-        g15screen.run_on_redraw(self._reload_and_popup)
+        self.screen.run_on_redraw(self._reload_and_popup)
 
     """
     Private functions
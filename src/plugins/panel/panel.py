@@ -63,6 +63,7 @@ class G15PanelPainter(g15screen.Painter):
         g15screen.Painter.__init__(self, g15screen.FOREGROUND_PAINTER, 1000)
         self.gconf_client = gconf_client
         self.gconf_key = gconf_key
+        self.conf_cache = g15gconf.get_cache(gconf_client)
         self.screen = screen
 
     def paint(self, canvas):
@@ -81,7 +82,7 @@ class G15PanelPainter(g15screen.Painter):
             inset = 0
             align = "start"
             gap = panel_height / 10.0
-            bg = g15gconf.get_cairo_rgba_or_default(self.gconf_client, self.gconf_key + "/color", (128, 128, 128, 128))
+            bg = self.conf_cache.get_cairo_rgba(self.gconf_key + "/color", (128, 128, 128, 128))
         widget_size = panel_height - (gap * 2)
 
         # Paint the panel in memory first so it can be aligned easily
@@ -161,13 +162,13 @@ class G15PanelPainter(g15screen.Painter):
         if self.screen.driver.get_bpp() == 1:
             return 8
 
-        panel_size = self.gconf_client.get_int(self.gconf_key + "/size")
+        panel_size = self.conf_cache.get_int(self.gconf_key + "/size", 0)
         if panel_size == 0:
             panel_size = 24
         return panel_size
 
     def _get_panel_position(self):
-        panel_pos = self.gconf_client.get_string(self.gconf_key + "/position")
+        panel_pos = self.conf_cache.get_string(self.gconf_key + "/position")
         if panel_pos is None or panel_pos == "":
             panel_pos = "bottom"
         return panel_pos
@@ -182,7 +183,7 @@ class G15Panel():
     def activate(self):
         self.painter = G15PanelPainter(self.screen, self.gconf_client, self.gconf_key)
         self.screen.painters.append(self.painter)
-        self.notify_handle = self.gconf_client.notify_add(self.gconf_key, self._config_changed)
+        self.notify_handle = g15gconf.get_cache(self.gconf_client).notify_add(self.gconf_key, self._config_changed)
         self._set_available_screen_size()
         self.screen.redraw()
 
@@ -171,8 +171,8 @@ class G15FeedsMenuItem(g15theme.MenuItem):
 
     def get_theme_properties(self):
 
-        use_twenty_four_hour = g15gconf.get_bool_or_default(self.gconf_client,
-                                                            "%s/twenty_four_hour_times" % self.gconf_key, True)
+        use_twenty_four_hour = g15gconf.get_cache(self.gconf_client).get_bool(
+            "%s/twenty_four_hour_times" % self.gconf_key, True)
 
         element_properties = g15theme.MenuItem.get_theme_properties(self)
         element_properties["ent_title"] = self.entry.title
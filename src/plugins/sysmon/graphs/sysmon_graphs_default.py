@@ -90,7 +90,7 @@ class G15CPUGraph(G15Graph):
 
     def create_plot(self, graph_surface):
         series_colors, fill_colors = self.get_colors()
-        return cairoplot.AreaPlot(graph_surface, self.plugin.selected_cpu.history,
+        return cairoplot.AreaPlot(graph_surface, self.plugin.get_graph_data(self.plugin.selected_cpu.history),
                                   self.view_bounds[2],
                                   self.view_bounds[3],
                                   background=None,
@@ -119,7 +119,8 @@ class G15NetGraph(G15Graph):
             alt_series_color = g15convert.get_alt_color(series_color)
             alt_fill_color = g15convert.get_alt_color(fill_color)
         return cairoplot.AreaPlot(graph_surface,
-                                  [self.plugin.selected_net.send_history, self.plugin.selected_net.recv_history],
+                                  [self.plugin.get_graph_data(self.plugin.selected_net.send_history),
+                                   self.plugin.get_graph_data(self.plugin.selected_net.recv_history)],
                                   self.view_bounds[2],
                                   self.view_bounds[3],
                                   background=None,
@@ -152,7 +153,8 @@ class G15MemGraph(G15Graph):
         else:
             alt_series_color = g15convert.get_alt_color(series_color)
             alt_fill_color = g15convert.get_alt_color(fill_color)
-        return cairoplot.AreaPlot(graph_surface, [self.plugin.used_history, self.plugin.cached_history],
+        return cairoplot.AreaPlot(graph_surface, [self.plugin.get_graph_data(self.plugin.used_history),
+                                                  self.plugin.get_graph_data(self.plugin.cached_history)],
                                   self.view_bounds[2],
                                   self.view_bounds[3],
                                   background=None,
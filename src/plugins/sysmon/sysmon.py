@@ -18,7 +18,6 @@ import os
 import socket
 # import sys
 
-import gi
 from gi.repository import Gtk as gtk
 
 import gnome15.g15locale as g15locale
@@ -27,24 +26,15 @@ import gnome15.util.g15uigconf as g15uigconf
 import gnome15.util.g15gconf as g15gconf
 import gnome15.util.g15cairo as g15cairo
 import gnome15.util.g15icontools as g15icontools
+import gnome15.util.g15ringbuffer as g15ringbuffer
 import gnome15.g15driver as g15driver
 import gnome15.g15plugin as g15plugin
-import time
+import gnome15.g15top as g15top
 import logging
 
 logger = logging.getLogger(__name__)
 _ = g15locale.get_translation("sysmon", modfile=__file__).ugettext
 
-try:
-    # import gtop
-    # Requires the package gir1.2-gtop-2.0 to be installed
-    gi.require_version("GTop", "2.0")
-    from gi.repository import GTop as gtop
-except Exception as e:
-    logger.debug("Could not import gtop. Falling back to g15top", exc_info=e)
-    # API compatible work around for Ubuntu 12.10
-    import gnome15.g15top as gtop
-
 
 id = "sysmon"
 name = _("System Monitor")
@@ -62,6 +52,7 @@ unsupported_models = [g15driver.MODEL_G110, g15driver.MODEL_G11, g15driver.MODEL
 
 # Various constants
 GRAPH_SIZE = 50
+HISTORY_SIZE = 3600
 CPU_ICONS = ["utilities-system-monitor", "gnome-cpu-frequency-applet", "computer"]
 
 """ 
@@ -93,14 +84,12 @@ class Net:
         self.last_net_list = None
         self.max_send = 0.0001
         self.max_recv = 0.0001
-        self.send_history = [0] * GRAPH_SIZE
-        self.recv_history = [0] * GRAPH_SIZE
+        self.send_history = g15ringbuffer.RingBuffer(HISTORY_SIZE)
+        self.recv_history = g15ringbuffer.RingBuffer(HISTORY_SIZE)
         self.last_net_list = None
         self.last_time = 0
 
-    def new_data(self, this_net_list):
-        now = time.time()
-
+    def new_data(self, this_net_list, now):
         """
         Net
         """
@@ -129,11 +118,7 @@ class Net:
 
         # History
         self.send_history.append(self.recv_bps)
-        while len(self.send_history) > GRAPH_SIZE:
-            del self.send_history[0]
         self.recv_history.append(self.send_bps)
-        while len(self.recv_history) > GRAPH_SIZE:
-            del self.recv_history[0]
 
         self.last_net_list = this_net_list
         self.last_time = now
@@ -157,7 +142,7 @@ class CPU:
     def __init__(self, number):
         self.number = number
         self.name = "cpu%d" % number if number >= 0 else "cpu"
-        self.history = [0] * GRAPH_SIZE
+        self.history = g15ringbuffer.RingBuffer(HISTORY_SIZE)
         self.value = 0
         self.times = None
         self.last_times = None
@@ -179,10 +164,7 @@ class CPU:
 
         self.last_times = time_list
 
-        # Update the history and trim it to the graph data size
         self.history.append(self.pc)
-        while len(self.history) > GRAPH_SIZE:
-            del self.history[0]
 
     @staticmethod
     def get_pc(times):
@@ -225,8 +207,8 @@ class G15SysMon(g15plugin.G15RefreshingPlugin):
         self.cpu_no = 0
         self.cpu_data = []
         selected_cpu_name = self.gconf_client.get_string(self.gconf_key + "/cpu")
-        cpus = gtop.cpu().cpus
-        for i in range(-1, len(cpus)):
+        sample = g15top.snapshot()
+        for i in range(-1, len(sample.cpu_names) - 1):
             cpu = CPU(i)
             self.cpu_data.append(cpu)
             if cpu.name == selected_cpu_name:
@@ -236,7 +218,7 @@ class G15SysMon(g15plugin.G15RefreshingPlugin):
 
         # Net
         self.selected_net = None
-        _, self.net_list = self._get_net_stats()
+        _, self.net_list = self._get_net_stats(sample)
         net_name = self.gconf_client.get_string(self.gconf_key + "/net")
         self.net_data = []
         for idx, n in enumerate(self.net_list):
@@ -254,8 +236,8 @@ class G15SysMon(g15plugin.G15RefreshingPlugin):
         self.cached = 0
         self.free = 0
         self.used = 0
-        self.cached_history = [0] * GRAPH_SIZE
-        self.used_history = [0] * GRAPH_SIZE
+        self.cached_history = g15ringbuffer.RingBuffer(HISTORY_SIZE)
+        self.used_history = g15ringbuffer.RingBuffer(HISTORY_SIZE)
 
         g15plugin.G15RefreshingPlugin.activate(self)
         self._set_panel()
@@ -296,45 +278,44 @@ class G15SysMon(g15plugin.G15RefreshingPlugin):
                     return True
 
     def refresh(self):
-        # Memory
-        mem = self._get_mem_info()
-        now = time.time()
+        # One sample of everything, shared with anything else refreshing on this tick
+        sample = g15top.snapshot()
+        now = sample.time
 
         """
         CPU
         """
         for c in self.cpu_data:
-            c.new_times(self._get_time_list(c))
+            c.new_times(self._get_time_list(c, sample))
 
         """
         Net
         """
 
         # Current net status   
-        this_net_list, self.net_list = self._get_net_stats()
+        this_net_list, self.net_list = self._get_net_stats(sample)
         for n in self.net_data:
-            n.new_data(this_net_list)
+            n.new_data(this_net_list, now)
 
         """
         Memory
         """
 
-        self.total = float(mem.total)
+        self.total = float(sample.mem_total)
         self.max_total_mem = max(self.max_total_mem, self.total)
-        self.free = float(mem.free)
+        self.free = float(sample.mem_free)
         self.used = self.total - self.free
-        self.cached = float(mem.cached)
+        self.cached = float(sample.mem_cached)
         self.noncached = self.total - self.free - self.cached
         self.used_history.append(self.used + self.cached)
-
-        while len(self.used_history) > GRAPH_SIZE:
-            del self.used_history[0]
         self.cached_history.append(self.cached)
-        while len(self.cached_history) > GRAPH_SIZE:
-            del self.cached_history[0]
 
         self.last_time = now
 
+        # Only properties that actually changed are passed on to the theme
+        if self.page is not None:
+            self.page.update(self._get_theme_properties())
+
     """ Private """
 
     def _config_changed(self, client, connection_id, entry, args):
@@ -357,6 +338,25 @@ class G15SysMon(g15plugin.G15RefreshingPlugin):
             self._schedule_refresh()
 
     def get_theme_properties(self):
+        # Properties are maintained on the page as they change, see refresh()
+        return None
+
+    def get_graph_data(self, history):
+        """
+        Get the points to plot for one of the histories. This is the last
+        GRAPH_SIZE samples, unless the (hidden) graph_window setting asks for
+        a longer period, in which case it is the mean of each of GRAPH_SIZE
+        slices of that period.
+
+        Keyword arguments:
+        history        -- history ring buffer
+        """
+        window = min(self.conf_cache.get_int(self.gconf_key + "/graph_window", GRAPH_SIZE), HISTORY_SIZE)
+        if window <= GRAPH_SIZE:
+            return history.tolist(GRAPH_SIZE)
+        return history.downsample(window, GRAPH_SIZE)[2]
+
+    def _get_theme_properties(self):
         properties = {
             "cpu_pc": "%3d" % self.selected_cpu.pc,
             "mem_total": "%f" % (self.total / 1024),
@@ -455,17 +455,16 @@ class G15SysMon(g15plugin.G15RefreshingPlugin):
             return 4 + total_width
 
     @staticmethod
-    def _get_net_stats():
+    def _get_net_stats(sample):
         ifs = {}
-        nets = gtop.netlist()
+        nets = list(sample.net_names)
         for net in nets:
-            netload = gtop.netload(net)
-            ifs[net] = [netload.bytes_in, netload.bytes_out]
+            ifs[net] = list(sample.get_net_bytes(net))
         nets.insert(0, "Net")
         return ifs, nets
 
     @staticmethod
-    def _get_time_list(cpu):
+    def _get_time_list(cpu, sample):
         """
         Returns a 4 element list containing the amount of time the CPU has 
         spent performing the different types of work
@@ -477,12 +476,4 @@ class G15SysMon(g15plugin.G15RefreshingPlugin):
         
         Values are in USER_HZ or Jiffies
         """
-        if cpu.number == -1:
-            cpu_times = gtop.cpu()
-        else:
-            cpu_times = gtop.cpu().cpus[cpu.number]
-        return [cpu_times.user, cpu_times.nice, cpu_times.sys, cpu_times.idle]
-
-    @staticmethod
-    def _get_mem_info():
-        return gtop.mem()
+        return list(sample.get_cpu_times(cpu.number))
@@ -31,7 +31,6 @@ import gnome15.util.g15icontools as g15icontools
 import gnome15.util.g15markup as g15markup
 import gnome15.g15theme as g15theme
 import gnome15.g15driver as g15driver
-import gnome15.g15screen as g15screen
 import tailer
 
 logger = logging.getLogger(__name__)
@@ -200,13 +199,13 @@ class G15TailThread(Thread):
 
     def run(self):
         for line in tailer.tail(open(self.page.file_path), self.page.plugin.lines):
-            g15screen.run_on_redraw(self._add_line, line)
+            self.page._screen.run_on_redraw(self._add_line, line)
         self.fd = open(self.page.file_path)
         try:
             for line in tailer.follow(self.fd):
                 if self._stopped:
                     break
-                g15screen.run_on_redraw(self._add_line, line)
+                self.page._screen.run_on_redraw(self._add_line, line)
                 if self._stopped:
                     break
         except ValueError as e:
@@ -363,4 +362,4 @@ class G15Tails:
             for page in to_remove:
                 del self._pages[page]
 
-        g15screen.run_on_redraw(init)
+        self._screen.run_on_redraw(init)
@@ -20,7 +20,6 @@ import logging
 import os
 # import time
 
-import gi
 from gi.repository import Gtk as gtk
 
 import gnome15.g15locale as g15locale
@@ -35,18 +34,11 @@ import gnome15.g15driver as g15driver
 # import gnome15.g15globals as g15globals
 # import gnome15.g15text as g15text
 import gnome15.g15plugin as g15plugin
+import gnome15.g15top as g15top
 
 logger = logging.getLogger(__name__)
 _ = g15locale.get_translation("trafficstats", modfile=__file__).ugettext
 
-try:
-    gi.require_version("GTop", "2.0")
-    from gi.repository import GTop as gtop
-except Exception as e:
-    logger.debug("Could not import gtop. Falling back to g15top", exc_info=e)
-    # API compatible work around for Ubuntu 12.10
-    import gnome15.g15top as gtop
-
 # Plugin details - All of these must be provided
 id = "trafficstats"
 name = _("Traffic Stats")
@@ -98,7 +90,7 @@ def show_preferences(parent, driver, gconf_client, gconf_key):
     g15uigconf.configure_checkbox_from_gconf(gconf_client, gconf_key + "/use_vnstat", "UseVnstat", vnstat_installed,
                                              widget_tree)
     ndevice = widget_tree.get_object("NetDevice")
-    for netdev in gtop.netlist():
+    for netdev in g15top.netlist():
         ndevice.append([netdev])
     g15uigconf.configure_combo_from_gconf(gconf_client, gconf_key + "/networkdevice", "NetworkDevice", "lo",
                                           widget_tree)
@@ -170,7 +162,7 @@ class G15TrafficStats(g15plugin.G15RefreshingPlugin):
             elif binding.action == g15driver.NEXT_SELECTION:
                 if self.networkdevice is not None:
                     # get all network devices
-                    self.net_data = gtop.netlist()
+                    self.net_data = g15top.netlist()
                     # set network device id +1, to get next device
                     idx = self.net_data.index(self.networkdevice) + 1
                     # if next device id is not present, take first device
@@ -275,10 +267,11 @@ class G15TrafficStats(g15plugin.G15RefreshingPlugin):
         """
 
         if self.use_vnstat is False:
-            bootup = datetime.datetime.fromtimestamp(int(gtop.uptime().boot_time)).strftime('%d.%m.%y %H:%M')
-            sd = gtop.netload(self.networkdevice)
-            properties["sdn"] = "DL: " + convert_bytes(sd.bytes_in)
-            properties["sup"] = "UL: " + convert_bytes(sd.bytes_out)
+            bootup = datetime.datetime.fromtimestamp(int(g15top.uptime().boot_time)).strftime('%d.%m.%y %H:%M')
+            # Shares the sample taken by anything else refreshing on this tick (e.g. sysmon)
+            sd = g15top.snapshot().get_net_bytes(self.networkdevice) or (0, 0)
+            properties["sdn"] = "DL: " + convert_bytes(sd[0])
+            properties["sup"] = "UL: " + convert_bytes(sd[1])
             properties["des1"] = "Traffic since: " + bootup
             properties["title"] = self.networkdevice + " Traffic"
 
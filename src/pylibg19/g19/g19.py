@@ -14,7 +14,7 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-# import array
+import array
 import logging
 # import sys
 import threading
@@ -27,6 +27,15 @@ from receivers import G19Receiver
 
 logger = logging.getLogger(__name__)
 
+"""
+Every frame sent to the LCD starts with this 512 byte header, followed by
+the 320x240 pixels in little-endian 16bit highcolor (5-6-5)
+"""
+FRAME_HEADER = [0x10, 0x0F, 0x00, 0x58, 0x02, 0x00, 0x00, 0x00,
+                0x00, 0x00, 0x00, 0x3F, 0x01, 0xEF, 0x00, 0x0F] + list(range(16, 256)) + list(range(256))
+FRAME_HEADER_SIZE = len(FRAME_HEADER)
+FRAME_DATA_SIZE = 320 * 240 * 2
+
 
 class G19(object):
     """Simple access to Logitech G19 features.
@@ -44,13 +53,21 @@ class G19(object):
         self.__usbDeviceMutex = threading.Lock()
         self.__keyReceiver = G19Receiver(self)
         self.__threadDisplay = None
+        self.__frame = self.new_frame_buffer()
+
+    @staticmethod
+    def new_frame_buffer():
+        """Allocates a complete frame, header included.
+
+        The pixel data starts at FRAME_HEADER_SIZE. Callers may fill it in
+        place (by slice assignment) and pass the whole buffer to
+        send_frame(), in which case it is written to the device without
+        being copied.
 
-        self.__frame_content = [0x10, 0x0F, 0x00, 0x58, 0x02, 0x00, 0x00, 0x00,
-                                0x00, 0x00, 0x00, 0x3F, 0x01, 0xEF, 0x00, 0x0F]
-        for i in range(16, 256):
-            self.__frame_content.append(i)
-        for i in range(256):
-            self.__frame_content.append(i)
+        @return array.array('B') of FRAME_HEADER_SIZE + FRAME_DATA_SIZE bytes
+
+        """
+        return array.array('B', FRAME_HEADER) + array.array('B', [0]) * FRAME_DATA_SIZE
 
     @staticmethod
     def convert_image_to_frame(filename):
@@ -210,21 +227,26 @@ class G19(object):
     def send_frame(self, data):
         """Sends a frame to display.
 
-        @param data 320x240x2 bytes, containing the frame in little-endian
+        @param data either a complete frame as returned by new_frame_buffer(),
+        or 320x240x2 bytes, containing the frame in little-endian
         16bit highcolor (5-6-5) format.
         Image must be row-wise, starting at upper left corner and ending at
         lower right.  This means (data[0], data[1]) is the first pixel and
         (data[239 * 2], data[239 * 2 + 1]) the lower left one.
 
         """
-        if len(data) != (320 * 240 * 2):
-            raise ValueError("illegal frame size: " + str(len(data))
-                             + " should be 320x240x2=" + str(320 * 240 * 2))
-        frame = list(self.__frame_content)
-        frame += data
-
         self.__usbDeviceMutex.acquire()
         try:
+            if len(data) == FRAME_HEADER_SIZE + FRAME_DATA_SIZE:
+                frame = data
+            elif len(data) == FRAME_DATA_SIZE:
+                frame = self.__frame
+                if not isinstance(data, array.array):
+                    data = array.array('B', data)
+                frame[FRAME_HEADER_SIZE:] = data
+            else:
+                raise ValueError("illegal frame size: " + str(len(data))
+                                 + " should be 320x240x2=" + str(FRAME_DATA_SIZE))
             self.__usbDevice.handleIf0.bulkWrite(2, frame, self.__write_timeout)
         finally:
             self.__usbDeviceMutex.release()
@@ -0,0 +1,33 @@
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Unit tests for the parts of Gnome15 that do not need a display, a device
+or GObject. Run from the top of the source tree with
+
+    python -m unittest discover -s tests -t .
+
+The core modules use implicit relative imports, so both src/gnome15 and
+src are put on the path.
+"""
+
+import os
+import sys
+
+_src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+for _path in (os.path.join(_src, "gnome15"), _src):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
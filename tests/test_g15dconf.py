@@ -0,0 +1,78 @@
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+import tests  # noqa: F401 (sets up the path)
+
+try:
+    import g15dconf
+except ImportError:
+    # Needs dbus-python and GObject
+    g15dconf = None
+
+
+if g15dconf is not None:
+    class DBusGSettings(g15dconf.DBusGSettings):
+        """
+        DBusGSettings without the session bus, reading values from a dictionary
+        """
+
+        def __init__(self, schema_id, values):
+            self.schema_id = schema_id
+            self._handle = 1
+            self._cache = {}
+            self._monitors = {}
+            self._match_string = None
+            self.values = values
+            self.reads = 0
+
+        def _get_status_output(self, cmd):
+            self.reads += 1
+            return 0, "'%s'" % self.values[cmd.split(" ")[-1]]
+
+
+@unittest.skipIf(g15dconf is None, "g15dconf can not be imported")
+class DBusGSettingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = DBusGSettings("org.gnome.desktop.background", {"picture-uri": "a", "picture-options": "zoom"})
+
+    def test_unmonitored_key_not_cached(self):
+        self.assertEqual("zoom", self.settings.get_string("picture_options"))
+        self.settings.values["picture-options"] = "centered"
+        self.assertEqual("centered", self.settings.get_string("picture_options"))
+        self.assertEqual(2, self.settings.reads)
+
+    def test_monitored_key_cached(self):
+        handle = self.settings.connect("changed::picture-uri", lambda: None)
+        self.assertEqual("a", self.settings.get_string("picture-uri"))
+        self.assertEqual("a", self.settings.get_string("picture-uri"))
+        self.assertEqual(1, self.settings.reads)
+
+        # A change is seen by the monitor, which drops the cached value
+        self.settings.values["picture-uri"] = "b"
+        self.settings._notify("picture-uri", lambda: None)
+        self.assertEqual("b", self.settings.get_string("picture-uri"))
+
+        # Once nothing is watching, changes are no longer followed so the value is read each time
+        self.settings.disconnect(handle)
+        self.settings.values["picture-uri"] = "c"
+        self.assertEqual("c", self.settings.get_string("picture-uri"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+import unittest
+
+import tests  # noqa: F401 (sets up the path)
+
+try:
+    import g15driver
+except ImportError:
+    # Needs GObject
+    g15driver = None
+
+
+class Control(object):
+
+    def __init__(self, id):
+        self.id = id
+
+
+@unittest.skipIf(g15driver is None, "g15driver can not be imported")
+class ControlWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timeout = g15driver.CONTROL_WRITER_STOP_TIMEOUT
+        g15driver.CONTROL_WRITER_STOP_TIMEOUT = 0.2
+        self.device_lock = threading.Lock()
+        self.writing = threading.Event()
+        self.batches = []
+        self.writer = g15driver.ControlWriter("ControlWriterTest", self._write)
+
+    def tearDown(self):
+        g15driver.CONTROL_WRITER_STOP_TIMEOUT = self.timeout
+
+    def _write(self, controls):
+        self.writing.set()
+        with self.device_lock:
+            self.batches.append([c.id for c in controls])
+
+    def _wait_for_batches(self, count):
+        end = time.time() + 2.0
+        while len(self.batches) < count and time.time() < end:
+            time.sleep(0.01)
+        self.assertEqual(count, len(self.batches))
+
+    def test_merges_pending_controls(self):
+        a = Control("a")
+        self.writer.post(a)
+        self._wait_for_batches(1)
+        self.writer.post(a)
+        self.writer.post(Control("b"))
+        self.writer.post(a)
+        self._wait_for_batches(2)
+        self.assertEqual(["a", "b"], self.batches[1])
+        self.writer.stop()
+
+    def test_stop_while_holding_write_lock(self):
+        # The writer thread blocks on a lock the stopping thread holds, as when
+        # a driver disconnects from inside its own transmit
+        self.device_lock.acquire()
+        try:
+            self.writer.post(Control("a"))
+            self.assertTrue(self.writing.wait(2.0))
+            started = time.time()
+            self.writer.stop()
+            self.assertTrue(time.time() - started < 1.0)
+        finally:
+            self.device_lock.release()
+        self._wait_for_batches(1)
+
+        # A new thread is started for the next change
+        self.writer.post(Control("b"))
+        self._wait_for_batches(2)
+        self.assertEqual(["b"], self.batches[1])
+        self.writer.stop()
+
+    def test_flush_writes_pending_controls(self):
+        self.writer.post(Control("a"))
+        self.writer.flush()
+        self.writer.stop()
+        self.assertEqual([["a"]], self.batches)
+
+
+if __name__ == "__main__":
+    unittest.main()
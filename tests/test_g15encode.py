@@ -0,0 +1,230 @@
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import array
+import mmap
+import random
+import sys
+import unittest
+
+import tests  # noqa: F401 (sets up the path)
+from util import g15encode
+
+if sys.byteorder == "little":
+    R, G, B = 2, 1, 0
+else:
+    R, G, B = 1, 2, 3
+
+
+def random_frame(width, height, stride=None, seed=0):
+    rnd = random.Random(seed)
+    return bytes(bytearray(rnd.randrange(256) for __i in range((stride or width * 4) * height)))
+
+
+def reference_bits(data, width, height, stride, invert=False, threshold=g15encode.DEFAULT_THRESHOLD):
+    data = bytearray(data)
+    bits = []
+    for y in range(height):
+        for x in range(width):
+            o = y * stride + x * 4
+            lum = (data[o + R] * 77 + data[o + G] * 150 + data[o + B] * 29) >> 8
+            bits.append(1 if (lum >= threshold) == invert else 0)
+    return bits
+
+
+def reference_libg15(bits, length):
+    # As libg15's writePixmapToLCD() expects, most significant bit first
+    out = bytearray(length)
+    for i, bit in enumerate(bits):
+        if bit:
+            out[i // 8] |= 1 << (7 - i % 8)
+    return bytes(out)
+
+
+def reference_framebuffer(bits, width, height, line_length):
+    # As the kernel framebuffer drivers expect, least significant bit first
+    out = bytearray(line_length * height)
+    for y in range(height):
+        for x in range(width):
+            if bits[y * width + x]:
+                out[y * line_length + x // 8] |= 1 << (x % 8)
+    return bytes(out)
+
+
+def reference_rgb565(data, width, height, stride):
+    data = bytearray(data)
+    out = bytearray()
+    for y in range(height):
+        for x in range(width):
+            o = y * stride + x * 4
+            value = ((data[o + R] >> 3) << 11) | ((data[o + G] >> 2) << 5) | (data[o + B] >> 3)
+            out.append(value & 0xff)
+            out.append(value >> 8)
+    return bytes(out)
+
+
+class EncoderTest(unittest.TestCase):
+    """
+    Checks the encoders against per-pixel reference implementations. The pure
+    Python encoder is always tested, the NumPy one when it is installed.
+    """
+
+    def setUp(self):
+        self.numpy = g15encode.numpy
+
+    def tearDown(self):
+        g15encode.numpy = self.numpy
+
+    def _encoders(self):
+        g15encode.numpy = None
+        yield "python"
+        if self.numpy is not None:
+            g15encode.numpy = self.numpy
+            yield "numpy"
+
+    def test_libg15_first_pixel(self):
+        frame = bytearray(b"\xff" * 8 * 4)
+        frame[0:4] = b"\0\0\0\xff"
+        for encoder in self._encoders():
+            self.assertEqual(b"\x80\0\0", g15encode.encode_mono_libg15(bytes(frame), 8, 1, length=3), encoder)
+
+    def test_framebuffer_first_pixel(self):
+        frame = bytearray(b"\xff" * 8 * 4)
+        frame[0:4] = b"\0\0\0\xff"
+        for encoder in self._encoders():
+            self.assertEqual(b"\x01\0", g15encode.encode_mono_framebuffer(bytes(frame), 8, 1, 2), encoder)
+
+    def test_libg15_g15_frame(self):
+        frame = random_frame(160, 43)
+        bits = reference_bits(frame, 160, 43, 640)
+        for encoder in self._encoders():
+            self.assertEqual(reference_libg15(bits, 861),
+                             g15encode.encode_mono_libg15(frame, 160, 43, length=861), encoder)
+
+    def test_libg15_stride_invert_threshold(self):
+        frame = random_frame(13, 5, stride=64, seed=1)
+        bits = reference_bits(frame, 13, 5, 64, invert=True, threshold=100)
+        for encoder in self._encoders():
+            self.assertEqual(reference_libg15(bits, 9),
+                             g15encode.encode_mono_libg15(frame, 13, 5, stride=64, invert=True, threshold=100),
+                             encoder)
+
+    def test_framebuffer_g15_frame(self):
+        frame = random_frame(160, 43, seed=2)
+        bits = reference_bits(frame, 160, 43, 640)
+        for encoder in self._encoders():
+            self.assertEqual(reference_framebuffer(bits, 160, 43, 20),
+                             g15encode.encode_mono_framebuffer(frame, 160, 43, 20), encoder)
+
+    def test_framebuffer_padded_rows(self):
+        frame = random_frame(13, 5, stride=64, seed=3)
+        bits = reference_bits(frame, 13, 5, 64)
+        for encoder in self._encoders():
+            self.assertEqual(reference_framebuffer(bits, 13, 5, 4),
+                             g15encode.encode_mono_framebuffer(frame, 13, 5, 4, stride=64), encoder)
+
+    def test_rgb565_bytearray(self):
+        frame = random_frame(32, 24, seed=4)
+        for encoder in self._encoders():
+            out = bytearray(b"\xaa" * (16 + 32 * 24 * 2))
+            g15encode.encode_rgb565(frame, 32, 24, out, 16)
+            self.assertEqual(b"\xaa" * 16, bytes(out[:16]), encoder)
+            self.assertEqual(reference_rgb565(frame, 32, 24, 128), bytes(out[16:]), encoder)
+
+    def test_rgb565_stride(self):
+        frame = random_frame(7, 3, stride=32, seed=5)
+        for encoder in self._encoders():
+            out = bytearray(7 * 3 * 2)
+            g15encode.encode_rgb565(frame, 7, 3, out, stride=32)
+            self.assertEqual(reference_rgb565(frame, 7, 3, 32), bytes(out), encoder)
+
+    def test_rgb565_array(self):
+        frame = random_frame(8, 8, seed=6)
+        for encoder in self._encoders():
+            out = array.array('B', [0]) * (4 + 8 * 8 * 2)
+            g15encode.encode_rgb565(frame, 8, 8, out, 4)
+            self.assertEqual(4 + 8 * 8 * 2, len(out), encoder)
+            self.assertEqual(bytearray(reference_rgb565(frame, 8, 8, 32)), bytearray(out[4:]), encoder)
+
+    def test_rgb565_mmap(self):
+        frame = random_frame(8, 8, seed=7)
+        for encoder in self._encoders():
+            out = mmap.mmap(-1, 8 * 8 * 2)
+            try:
+                g15encode.encode_rgb565(frame, 8, 8, out)
+                self.assertEqual(reference_rgb565(frame, 8, 8, 32), out[:], encoder)
+            finally:
+                out.close()
+
+
+class FrameDiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.diff = g15encode.FrameDiff()
+
+    def test_changed_first_frame(self):
+        self.assertTrue(self.diff.changed(b"\x01" * 16))
+
+    def test_changed_same_frame_skipped(self):
+        self.diff.changed(b"\x01" * 16)
+        self.assertFalse(self.diff.changed(bytearray(b"\x01" * 16)))
+        self.assertEqual(1, self.diff.frames_skipped)
+
+    def test_changed_array(self):
+        frame = array.array('B', [1] * 16)
+        self.assertTrue(self.diff.changed(frame))
+        self.assertFalse(self.diff.changed(frame))
+        frame[3] = 2
+        self.assertTrue(self.diff.changed(frame))
+
+    def test_changed_spans_first_frame(self):
+        self.assertEqual([(0, 32)], self.diff.changed_spans(b"\0" * 32, 8))
+
+    def test_changed_spans_unchanged(self):
+        self.diff.changed_spans(b"\0" * 32, 8)
+        self.assertEqual([], self.diff.changed_spans(b"\0" * 32, 8))
+
+    def test_changed_spans_merges_adjacent_rows(self):
+        self.diff.changed_spans(b"\0" * 32, 8)
+        frame = bytearray(32)
+        frame[9] = 1
+        frame[17] = 1
+        frame[31] = 1
+        self.assertEqual([(8, 32)], self.diff.changed_spans(frame, 8))
+        frame[0] = 1
+        frame[31] = 0
+        self.assertEqual([(0, 8), (24, 32)], self.diff.changed_spans(frame, 8))
+
+    def test_changed_spans_size_change(self):
+        self.diff.changed_spans(b"\0" * 32, 8)
+        self.assertEqual([(0, 16)], self.diff.changed_spans(b"\0" * 16, 8))
+
+    def test_write_changed_mmap(self):
+        out = mmap.mmap(-1, 32)
+        try:
+            frame = bytearray(b"\x01" * 32)
+            self.assertEqual([(0, 32)], self.diff.write_changed(frame, 8, out))
+            self.assertEqual(b"\x01" * 32, out[:])
+            frame[20] = 2
+            out[:] = b"\0" * 32
+            self.assertEqual([(16, 24)], self.diff.write_changed(bytes(frame), 8, out))
+            self.assertEqual(b"\0" * 16 + bytes(frame[16:24]) + b"\0" * 8, out[:])
+        finally:
+            out.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import unittest
+
+import tests  # noqa: F401 (sets up the path)
+
+try:
+    import g15driver
+    import g15keyboard
+except ImportError:
+    # Needs GObject, GConf, pyinotify, python-uinput and a configured source tree (g15globals)
+    g15keyboard = None
+
+
+class Macro(object):
+
+    def __init__(self, *keys):
+        self.keys = list(keys)
+
+    def __repr__(self):
+        return "+".join(self.keys)
+
+
+@unittest.skipIf(g15keyboard is None, "g15keyboard can not be imported")
+class MacroDispatchTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.g1 = Macro("g1")
+        self.g1_g2 = Macro("g1", "g2")
+        self.g3 = Macro("g3")
+        self.empty = Macro()
+        self.table = g15keyboard.MacroDispatchTable(normal_macros=[self.g1, self.g1_g2, self.empty],
+                                                    held_macros=[self.g3])
+
+    def _key_states(self, **states):
+        key_states = {}
+        for key, state_id in states.items():
+            key_states[key] = g15keyboard.KeyState(key)
+            key_states[key].state_id = state_id
+        return key_states
+
+    def test_masks(self):
+        bits = self.table.bits
+        self.assertEqual(3, len(set(bits.values())))
+        self.assertEqual([(bits["g1"], self.g1), (bits["g1"] | bits["g2"], self.g1_g2)], self.table.normal_macros)
+        self.assertEqual([(bits["g3"], self.g3)], self.table.held_macros)
+
+    def test_candidates(self):
+        table = self.table
+        self.assertEqual([self.g1, self.g1_g2],
+                         [m for __mask, m in table.get_candidates(table.normal_macros, table.normal_index, "g1")])
+        self.assertEqual([self.g1_g2],
+                         [m for __mask, m in table.get_candidates(table.normal_macros, table.normal_index, "g2")])
+        self.assertEqual((), table.get_candidates(table.normal_macros, table.normal_index, "g3"))
+        self.assertEqual((), table.get_candidates(table.normal_macros, table.normal_index, "m1"))
+        self.assertTrue(table.get_candidates(table.normal_macros, table.normal_index) is table.normal_macros)
+
+    def test_state_masks(self):
+        bits = self.table.bits
+        key_states = self._key_states(g1=g15driver.KEY_STATE_UP, g2=g15driver.KEY_STATE_DOWN,
+                                      g3=g15driver.KEY_STATE_HELD, m1=g15driver.KEY_STATE_UP)
+        masks, released = self.table.get_state_masks(key_states)
+        self.assertEqual(bits["g1"], masks[g15driver.KEY_STATE_UP])
+        self.assertEqual(bits["g2"], masks[g15driver.KEY_STATE_DOWN])
+        self.assertEqual(bits["g3"], masks[g15driver.KEY_STATE_HELD])
+        self.assertEqual(bits["g1"], released)
+
+    def test_state_masks_consumed_and_defeated(self):
+        key_states = self._key_states(g1=g15driver.KEY_STATE_UP, g2=g15driver.KEY_STATE_UP)
+        key_states["g1"].consumed = True
+        key_states["g2"].defeat_release = True
+        masks, released = self.table.get_state_masks(key_states)
+        self.assertEqual(self.table.bits["g2"], masks[g15driver.KEY_STATE_UP])
+        self.assertEqual(0, released)
+
+    def test_actions(self):
+        table = g15keyboard.MacroDispatchTable(action_keys={"next": Macro("l1"), "prev": Macro("l2")})
+        self.assertEqual(set(["l1", "l2"]), set(table.bits))
+        self.assertEqual(2, len(table.actions))
+        self.assertEqual(["l1"], [m.keys[0] for __mask, m in table.get_candidates(table.actions,
+                                                                                  table.action_index, "l1")])
+
+    def test_same_as_scan(self):
+        rnd = random.Random(0)
+        keys = ["g%d" % i for i in range(1, 19)] + ["m1", "m2", "m3", "mr"]
+        combos = set()
+        while len(combos) < 60:
+            combos.add(tuple(sorted(rnd.sample(keys, rnd.choice([1, 1, 2, 3])))))
+        macros = [Macro(*c) for c in sorted(combos)]
+        table = g15keyboard.MacroDispatchTable(normal_macros=macros)
+        for __i in range(200):
+            key_states = self._key_states(**dict((k, rnd.choice([g15driver.KEY_STATE_UP, g15driver.KEY_STATE_DOWN]))
+                                                 for k in rnd.sample(keys, 4)))
+            key = rnd.choice(list(key_states))
+            masks, released = table.get_state_masks(key_states)
+            found = [m for mask, m in table.get_candidates(table.normal_macros, table.normal_index, key)
+                     if released & mask == mask]
+            expected = [m for m in macros if key in m.keys and
+                        all(k in key_states and key_states[k].state_id == g15driver.KEY_STATE_UP for k in m.keys)]
+            self.assertEqual(expected, found)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+import unittest
+
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
+
+import tests  # noqa: F401 (sets up the path)
+
+try:
+    import g15pluginmanager
+    import util.g15pythonlang as g15pythonlang
+except ImportError:
+    # Needs GObject, GConf and a configured source tree (g15globals)
+    g15pluginmanager = None
+
+
+class ConfClient(object):
+
+    def add_dir(self, key, preload):
+        pass
+
+    def set_bool(self, key, value):
+        pass
+
+
+class Service(object):
+
+    def __init__(self):
+        self.conf_client = ConfClient()
+        self.active_plugins = {}
+
+
+class Module(object):
+
+    def __init__(self, id, activate_after=(), activate_in_parallel=False):
+        self.id = id
+        self.name = id
+        self.activate_after = list(activate_after)
+        self.activate_in_parallel = activate_in_parallel
+
+
+class Plugin(object):
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.started = None
+        self.finished = None
+
+    def activate(self):
+        self.started = time.time()
+        time.sleep(self.duration)
+        self.finished = time.time()
+
+
+class MainLoop(object):
+    """
+    Runs idle callbacks one after another on a thread of its own, standing in
+    for gobject.idle_add() and the gobject thread
+    """
+
+    def __init__(self):
+        self.callbacks = Queue.Queue()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def idle_add(self, function, *args):
+        self.callbacks.put((function, args))
+
+    def stop(self):
+        self.callbacks.put(None)
+        self.thread.join()
+
+    def _run(self):
+        g15pythonlang.set_gobject_thread()
+        while True:
+            callback = self.callbacks.get()
+            if callback is None:
+                break
+            callback[0](*callback[1])
+
+
+@unittest.skipIf(g15pluginmanager is None, "g15pluginmanager can not be imported")
+class ActivateInstancesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timeout = g15pluginmanager.ACTIVATION_TIMEOUT
+        self.gobject = g15pluginmanager.gobject
+        self.main_loop = MainLoop()
+        g15pluginmanager.gobject = self.main_loop
+        self.plugins = g15pluginmanager.G15Plugins(None, service=Service())
+        self.plugins.state = g15pluginmanager.ACTIVATED
+
+    def tearDown(self):
+        self.main_loop.stop()
+        g15pluginmanager.gobject = self.gobject
+        g15pluginmanager.ACTIVATION_TIMEOUT = self.timeout
+
+    def _add(self, module, duration):
+        instance = Plugin(duration)
+        self.plugins.plugin_map[instance] = module
+        return instance
+
+    def _wait_until_activated(self, *instances):
+        end = time.time() + 5.0
+        while time.time() < end and any(i not in self.plugins.get_activated() for i in instances):
+            time.sleep(0.01)
+        self.assertEqual(set(instances), set(self.plugins.get_activated()) & set(instances))
+
+    def _status(self, mod_id):
+        return self.plugins.activation_times[mod_id][1]
+
+    def test_timeout_measured_from_start(self):
+        # Idle callbacks run one at a time, so the last plugin starts well
+        # after the timeout would have expired had it been counted from when
+        # it was queued
+        g15pluginmanager.ACTIVATION_TIMEOUT = 0.5
+        instances = [self._add(Module(mod_id), 0.2) for mod_id in ["a", "b", "c", "d"]]
+        self.plugins._activate_instances(instances)
+        self.assertEqual(instances, self.plugins.get_activated())
+        for mod_id in ["a", "b", "c", "d"]:
+            self.assertEqual("activated", self._status(mod_id))
+
+    def test_dependants_wait_for_late_plugin(self):
+        g15pluginmanager.ACTIVATION_TIMEOUT = 0.1
+        slow = self._add(Module("slow"), 0.5)
+        after = self._add(Module("after", activate_after=["slow"], activate_in_parallel=True), 0.0)
+        other = self._add(Module("other", activate_in_parallel=True), 0.0)
+        self.plugins._activate_instances([slow, after, other])
+
+        # The batch has moved on without the slow plugin, but what must come after it has not started
+        self.assertEqual("timeout", self._status("slow"))
+        self.assertTrue(other in self.plugins.get_activated())
+        self.assertEqual(None, after.started)
+
+        self._wait_until_activated(slow, after)
+        self.assertTrue(after.started >= slow.finished)
+        self.assertEqual("activated", self._status("slow"))
+
+    def test_chain_waits_for_late_plugin(self):
+        g15pluginmanager.ACTIVATION_TIMEOUT = 0.1
+        slow = self._add(Module("slow"), 0.4)
+        second = self._add(Module("second", activate_after=["slow"]), 0.0)
+        third = self._add(Module("third", activate_after=["second"]), 0.0)
+        self.plugins._activate_instances([slow, second, third])
+        self.assertEqual(None, third.started)
+
+        self._wait_until_activated(slow, second, third)
+        self.assertTrue(third.started >= second.finished >= slow.finished)
+
+    def test_dependency_order(self):
+        first = self._add(Module("first", activate_in_parallel=True), 0.1)
+        second = self._add(Module("second", activate_after=["first"], activate_in_parallel=True), 0.0)
+        third = self._add(Module("third", activate_after=["second"]), 0.0)
+        self.plugins._activate_instances([third, second, first])
+        self.assertEqual([first, second, third], self.plugins.get_activated())
+
+    def test_cycle_activated_anyway(self):
+        a = self._add(Module("a", activate_after=["b"]), 0.0)
+        b = self._add(Module("b", activate_after=["a"]), 0.0)
+        self.plugins._activate_instances([a, b])
+        self.assertEqual([a, b], self.plugins.get_activated())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import tests  # noqa: F401 (sets up the path)
+
+try:
+    import g15pluginmanifest
+except ImportError:
+    # Needs GObject and a configured source tree (g15globals)
+    g15pluginmanifest = None
+
+PLUGIN_SOURCE = '''
+import gnome15.g15locale as g15locale
+import gnome15.g15driver as g15driver
+
+_ = g15locale.get_translation("test", modfile=__file__).ugettext
+
+id = "test"
+name = _("Test")
+author = "Someone " + "Else"
+has_preferences = True
+supported_models = [g15driver.MODEL_G19, g15driver.MODEL_G15_V1]
+unsupported_models = [g15driver.NO_SUCH_MODEL]
+default_enabled = False
+default_enabled = True
+actions = {"next": "Next"}
+actions_g19 = {"next": _("Next")}
+
+
+def create(gconf_key, gconf_client, screen):
+    pass
+'''
+
+
+@unittest.skipIf(g15pluginmanifest is None, "g15pluginmanifest can not be imported")
+class ScanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.module_file = os.path.join(self.dir, "test.py")
+        self._write(PLUGIN_SOURCE)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, source):
+        with open(self.module_file, "w") as f:
+            f.write(source)
+
+    def test_values(self):
+        entry = g15pluginmanifest.scan(self.module_file)
+        values = entry["values"]
+        self.assertEqual("test", values["id"])
+        self.assertEqual({g15pluginmanifest.GETTEXT: "Test"}, values["name"])
+        self.assertEqual("Someone Else", values["author"])
+        self.assertEqual(True, values["has_preferences"])
+        self.assertEqual(["g19", "g15v1"], values["supported_models"])
+        self.assertEqual({"next": "Next"}, values["actions"])
+        self.assertEqual({"next": {g15pluginmanifest.GETTEXT: "Next"}}, values["actions_g19"])
+        self.assertEqual("test", entry["domain"])
+        self.assertFalse(entry["star_import"])
+
+    def test_unknown_constant_left_to_module(self):
+        values = g15pluginmanifest.scan(self.module_file)["values"]
+        self.assertFalse("unsupported_models" in values)
+
+    def test_reassigned_left_to_module(self):
+        entry = g15pluginmanifest.scan(self.module_file)
+        self.assertFalse("default_enabled" in entry["values"])
+        self.assertTrue("default_enabled" in entry["names"])
+        self.assertTrue("create" in entry["names"])
+
+    def test_star_import(self):
+        self._write("from os import *\nid = 'test'\n")
+        entry = g15pluginmanifest.scan(self.module_file)
+        self.assertTrue(entry["star_import"])
+        self.assertEqual("test", entry["values"]["id"])
+
+    def test_syntax_error(self):
+        self._write("id = \n")
+        entry = g15pluginmanifest.scan(self.module_file)
+        self.assertEqual({}, entry["values"])
+        self.assertTrue(entry["star_import"])
+
+    def test_manifest_cache(self):
+        path = os.path.join(self.dir, "manifest.json")
+        manifest = g15pluginmanifest.PluginManifest(path)
+        manifest.get(self.module_file)
+        manifest.get(self.module_file)
+        self.assertEqual((1, 1), (manifest.misses, manifest.hits))
+        manifest.save()
+
+        manifest = g15pluginmanifest.PluginManifest(path)
+        self.assertEqual("test", manifest.get(self.module_file)["values"]["id"])
+        self.assertEqual((0, 1), (manifest.misses, manifest.hits))
+
+        self._write(PLUGIN_SOURCE + "\n# changed\n")
+        manifest.get(self.module_file)
+        self.assertEqual(1, manifest.misses)
+
+
+if __name__ == "__main__":
+    unittest.main()
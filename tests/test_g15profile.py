@@ -0,0 +1,106 @@
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+import tests  # noqa: F401 (sets up the path)
+
+try:
+    import g15profile
+except ImportError:
+    # Needs GConf, pyinotify, python-uinput and a configured source tree (g15globals)
+    g15profile = None
+
+
+class Profile(object):
+
+    def __init__(self, profile_id, window_name, activate_on_focus=True, default=False):
+        self.id = profile_id
+        self.window_name = window_name
+        self.activate_on_focus = activate_on_focus
+        self.default = default
+
+    def get_default(self):
+        return self.default
+
+
+def scan(profiles, title):
+    """
+    The per profile scan G15Screen.set_active_application_name() used to do
+    """
+    for profile in profiles:
+        if not profile.get_default() and profile.activate_on_focus and len(profile.window_name) > 0 and \
+                title.lower().find(profile.window_name.lower()) != -1:
+            return profile
+
+
+@unittest.skipIf(g15profile is None, "g15profile can not be imported")
+class WindowMatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.profiles = [Profile(1, "Firefox"),
+                         Profile(2, "Mozilla Firefox"),
+                         Profile(3, "fox"),
+                         Profile(4, "Terminal", activate_on_focus=False),
+                         Profile(5, "Default", default=True),
+                         Profile(6, ""),
+                         Profile(7, "term"),
+                         Profile(8, "a.b (c)"),
+                         Profile(9, "TERM")]
+        self.matcher = g15profile.WindowMatcher(self.profiles)
+
+    def _match_id(self, title):
+        profile = self.matcher.match(title)
+        return profile.id if profile is not None else None
+
+    def test_first_profile_wins(self):
+        self.assertEqual(1, self._match_id("Mozilla Firefox"))
+        self.assertEqual(3, self._match_id("Firefo fox"))
+
+    def test_ignores_case(self):
+        self.assertEqual(1, self._match_id("FIREFOX"))
+        self.assertEqual(7, self._match_id("gnome-TERMINAL"))
+
+    def test_excluded_profiles(self):
+        self.assertEqual(None, self._match_id("Default"))
+        self.assertEqual(7, self._match_id("Terminal"))
+
+    def test_no_match(self):
+        self.assertEqual(None, self._match_id("gedit"))
+        self.assertEqual(None, self._match_id(""))
+        self.assertEqual(None, self._match_id(None))
+
+    def test_special_characters(self):
+        self.assertEqual(8, self._match_id("x A.B (C) y"))
+        self.assertEqual(None, self._match_id("aXb (c)"))
+
+    def test_remembered_titles(self):
+        for __i in range(2):
+            self.assertEqual(1, self._match_id("Firefox"))
+            self.assertEqual(None, self._match_id("gedit"))
+
+    def test_no_profiles(self):
+        self.assertEqual(None, g15profile.WindowMatcher([]).match("Firefox"))
+
+    def test_same_as_scan(self):
+        titles = ["Mozilla Firefox", "term", "a fox in a Terminal", "gedit", "Default", "a.b (c)", "xterm",
+                  "FOXTERM", ""]
+        for title in titles:
+            self.assertTrue(scan(self.profiles, title) is self.matcher.match(title), title)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+import tests  # noqa: F401 (sets up the path)
+from util import g15ringbuffer
+from util.g15ringbuffer import RingBuffer
+
+
+class RingBufferTest(unittest.TestCase):
+    """
+    Runs against array storage, and NumPy storage when it is installed.
+    """
+
+    def setUp(self):
+        self.numpy = g15ringbuffer.numpy
+
+    def tearDown(self):
+        g15ringbuffer.numpy = self.numpy
+
+    def _storages(self):
+        g15ringbuffer.numpy = None
+        yield "array"
+        if self.numpy is not None:
+            g15ringbuffer.numpy = self.numpy
+            yield "numpy"
+
+    def test_capacity(self):
+        self.assertRaises(ValueError, RingBuffer, 0)
+
+    def test_empty(self):
+        for storage in self._storages():
+            ring = RingBuffer(4, fill=-1.0)
+            self.assertEqual(0, len(ring), storage)
+            self.assertEqual(None, ring.get_last(), storage)
+            self.assertEqual([], ring.tolist(), storage)
+            self.assertEqual([-1.0, -1.0], ring.tolist(2), storage)
+
+    def test_append(self):
+        for storage in self._storages():
+            ring = RingBuffer(4)
+            for value in [1, 2, 3]:
+                ring.append(value)
+            self.assertEqual(3, len(ring), storage)
+            self.assertEqual(3.0, ring.get_last(), storage)
+            self.assertEqual([1.0, 2.0, 3.0], ring.tolist(), storage)
+            self.assertEqual([0.0, 1.0, 2.0, 3.0], ring.tolist(10), storage)
+
+    def test_wrap(self):
+        for storage in self._storages():
+            ring = RingBuffer(4)
+            for value in range(11):
+                ring.append(value)
+            self.assertEqual(4, len(ring), storage)
+            self.assertEqual([7.0, 8.0, 9.0, 10.0], ring.tolist(), storage)
+            self.assertEqual([9.0, 10.0], ring.tolist(2), storage)
+            self.assertEqual([], ring.tolist(0), storage)
+
+    def test_view(self):
+        for storage in self._storages():
+            ring = RingBuffer(3)
+            for value in range(5):
+                ring.append(value)
+            self.assertEqual([3.0, 4.0], list(ring.get_view(2)), storage)
+            self.assertEqual([2.0, 3.0, 4.0], list(ring.get_view()), storage)
+
+    def test_downsample(self):
+        for storage in self._storages():
+            ring = RingBuffer(10)
+            for value in range(20):
+                ring.append(value)
+            mins, maxs, avgs = ring.downsample(10, 3)
+            self.assertEqual([10.0, 13.0, 16.0], mins, storage)
+            self.assertEqual([12.0, 15.0, 19.0], maxs, storage)
+            self.assertEqual([11.0, 14.0, 17.5], avgs, storage)
+
+    def test_downsample_more_buckets_than_values(self):
+        for storage in self._storages():
+            ring = RingBuffer(10)
+            ring.append(1)
+            ring.append(2)
+            self.assertEqual(([1.0, 2.0], [1.0, 2.0], [1.0, 2.0]), ring.downsample(2, 5), storage)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import unittest
+
+import tests  # noqa: F401 (sets up the path)
+
+try:
+    import g15text
+except ImportError:
+    # Needs Cairo, Pango and PangoCairo
+    g15text = None
+
+
+def on_thread(function, *args, **kwargs):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function(*args, **kwargs)))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def get_layout(text):
+    return text._G15PangoText__layout
+
+
+@unittest.skipIf(g15text is None, "g15text can not be imported")
+class ThreadLocalTest(unittest.TestCase):
+
+    def test_context_per_thread_and_antialias(self):
+        context = g15text.get_context(True)
+        self.assertTrue(context is g15text.get_context(True))
+        self.assertFalse(context is g15text.get_context(False))
+        self.assertFalse(context is on_thread(g15text.get_context, True))
+
+    def test_layout_cache_per_thread(self):
+        cache = g15text.get_layout_cache()
+        self.assertTrue(cache is g15text.get_layout_cache())
+        self.assertFalse(cache is on_thread(g15text.get_layout_cache))
+
+    def test_layouts_shared_on_thread(self):
+        a = g15text.G15PangoText(True)
+        b = g15text.G15PangoText(True)
+        a.set_attributes("Shared", font_pt_size=10)
+        b.set_attributes("Shared", font_pt_size=10)
+        self.assertTrue(get_layout(a) is get_layout(b))
+
+        # Different font options are shaped separately
+        c = g15text.G15PangoText(False)
+        c.set_attributes("Shared", font_pt_size=10)
+        self.assertFalse(get_layout(a) is get_layout(c))
+
+    def test_layouts_not_shared_across_threads(self):
+        a = g15text.G15PangoText(True)
+        a.set_attributes("Mine", font_pt_size=10)
+        layout = get_layout(a)
+
+        b = g15text.G15PangoText(True)
+        on_thread(b.set_attributes, "Mine", font_pt_size=10)
+        self.assertFalse(layout is get_layout(b))
+
+        # A handler used on another thread does not keep the layout of the first
+        on_thread(a.set_attributes, "Mine", font_pt_size=10)
+        self.assertFalse(layout is get_layout(a))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from string import Template
+import unittest
+
+import tests  # noqa: F401 (sets up the path)
+
+try:
+    from lxml import etree
+    import g15theme
+except ImportError:
+    # Needs lxml, Cairo, GObject and a configured source tree (g15globals)
+    g15theme = None
+
+SVG = "{http://www.w3.org/2000/svg}"
+
+
+def svg(body):
+    return etree.fromstring('<svg xmlns="http://www.w3.org/2000/svg">%s</svg>' % body)
+
+
+def ids(text):
+    if text is None:
+        return None
+    return [el.get("id") for el in etree.fromstring(text).iter() if el.get("id") is not None]
+
+
+@unittest.skipIf(g15theme is None, "g15theme can not be imported")
+class SlotTemplateTest(unittest.TestCase):
+
+    def _substitute(self, text, values):
+        return g15theme.SlotTemplate(text).substitute(dict((k, (v, v)) for k, v in values.items()))
+
+    def test_names(self):
+        self.assertEqual(frozenset(["a", "b"]), g15theme.SlotTemplate("$a ${b} $a $$c").names)
+
+    def test_substitute(self):
+        self.assertEqual("x=1, y=2.", self._substitute("x=$x, y=${y}.", {"x": "1", "y": "2"}))
+
+    def test_encoded_text_used(self):
+        template = g15theme.SlotTemplate("<text>$t</text>")
+        self.assertEqual("<text>a &amp; b</text>", template.substitute({"t": ("a & b", "a &amp; b")}))
+
+    def test_same_as_safe_substitute(self):
+        values = {"name": "Gnome15", "version": "1.0"}
+        for text in ["", "plain", "$name", "${name}s $version", "$missing and ${missing}",
+                     "$$name costs $$5", "$ alone", "trailing $", "$name$version", "${bad name}"]:
+            self.assertEqual(Template(text).safe_substitute(values), self._substitute(text, values), text)
+
+
+@unittest.skipIf(g15theme is None, "g15theme can not be imported")
+class RenderSubstituteTest(unittest.TestCase):
+
+    def _substitute(self, body, properties):
+        render = g15theme.Render(etree.ElementTree(svg(body)), properties, [], {}, None)
+        return etree.fromstring(render.substitute().encode("utf-8"))
+
+    def test_escaped(self):
+        root = self._substitute('<text id="t">${t}</text>', {"t": "a < b & c"})
+        self.assertEqual(u"a < b & c", root.find(SVG + "text").text)
+
+    def test_non_ascii_byte_string(self):
+        # e.g. a locale formatted date or a track name on Python 2
+        value = u"caf\u00e9 \u2013 na\u00efve".encode("utf-8")
+        root = self._substitute('<text id="t">${t}</text><text id="u">${u}</text>',
+                                {"t": value, "u": u"\u00fcber"})
+        texts = root.findall(SVG + "text")
+        if isinstance(value, str):
+            # Python 2 only, on Python 3 this is not text
+            self.assertEqual(u"caf\u00e9 \u2013 na\u00efve", texts[0].text)
+        self.assertEqual(u"\u00fcber", texts[1].text)
+
+    def test_non_ascii_literal(self):
+        root = self._substitute(u'<text id="t">\u00e9t\u00e9 $t</text>', {"t": 42})
+        self.assertEqual(u"\u00e9t\u00e9 42", root.find(SVG + "text").text)
+
+    def test_only_changed_values_encoded(self):
+        render = g15theme.Render(etree.ElementTree(svg('<text>$a $b</text>')), {"a": "1", "b": "2"}, [], {}, None)
+        render.substitute()
+        encoded_b = render.encoded_properties["b"]
+        render.properties = dict(render.properties, a="3")
+        self.assertTrue(u">3 2<" in render.substitute())
+        self.assertTrue(render.encoded_properties["b"] is encoded_b)
+
+
+@unittest.skipIf(g15theme is None, "g15theme can not be imported")
+class SplitLayersTest(unittest.TestCase):
+
+    def test_split(self):
+        root = svg('<defs><linearGradient id="grad"/></defs>'
+                   '<rect id="bg"/>'
+                   '<g id="group"><rect id="frame"/><text id="time">${time}</text></g>'
+                   '<rect id="after"/>')
+        background, overlay = g15theme.split_layers(root)
+        self.assertEqual(["grad", "bg", "group", "frame"], ids(background))
+        self.assertEqual(["grad", "group", "time", "after"], ids(overlay))
+
+    def test_document_unchanged(self):
+        root = svg('<rect id="bg"/><text id="t">$t</text>')
+        before = etree.tostring(root)
+        g15theme.split_layers(etree.ElementTree(root))
+        self.assertEqual(before, etree.tostring(root))
+
+    def test_all_static(self):
+        background, overlay = g15theme.split_layers(svg('<rect id="a"/><rect id="b"/>'))
+        self.assertEqual(["a", "b"], ids(background))
+        self.assertEqual([], ids(overlay))
+
+    def test_dynamic_first(self):
+        root = svg('<image id="icon" title="icon"/><rect id="bg"/>')
+        background, overlay = g15theme.split_layers(root)
+        self.assertEqual(None, background)
+        self.assertEqual(["icon", "bg"], ids(overlay))
+
+    def test_dynamic_ids(self):
+        background, overlay = g15theme.split_layers(svg('<rect id="a"/><rect id="b"/>'), dynamic_ids=["b"])
+        self.assertEqual(["a"], ids(background))
+        self.assertEqual(["b"], ids(overlay))
+
+    def test_dynamic_attribute(self):
+        root = svg('<rect id="a"/><rect id="b" width="${w}"/><rect id="c"/>')
+        background, overlay = g15theme.split_layers(root)
+        self.assertEqual(["a"], ids(background))
+        self.assertEqual(["b", "c"], ids(overlay))
+
+    def test_progress_and_textbox(self):
+        for cls in ["progress", "textbox"]:
+            root = svg('<rect id="a"/><rect id="b" class="%s"/>' % cls)
+            self.assertEqual(["a"], ids(g15theme.split_layers(root)[0]), cls)
+
+    def test_dynamic_defs_not_split(self):
+        root = svg('<defs><linearGradient id="grad" x1="$x"/></defs><rect id="bg"/><text id="t">$t</text>')
+        background, overlay = g15theme.split_layers(root)
+        self.assertEqual(None, background)
+        self.assertEqual(["grad", "bg", "t"], ids(overlay))
+
+    def test_composited_group_not_split(self):
+        root = svg('<rect id="bg"/>'
+                   '<g id="group" opacity="0.5"><rect id="frame"/><text id="t">$t</text></g>')
+        background, overlay = g15theme.split_layers(root)
+        self.assertEqual(["bg"], ids(background))
+        self.assertEqual(["group", "frame", "t"], ids(overlay))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python2
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures how long a GSettings change takes to reach a g15dconf callback,
+using the memory backend. Any installed schema with a string key may be
+used. Run from the top of the source tree, e.g.
+
+    python2 tools/bench_dconf.py org.gnome.desktop.background picture-uri
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "gnome15"))
+from gi.repository import Gio, GLib
+import g15dconf
+
+
+def main():
+    schema_id, key = sys.argv[1:3] if len(sys.argv) > 2 else ("org.gnome.desktop.background", "picture-uri")
+    memory_backend = Gio.memory_settings_backend_new()
+    settings = g15dconf.get_settings(schema_id, memory_backend)
+    writer = Gio.Settings.new_full(Gio.SettingsSchemaSource.get_default().lookup(schema_id, True),
+                                   memory_backend, None)
+    loop = GLib.MainLoop()
+    latencies = []
+    sent = [0.0]
+
+    def _received():
+        latencies.append(time.time() - sent[0])
+        if len(latencies) < 100:
+            GLib.idle_add(_send)
+        else:
+            loop.quit()
+
+    def _send():
+        sent[0] = time.time()
+        writer.set_string(key, "value-%d" % len(latencies))
+        return False
+
+    settings.connect("changed::%s" % key, _received)
+    GLib.idle_add(_send)
+    loop.run()
+    assert settings.get_string(key) == "value-%d" % (len(latencies) - 1)
+    print("%s: %d changes, mean %.3fms, max %.3fms" % (settings.__class__.__name__, len(latencies),
+                                                       sum(latencies) * 1000.0 / len(latencies),
+                                                       max(latencies) * 1000.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python2
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2011 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Micro-benchmark comparing the frame encoders in util.g15encode against the
+per-pixel packing the drivers used to do. Run from the top of the source tree
+
+    python2 tools/bench_encode.py
+"""
+
+from __future__ import print_function
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "gnome15"))
+import util.g15encode as g15encode
+
+
+def legacy_libg15(bits, width, height):
+    arrbuf = bytearray(861)
+    for x in range(0, width):
+        for y in range(0, height):
+            pixel_offset = y * width + x
+            byte_offset = pixel_offset // 8
+            bit_offset = 7 - (pixel_offset % 8)
+            if bits[x + (y * width)] > 0:
+                arrbuf[byte_offset] |= 1 << bit_offset
+            else:
+                arrbuf[byte_offset] &= ~(1 << bit_offset)
+    return bytes(arrbuf)
+
+
+def legacy_framebuffer(bits, width, height, line_length):
+    arrbuf = bytearray(line_length * height)
+    v = 0
+    b = 1
+    for row in range(0, height):
+        for col in range(0, width):
+            if bits[(row * width) + col]:
+                v += b
+            b = b << 1
+            if b == 256:
+                b = 1
+                arrbuf[row * line_length + col // 8] = v
+                v = 0
+    return bytes(arrbuf)
+
+
+def legacy_rgb565(data):
+    data = bytearray(data)
+    out = []
+    for i in range(0, len(data), 4):
+        r_bits = min(data[i + 2] * 32 // 255, 31)
+        g_bits = min(data[i + 1] * 64 // 255, 63)
+        b_bits = min(data[i] * 32 // 255, 31)
+        out.append(((g_bits << 5) | b_bits) & 0xff)
+        out.append(((r_bits << 3) | (g_bits >> 3)) & 0xff)
+    return bytes(bytearray(out))
+
+
+def report(label, fn, n):
+    elapsed = timeit.timeit(fn, number=n)
+    print("%-36s %10.1f frames/sec" % (label, n / elapsed))
+
+
+def main():
+    w, h, ll = 160, 43, 20
+    frame = bytes(bytearray(random.randrange(256) for __i in range(w * h * 4)))
+    frame_bits = bytearray(g15encode._python_bits(frame, w, h, w * 4, False, g15encode.DEFAULT_THRESHOLD))
+    assert legacy_libg15(frame_bits, w, h) == g15encode.encode_mono_libg15(frame, w, h, length=861)
+    assert legacy_framebuffer(frame_bits, w, h, ll) == g15encode.encode_mono_framebuffer(frame, w, h, ll)
+
+    cw, ch = 320, 240
+    colour_frame = bytes(bytearray(random.randrange(256) for __i in range(cw * ch * 4)))
+    colour_out = bytearray(512 + cw * ch * 2)
+    g15encode.encode_rgb565(colour_frame, cw, ch, colour_out, 512)
+    assert legacy_rgb565(colour_frame) == bytes(colour_out[512:])
+
+    report("legacy libg15 (packing only)", lambda: legacy_libg15(frame_bits, w, h), 20)
+    report("legacy framebuffer (packing only)", lambda: legacy_framebuffer(frame_bits, w, h, ll), 20)
+    report("legacy rgb565", lambda: legacy_rgb565(colour_frame), 2)
+    numpy = g15encode.numpy
+    for use_numpy in ([True, False] if numpy is not None else [False]):
+        g15encode.numpy = numpy if use_numpy else None
+        label = "numpy" if use_numpy else "python"
+        report("%s libg15" % label, lambda: g15encode.encode_mono_libg15(frame, w, h, length=861), 500)
+        report("%s framebuffer" % label, lambda: g15encode.encode_mono_framebuffer(frame, w, h, ll), 500)
+        report("%s rgb565" % label, lambda: g15encode.encode_rgb565(colour_frame, cw, ch, colour_out, 512), 50)
+    g15encode.numpy = numpy
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python2
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Replays a recorded (here, randomly generated) key stream through the macro
+dispatch table, and through the per macro scan the key handler used to do,
+checking both activate the same macros. Run from the top of the source tree
+
+    python2 tools/bench_macro_dispatch.py
+"""
+
+from __future__ import print_function
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "gnome15"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import g15driver
+from g15keyboard import KeyState, MacroDispatchTable
+
+
+class BenchmarkMacro:
+    def __init__(self, keys):
+        self.keys = keys
+
+
+class BenchmarkStream:
+    def __init__(self, macro_count, event_count):
+        keys = ["g%d" % i for i in range(1, 19)] + ["m1", "m2", "m3", "mr", "l1", "l2", "l3", "l4", "l5"]
+        combos = set()
+        while len(combos) < macro_count:
+            combos.add(tuple(sorted(random.sample(keys, random.choice([1, 1, 1, 2, 2, 3])))))
+        self.macros = [BenchmarkMacro(list(c)) for c in combos]
+        self.events = []
+        for __i in range(event_count):
+            pressed = random.choice(self.macros).keys
+            for state_id in [g15driver.KEY_STATE_DOWN, g15driver.KEY_STATE_HELD, g15driver.KEY_STATE_UP]:
+                for k in pressed:
+                    self.events.append((k, state_id))
+
+    def replay(self, find):
+        key_states = {}
+        activated = []
+        for key, state_id in self.events:
+            if key not in key_states:
+                key_states[key] = KeyState(key)
+            key_states[key].state_id = state_id
+            key_states[key].consumed = False
+            for m in find(key, key_states):
+                activated.append(m)
+                for k in m.keys:
+                    key_states[k].consumed = True
+            if all(v.state_id == g15driver.KEY_STATE_UP for v in key_states.values()):
+                key_states = {}
+        return activated
+
+
+def legacy_find(macros):
+    def find(key, key_states):
+        found = []
+        for m in macros:
+            up = []
+            for k in m.keys:
+                if k in key_states:
+                    key_state = key_states[k]
+                    if not key_state.is_consumed() and key_state.state_id == g15driver.KEY_STATE_UP \
+                            and not key_state.defeat_release:
+                        up.append(key_state)
+            if len(up) == len(m.keys):
+                found.append(m)
+                for key_state in up:
+                    key_state.consumed = True
+        return found
+    return find
+
+
+def table_find(table):
+    def find(key, key_states):
+        found = []
+        masks, released = table.get_state_masks(key_states)
+        for mask, m in table.get_candidates(table.normal_macros, table.normal_index, key):
+            if released & mask == mask:
+                found.append(m)
+                for k in m.keys:
+                    key_states[k].consumed = True
+                masks, released = table.get_state_masks(key_states)
+        return found
+    return find
+
+
+def main():
+    for macro_count in [10, 50, 200]:
+        stream = BenchmarkStream(macro_count, 2000)
+        table = MacroDispatchTable(normal_macros=stream.macros)
+        finders = [("scan", legacy_find(stream.macros)), ("dispatch table", table_find(table))]
+        assert stream.replay(finders[0][1]) == stream.replay(finders[1][1])
+        for label, find in finders:
+            elapsed = timeit.timeit(lambda: stream.replay(find), number=5)
+            print("%4d macros %-16s %10.1f events/sec" % (macro_count, label, 5 * len(stream.events) / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python2
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Headless benchmark of redraw queues. Three devices (a colour one with a slow
+50ms USB write, as a G19 can have, and two monochrome ones) ask for redraws
+continuously, first sharing one redraw queue (as all screens used to) and
+then each using their own. Only the redraw coordinator and the scheduler are
+used, painting is replaced by a sleep. Run from the top of the source tree
+
+    python2 tools/bench_redraw_queues.py
+"""
+
+from __future__ import print_function
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "gnome15"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from gi.repository import GLib
+import g15screen
+import util.g15scheduler as g15scheduler
+
+
+class BenchmarkDriver:
+    def __init__(self, bpp):
+        self.bpp = bpp
+
+    def get_bpp(self):
+        return self.bpp
+
+
+class BenchmarkScreen:
+    def __init__(self, uid, bpp, write_time, redraw_queue):
+        self.uid = uid
+        self.driver = BenchmarkDriver(bpp)
+        self.write_time = write_time
+        self.redraw_queue = redraw_queue
+        self.redraw_coordinator = g15screen.RedrawCoordinator(self)
+
+    def _do_redraw_pages(self, pages, direction="up", transitions=True, redraw_content=True):
+        time.sleep(self.write_time)
+        self.redraw_coordinator.frame_drawn()
+
+
+def run_benchmark(shared, duration=5.0):
+    devices = [("g19", 16, 0.05), ("g13-1", 1, 0.002), ("g13-2", 1, 0.002)]
+    screens = [BenchmarkScreen(uid, bpp, write_time,
+                               g15screen.REDRAW_QUEUE if shared else "%s-%s" % (g15screen.REDRAW_QUEUE, uid))
+               for uid, bpp, write_time in devices]
+    end = time.time() + duration
+    while time.time() < end:
+        for s in screens:
+            s.redraw_coordinator.request()
+        time.sleep(0.005)
+    for s in screens:
+        s.redraw_coordinator.cancel()
+    g15scheduler.stop_queue(g15screen.REDRAW_QUEUE)
+    for s in screens:
+        g15scheduler.stop_queue(s.redraw_queue)
+    print("%-10s %s" % ("Shared" if shared else "Per device",
+                        ", ".join("%s %.1f fps (max %d)" % (s.uid, s.redraw_coordinator.frames / duration,
+                                                            s.redraw_coordinator.get_max_fps())
+                                  for s in screens)))
+
+
+def main():
+    loop = GLib.MainLoop()
+    threading.Thread(target=loop.run, name="BenchmarkLoop").start()
+    try:
+        run_benchmark(True)
+        run_benchmark(False)
+    finally:
+        loop.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python2
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compares keeping an hour of history in a list trimmed with del (as sysmon
+used to for its graph sized history) with a util.g15ringbuffer.RingBuffer,
+taking a graph sized window after each sample. Run from the top of the
+source tree
+
+    python2 tools/bench_ringbuffer.py
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "gnome15"))
+import util.g15ringbuffer as g15ringbuffer
+
+GRAPH_SIZE = 50
+HISTORY_SIZE = 3600
+SAMPLES = 100000
+
+
+def main():
+    history = [0.0] * HISTORY_SIZE
+    start = time.time()
+    for i in range(SAMPLES):
+        history.append(float(i))
+        while len(history) > HISTORY_SIZE:
+            del history[0]
+        history[-GRAPH_SIZE:]
+    list_time = time.time() - start
+    list_bytes = sys.getsizeof(history) + sum(sys.getsizeof(v) for v in history)
+
+    ring = g15ringbuffer.RingBuffer(HISTORY_SIZE)
+    start = time.time()
+    for i in range(SAMPLES):
+        ring.append(i)
+        ring.get_view(GRAPH_SIZE)
+    ring_time = time.time() - start
+    data = ring._data
+    ring_bytes = data.nbytes if hasattr(data, "nbytes") else data.itemsize * len(data)
+
+    assert ring.tolist(GRAPH_SIZE) == history[-GRAPH_SIZE:]
+    mins, maxs, avgs = ring.downsample(HISTORY_SIZE, GRAPH_SIZE)
+    assert len(avgs) == GRAPH_SIZE and mins[0] == SAMPLES - HISTORY_SIZE and maxs[-1] == SAMPLES - 1
+    print("%s, %d samples of history: list %.2fus and %d bytes, ring buffer %.2fus and %d bytes" % (
+        "NumPy" if g15ringbuffer.numpy is not None else "array", HISTORY_SIZE, list_time * 1000000.0 / SAMPLES,
+        list_bytes, ring_time * 1000000.0 / SAMPLES, ring_bytes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python2
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2010 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compares taking one g15top snapshot per tick with opening and parsing the
+/proc files for every CPU and interface, as the plugins used to. Run from
+the top of the source tree
+
+    python2 tools/bench_top.py
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "gnome15"))
+import g15top
+
+TICKS = 200
+
+
+def _parse(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def main():
+    start = time.time()
+    for __i in range(TICKS):
+        snapshot = g15top.snapshot(0)
+        for n in range(-1, len(snapshot.cpu_names) - 1):
+            snapshot.get_cpu_times(n)
+        for n in snapshot.net_names:
+            snapshot.get_net_bytes(n)
+    shared = time.time() - start
+
+    start = time.time()
+    for __i in range(TICKS):
+        for __n in snapshot.cpu_names:
+            _parse("/proc/stat")
+        for __n in snapshot.net_names:
+            _parse("/proc/net/dev")
+        _parse("/proc/meminfo")
+    separate = time.time() - start
+    print("%d CPUs, %d interfaces. Snapshot %.3fms per tick, separate reads %.3fms per tick" % (
+        len(snapshot.cpu_names) - 1, len(snapshot.net_names), shared * 1000.0 / TICKS, separate * 1000.0 / TICKS))
+
+
+if __name__ == "__main__":
+    main()
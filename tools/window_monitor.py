@@ -0,0 +1,57 @@
+#!/usr/bin/env python2
+#  Gnome15 - Suite of tools for the Logitech G series keyboards and headsets
+#  Copyright (C) 2011 Brett Smith <tanktarta@blueyonder.co.uk>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Starts the first available window monitor (or the backends given on the
+command line, in order) and prints each change of the active window. When
+interrupted, the monitor's event latency statistics are printed. Run from
+the top of the source tree, e.g. against a local Xvfb server
+
+    DISPLAY=:99 python2 tools/window_monitor.py xlib
+"""
+
+from __future__ import print_function
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "gnome15"))
+from gi.repository import GLib as glib
+import g15windowmonitor
+
+
+def _print_change(application_names, window_title):
+    print("%s - %s" % (", ".join(application_names), window_title))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    loop = glib.MainLoop()
+    monitor = g15windowmonitor.create_monitor(_print_change, backends=sys.argv[1:] if len(sys.argv) > 1 else None)
+    if monitor is None:
+        print("No window monitor available")
+        sys.exit(1)
+    try:
+        loop.run()
+    except KeyboardInterrupt:
+        pass
+    monitor.stop()
+    print(monitor.get_statistics())
+
+
+if __name__ == "__main__":
+    main()